@@ -0,0 +1,137 @@
+from typing import Dict, List, Tuple
+
+# Attack tables, built once when the module is imported.  Squares use the
+# row * 8 + col numbering from bitboard.py.
+
+NORTH, NORTH_EAST, EAST, SOUTH_EAST, SOUTH, SOUTH_WEST, WEST, NORTH_WEST = range(8)
+DIRECTIONS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+# Rays in these directions run towards higher square numbers, so their nearest blocker is the lowest bit
+POSITIVE = (True, True, True, False, False, False, False, True)
+ROOK_DIRECTIONS = (NORTH, EAST, SOUTH, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, SOUTH_EAST, SOUTH_WEST, NORTH_WEST)
+
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+
+
+def _on_board(row: int, col: int) -> bool:
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _step_mask(sq: int, steps) -> int:
+    row, col = sq >> 3, sq & 7
+    mask = 0
+    for d_row, d_col in steps:
+        if _on_board(row + d_row, col + d_col):
+            mask |= 1 << ((row + d_row) * 8 + col + d_col)
+    return mask
+
+
+def _ray_mask(sq: int, d_row: int, d_col: int) -> int:
+    row, col = (sq >> 3) + d_row, (sq & 7) + d_col
+    mask = 0
+    while _on_board(row, col):
+        mask |= 1 << (row * 8 + col)
+        row, col = row + d_row, col + d_col
+    return mask
+
+
+KNIGHT_ATTACKS: List[int] = [_step_mask(sq, KNIGHT_STEPS) for sq in range(64)]
+KING_ATTACKS: List[int] = [_step_mask(sq, DIRECTIONS) for sq in range(64)]
+# PAWN_ATTACKS[color][sq], white captures towards higher rows
+PAWN_ATTACKS: List[List[int]] = [[_step_mask(sq, ((1, -1), (1, 1))) for sq in range(64)],
+                                 [_step_mask(sq, ((-1, -1), (-1, 1))) for sq in range(64)]]
+# RAYS[direction][sq], every square from sq to the edge of the board
+RAYS: List[List[int]] = [[_ray_mask(sq, d_row, d_col) for sq in range(64)] for d_row, d_col in DIRECTIONS]
+
+
+def _edge_free_ray(direction: int, sq: int) -> int:
+    # A ray without its last square: a piece on the edge never blocks anything further out
+    ray = RAYS[direction][sq]
+    if not ray:
+        return 0
+    last = (ray & -ray) if not POSITIVE[direction] else 1 << (ray.bit_length() - 1)
+    return ray ^ last
+
+
+# Relevant occupancy for each square: only these bits can change a slider's attacks
+ROOK_MASKS: List[int] = [sum(_edge_free_ray(d, sq) for d in ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS: List[int] = [sum(_edge_free_ray(d, sq) for d in BISHOP_DIRECTIONS) for sq in range(64)]
+
+
+def _between(a: int, b: int) -> int:
+    for direction in range(8):
+        if RAYS[direction][a] >> b & 1:
+            return RAYS[direction][a] & ~RAYS[direction][b] & ~(1 << b)
+    return 0
+
+
+def _line(a: int, b: int) -> int:
+    for direction in range(8):
+        if RAYS[direction][a] >> b & 1:
+            return RAYS[direction][a] | RAYS[(direction + 4) % 8][a] | (1 << a)
+    return 0
+
+
+# BETWEEN[a][b]: squares strictly between two aligned squares.  LINE[a][b]: the full line through both.
+BETWEEN: List[List[int]] = [[_between(a, b) for b in range(64)] for a in range(64)]
+LINE: List[List[int]] = [[_line(a, b) for b in range(64)] for a in range(64)]
+
+
+def ray_attacks(direction: int, sq: int, occupied: int) -> int:
+    # Squares reached along one ray, stopping on (and including) the first blocker
+    ray = RAYS[direction][sq]
+    blockers = ray & occupied
+    if blockers:
+        if POSITIVE[direction]:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        ray ^= RAYS[direction][blocker]
+    return ray
+
+
+def _subsets(mask: int):
+    # Every subset of mask's bits, the empty set first
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            return
+
+
+def _ray_patterns(sq: int, direction: int) -> List[Tuple[int, int]]:
+    # (blockers, attacks) for every blocker pattern on one ray
+    return [(blockers, ray_attacks(direction, sq, blockers)) for blockers in _subsets(_edge_free_ray(direction, sq))]
+
+
+def _pair_patterns(sq: int, first: int, second: int) -> List[Tuple[int, int]]:
+    return [(blockers | other, attacks | more) for blockers, attacks in _ray_patterns(sq, first)
+            for other, more in _ray_patterns(sq, second)]
+
+
+def _slider_table(sq: int, directions) -> Dict[int, int]:
+    # Attacks for every relevant occupancy of a slider on sq.  The occupancy of each ray only affects
+    # that ray, so the table is the product of the blocker patterns of opposite ray pairs.
+    north_south = _pair_patterns(sq, directions[0], directions[2])
+    east_west = _pair_patterns(sq, directions[1], directions[3])
+    return {blockers | other: attacks | more for blockers, attacks in north_south for other, more in east_west}
+
+
+# Slider attacks indexed by (square, relevant occupancy), filled for every blocker
+# pattern at import.  Python dicts stand in for magic multiplication: the masked
+# occupancy is the key.
+_ROOK_TABLE: List[Dict[int, int]] = [_slider_table(sq, ROOK_DIRECTIONS) for sq in range(64)]
+_BISHOP_TABLE: List[Dict[int, int]] = [_slider_table(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return _ROOK_TABLE[sq][occupied & ROOK_MASKS[sq]]
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return _BISHOP_TABLE[sq][occupied & BISHOP_MASKS[sq]]
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
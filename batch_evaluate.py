@@ -0,0 +1,207 @@
+from typing import List, Sequence
+
+from attacks import KNIGHT_ATTACKS, bishop_attacks, queen_attacks, rook_attacks
+from bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, FILE_A, Position, iter_bits
+from evaluate import ENDGAME, MAX_PHASE, MIDDLEGAME, PHASE_WEIGHTS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Extended evaluation for scoring many positions at once: tapered material
+# and piece-square tables as in evaluate.py, plus mobility and pawn
+# structure.  evaluate_batch() encodes positions as 12 piece planes of 64
+# squares (and the matching uint64 bitboards) and scores the whole batch
+# with NumPy array operations; evaluate_position() is the scalar path for
+# one position, on bitboards and without NumPy.  Both give exactly the same scores.  Without NumPy
+# installed, evaluate_batch() falls back to the scalar path.
+
+HAVE_NUMPY = np is not None
+
+# Centipawns per square a piece attacks that does not hold one of its own pieces
+MOBILITY_WEIGHTS = (0, 4, 5, 2, 1, 0)
+DOUBLED_PAWN = -10
+ISOLATED_PAWN = -15
+# Passed pawn bonus by rank counted from the pawn's own side
+PASSED_PAWN = (0, 5, 10, 20, 35, 60, 100, 0)
+
+_FILES = [FILE_A << col for col in range(8)]
+_ADJACENT_FILES = [(_FILES[col - 1] if col else 0) | (_FILES[col + 1] if col < 7 else 0) for col in range(8)]
+# Squares in front of a pawn, on its own and the adjacent files, that must be free of enemy pawns for it to be passed
+_PASSED_MASKS = [[0] * 64 for _ in range(2)]
+for _sq in range(64):
+    _span = _FILES[_sq & 7] | _ADJACENT_FILES[_sq & 7]
+    _PASSED_MASKS[WHITE][_sq] = _span & ~((1 << (((_sq >> 3) + 1) * 8)) - 1)
+    _PASSED_MASKS[BLACK][_sq] = _span & ((1 << ((_sq >> 3) * 8)) - 1)
+
+
+def _mobility(position: Position, color: int) -> int:
+    # Squares attacked by each kind of piece (counted once however many pieces of the kind reach them)
+    pieces = position.pieces[color]
+    occupied = position.occupied
+    free = ~position.occupancy[color]
+    score = 0
+    for kind, attacks_of in ((KNIGHT, None), (BISHOP, bishop_attacks), (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+        attacks = 0
+        for sq in iter_bits(pieces[kind]):
+            attacks |= KNIGHT_ATTACKS[sq] if attacks_of is None else attacks_of(sq, occupied)
+        score += MOBILITY_WEIGHTS[kind] * bin(attacks & free).count('1')
+    return score
+
+
+def _pawn_structure(position: Position, color: int) -> int:
+    theirs = position.pieces[color ^ 1][PAWN]
+    # Pawns per file are kept up to date by the position itself
+    files = position.pawn_files[color]
+    score = 0
+    for col in range(8):
+        count = files[col]
+        if count > 1:
+            score += DOUBLED_PAWN * (count - 1)
+        if count and not ((col and files[col - 1]) or (col < 7 and files[col + 1])):
+            score += ISOLATED_PAWN * count
+    for sq in iter_bits(position.pieces[color][PAWN]):
+        if not theirs & _PASSED_MASKS[color][sq]:
+            score += PASSED_PAWN[sq >> 3 if color == WHITE else 7 - (sq >> 3)]
+    return score
+
+
+def evaluate_position(position: Position) -> int:
+    # Scalar path: the extended score of one position from the side to move's point of view.  The
+    # piece-square part comes from the totals the position keeps as pieces move.
+    phase = min(position.phase, MAX_PHASE)
+    score = (position.middlegame * phase + position.endgame * (MAX_PHASE - phase)) // MAX_PHASE
+    score += _mobility(position, WHITE) + _pawn_structure(position, WHITE)
+    score -= _mobility(position, BLACK) + _pawn_structure(position, BLACK)
+    return score if position.turn == WHITE else -score
+
+
+if HAVE_NUMPY:
+    # Plane p = color * 6 + kind; tables carry the sign of the color so a dot product gives White's score
+    _MIDDLEGAME_TABLE = np.array([[sign * value for value in MIDDLEGAME[color][kind]]
+                                  for color, sign in ((WHITE, 1), (BLACK, -1)) for kind in range(6)],
+                                 dtype=np.int32).reshape(768)
+    _ENDGAME_TABLE = np.array([[sign * value for value in ENDGAME[color][kind]]
+                               for color, sign in ((WHITE, 1), (BLACK, -1)) for kind in range(6)],
+                              dtype=np.int32).reshape(768)
+    _PHASE = np.array(PHASE_WEIGHTS * 2, dtype=np.int64)
+    _U = np.uint64
+    _FULL = _U(0xFFFF_FFFF_FFFF_FFFF)
+    _NOT_A = _U(0xFEFE_FEFE_FEFE_FEFE)
+    _NOT_H = _U(0x7F7F_7F7F_7F7F_7F7F)
+    _NOT_AB = _U(0xFCFC_FCFC_FCFC_FCFC)
+    _NOT_GH = _U(0x3F3F_3F3F_3F3F_3F3F)
+    _FILE_MASKS = [_U(mask) for mask in _FILES]
+    _ROW_MASKS = [_U(0xFF << (row * 8)) for row in range(8)]
+    # (shift, mask applied after shifting) for each step; positive shifts go up the board
+    _KNIGHT_SHIFTS = ((17, _NOT_A), (15, _NOT_H), (10, _NOT_AB), (6, _NOT_GH),
+                      (-6, _NOT_AB), (-10, _NOT_GH), (-15, _NOT_A), (-17, _NOT_H))
+    _STRAIGHT_SHIFTS = ((8, _FULL), (-8, _FULL), (1, _NOT_A), (-1, _NOT_H))
+    _DIAGONAL_SHIFTS = ((9, _NOT_A), (7, _NOT_H), (-7, _NOT_A), (-9, _NOT_H))
+
+    if hasattr(np, 'bitwise_count'):
+        def _popcount(bitboards: 'np.ndarray') -> 'np.ndarray':
+            return np.bitwise_count(bitboards).astype(np.int64)
+    else:
+        def _popcount(bitboards: 'np.ndarray') -> 'np.ndarray':
+            as_bytes = bitboards.astype('<u8').view(np.uint8).reshape(bitboards.shape + (8,))
+            return np.unpackbits(as_bytes, axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+def _bitboards(positions: Sequence[Position]) -> 'np.ndarray':
+    # (N, 12) uint64 piece bitboards, column color * 6 + kind
+    return np.array([position.pieces[WHITE] + position.pieces[BLACK] for position in positions],
+                    dtype=np.uint64).reshape(len(positions), 12)
+
+
+def encode_planes(positions: Sequence[Position]) -> 'np.ndarray':
+    # (N, 12, 64) array of 0/1 piece planes; plane color * 6 + kind, column = square
+    as_bytes = _bitboards(positions).astype('<u8').view(np.uint8).reshape(len(positions), 12, 8)
+    return np.unpackbits(as_bytes, axis=2, bitorder='little')
+
+
+def _shift(bitboards: 'np.ndarray', shift: int, mask) -> 'np.ndarray':
+    if shift > 0:
+        return (bitboards << _U(shift)) & mask
+    return (bitboards >> _U(-shift)) & mask
+
+
+def _slider_attacks(sliders: 'np.ndarray', empty: 'np.ndarray', shifts) -> 'np.ndarray':
+    # Union of the rays of every slider, each ray stopping at the first occupied square
+    attacks = np.zeros_like(sliders)
+    for shift, mask in shifts:
+        front = sliders
+        for _ in range(7):
+            front = _shift(front, shift, mask)
+            attacks |= front
+            front = front & empty
+    return attacks
+
+
+def _batch_mobility(bitboards: 'np.ndarray', color: int, free: 'np.ndarray', empty: 'np.ndarray') -> 'np.ndarray':
+    base = color * 6
+    knights = bitboards[:, base + KNIGHT]
+    attacks = np.zeros_like(knights)
+    for shift, mask in _KNIGHT_SHIFTS:
+        attacks |= _shift(knights, shift, mask)
+    score = MOBILITY_WEIGHTS[KNIGHT] * _popcount(attacks & free)
+    queens = bitboards[:, base + QUEEN]
+    diagonal = _slider_attacks(bitboards[:, base + BISHOP], empty, _DIAGONAL_SHIFTS)
+    straight = _slider_attacks(bitboards[:, base + ROOK], empty, _STRAIGHT_SHIFTS)
+    queen = _slider_attacks(queens, empty, _DIAGONAL_SHIFTS) | _slider_attacks(queens, empty, _STRAIGHT_SHIFTS)
+    score += MOBILITY_WEIGHTS[BISHOP] * _popcount(diagonal & free)
+    score += MOBILITY_WEIGHTS[ROOK] * _popcount(straight & free)
+    score += MOBILITY_WEIGHTS[QUEEN] * _popcount(queen & free)
+    return score
+
+
+def _batch_pawn_structure(pawns: 'np.ndarray', theirs: 'np.ndarray', color: int) -> 'np.ndarray':
+    counts = np.stack([_popcount(pawns & mask) for mask in _FILE_MASKS], axis=1)
+    score = DOUBLED_PAWN * np.maximum(counts - 1, 0).sum(axis=1)
+    padded = np.pad(counts, ((0, 0), (1, 1)))
+    neighbours = padded[:, :-2] + padded[:, 2:]
+    score += ISOLATED_PAWN * (counts * (neighbours == 0)).sum(axis=1)
+    # Squares behind every enemy pawn (from this side's point of view), widened to the adjacent files
+    step = -8 if color == WHITE else 8
+    behind = np.zeros_like(theirs)
+    front = theirs
+    for _ in range(7):
+        front = _shift(front, step, _FULL)
+        behind |= front
+    blocked = behind | _shift(behind, 1, _NOT_A) | _shift(behind, -1, _NOT_H)
+    passed = pawns & ~blocked
+    for row in range(1, 7):
+        score += PASSED_PAWN[row if color == WHITE else 7 - row] * _popcount(passed & _ROW_MASKS[row])
+    return score
+
+
+def evaluate_batch(positions: Sequence[Position]) -> 'np.ndarray':
+    # Scores of many positions, each from its side to move's point of view, as an int64 array
+    # (a list without NumPy)
+    if not HAVE_NUMPY:
+        return [evaluate_position(position) for position in positions]
+    if not positions:
+        return np.zeros(0, dtype=np.int64)
+    bitboards = _bitboards(positions)
+    planes = encode_planes(positions).reshape(len(positions), 768).astype(np.int32)
+    middlegame = (planes @ _MIDDLEGAME_TABLE).astype(np.int64)
+    endgame = (planes @ _ENDGAME_TABLE).astype(np.int64)
+    phase = np.minimum(_popcount(bitboards) @ _PHASE, MAX_PHASE)
+    score = (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+    own = [np.bitwise_or.reduce(bitboards[:, color * 6:color * 6 + 6], axis=1) for color in (WHITE, BLACK)]
+    empty = ~(own[WHITE] | own[BLACK])
+    score += _batch_mobility(bitboards, WHITE, ~own[WHITE], empty)
+    score -= _batch_mobility(bitboards, BLACK, ~own[BLACK], empty)
+    white_pawns, black_pawns = bitboards[:, PAWN], bitboards[:, 6 + PAWN]
+    score += _batch_pawn_structure(white_pawns, black_pawns, WHITE)
+    score -= _batch_pawn_structure(black_pawns, white_pawns, BLACK)
+
+    turns = np.array([position.turn for position in positions], dtype=np.int64)
+    return np.where(turns == WHITE, score, -score)
+
+
+def evaluate_many(positions: Sequence[Position]) -> List[int]:
+    # Plain ints for callers that do not use NumPy themselves
+    return [int(score) for score in evaluate_batch(positions)]
@@ -0,0 +1,555 @@
+from typing import Iterator, List, Optional, Tuple
+
+from attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, bishop_attacks, rook_attacks
+from psqt import PHASE_WEIGHTS, SIGNED_ENDGAME, SIGNED_MIDDLEGAME
+from zobrist import CASTLING_KEYS, EP_KEYS, PIECE_KEYS, SIDE_KEY
+
+# Squares are numbered 0..63 as row * 8 + col, using the same (row, col)
+# layout as game.Game: row 0 holds White's back rank and White's pawns
+# move towards row 7.
+
+WHITE = 0
+BLACK = 1
+
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+
+COLOR_NAMES = ('white', 'black')
+COLOR_INDEX = {'white': WHITE, 'black': BLACK}
+
+# One shared (color, kind) tuple per piece so the mailbox never allocates
+PIECE_CODES = tuple(tuple((color, kind) for kind in range(6)) for color in (WHITE, BLACK))
+
+FULL = 0xFFFF_FFFF_FFFF_FFFF
+FILE_A = 0x0101_0101_0101_0101
+FILE_H = FILE_A << 7
+NOT_A = FULL ^ FILE_A
+NOT_H = FULL ^ FILE_H
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+CASTLING_RIGHTS = (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)
+# Rights that survive a move touching each square: moving a king or rook, or capturing a rook, loses them
+CASTLING_MASK = [ALL_CASTLING] * 64
+CASTLING_MASK[0] ^= WHITE_QUEENSIDE
+CASTLING_MASK[4] ^= WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLING_MASK[7] ^= WHITE_KINGSIDE
+CASTLING_MASK[56] ^= BLACK_QUEENSIDE
+CASTLING_MASK[60] ^= BLACK_KINGSIDE | BLACK_QUEENSIDE
+CASTLING_MASK[63] ^= BLACK_KINGSIDE
+
+# Moves are packed into 16 bits: start square, end square and a 4-bit flag.
+# Flags 8-15 are promotions to KNIGHT..QUEEN, with the CAPTURE bit set when they take a piece.
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EP_CAPTURE = 5
+PROMOTION = 8
+
+
+# Start and end square bits of a move, without the flag
+MOVE_SQUARES = 0xFFF
+
+
+def encode_move(start: int, end: int, flag: int = QUIET) -> int:
+    return start | (end << 6) | (flag << 12)
+
+
+def move_start(move: int) -> int:
+    return move & 63
+
+
+def move_end(move: int) -> int:
+    return (move >> 6) & 63
+
+
+def move_flag(move: int) -> int:
+    return move >> 12
+
+
+def promotion_kind(move: int) -> Optional[int]:
+    flag = move >> 12
+    return (flag & 3) + KNIGHT if flag & PROMOTION else None
+
+
+ROW_1 = 0xFF
+ROW_2 = ROW_1 << 8
+ROW_7 = ROW_1 << 48
+ROW_8 = ROW_1 << 56
+
+
+def square(row: int, col: int) -> int:
+    return row * 8 + col
+
+
+# Shared (row, col) tuples, so converting squares for the GUI allocates nothing
+_ROW_COL = tuple((sq >> 3, sq & 7) for sq in range(64))
+
+
+def square_row_col(sq: int) -> Tuple[int, int]:
+    return _ROW_COL[sq]
+
+
+def move_from_row_col(start: Tuple[int, int], end: Tuple[int, int], flag: int = QUIET) -> int:
+    # Pack a move given as the GUI's (row, col) pairs
+    return encode_move(start[0] * 8 + start[1], end[0] * 8 + end[1], flag)
+
+
+def move_row_col(move: int) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    # The (row, col) pairs of a move's start and end squares
+    return _ROW_COL[move & 63], _ROW_COL[(move >> 6) & 63]
+
+
+FILE_NAMES = 'abcdefgh'
+PIECE_LETTERS = 'pnbrqk'
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def square_name(sq: int) -> str:
+    return FILE_NAMES[sq & 7] + str((sq >> 3) + 1)
+
+
+def parse_square(name: str) -> int:
+    if len(name) != 2 or name[0] not in FILE_NAMES or name[1] not in '12345678':
+        raise ValueError("Invalid square name: {}".format(name))
+    return square(int(name[1]) - 1, FILE_NAMES.index(name[0]))
+
+
+def move_name(move: int) -> str:
+    # Coordinate notation, e.g. e2e4 or e7e8q
+    kind = promotion_kind(move)
+    return square_name(move_start(move)) + square_name(move_end(move)) + ('' if kind is None else PIECE_LETTERS[kind])
+
+
+def iter_bits(bb: int) -> Iterator[int]:
+    # Yield the index of every set bit, lowest first
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def lsb(bb: int) -> int:
+    return (bb & -bb).bit_length() - 1
+
+
+# Set-wise shifts. East is towards col 7, north is towards row 7.
+def north(bb: int) -> int:
+    return (bb << 8) & FULL
+
+
+def south(bb: int) -> int:
+    return bb >> 8
+
+
+def east(bb: int) -> int:
+    return (bb << 1) & NOT_A & FULL
+
+
+def west(bb: int) -> int:
+    return (bb >> 1) & NOT_H
+
+
+def north_east(bb: int) -> int:
+    return (bb << 9) & NOT_A & FULL
+
+
+def north_west(bb: int) -> int:
+    return (bb << 7) & NOT_H & FULL
+
+
+def south_east(bb: int) -> int:
+    return (bb >> 7) & NOT_A
+
+
+def south_west(bb: int) -> int:
+    return (bb >> 9) & NOT_H
+
+
+def pawn_attacks(bb: int, color: int) -> int:
+    if color == WHITE:
+        return north_east(bb) | north_west(bb)
+    return south_east(bb) | south_west(bb)
+
+
+class Position:
+    # One 64-bit integer per (color, piece kind) plus occupancy masks.  The
+    # mailbox mirrors the bitboards so a single square can be read in O(1).
+    def __init__(self):
+        self.pieces = [[0] * 6 for _ in range(2)]
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.mailbox: List[Optional[Tuple[int, int]]] = [None] * 64
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square: Optional[int] = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # Zobrist key, kept up to date by every method that changes the position
+        self.hash = 0
+        # Evaluation terms, also kept up to date by put() and remove(): piece-square totals (material
+        # included) from White's point of view, the game phase and pawns per file
+        self.middlegame = 0
+        self.endgame = 0
+        self.phase = 0
+        self.pawn_files = [[0] * 8, [0] * 8]
+        # Attack maps, kept only after track_attacks(): the squares attacked by the piece on each square,
+        # brought up to date by put() and remove(), and each color's union of them, rebuilt when asked for
+        # after a change.  unmake_move() restores them through the same put() and remove() calls.
+        self.square_attacks: Optional[List[int]] = None
+        self._color_attacks: List[Optional[int]] = [None, None]
+        # Undo records pushed by make_move:
+        # (move, captured, castling, ep_square, hash, halfmove_clock)
+        self.history: List[tuple] = []
+
+    def clear(self) -> None:
+        tracking = self.square_attacks is not None
+        self.__init__()
+        if tracking:
+            self.track_attacks()
+
+    def copy(self) -> 'Position':
+        other = Position.__new__(Position)
+        other.pieces = [self.pieces[WHITE][:], self.pieces[BLACK][:]]
+        other.occupancy = self.occupancy[:]
+        other.occupied = self.occupied
+        other.mailbox = self.mailbox[:]
+        other.turn = self.turn
+        other.castling = self.castling
+        other.ep_square = self.ep_square
+        other.halfmove_clock = self.halfmove_clock
+        other.fullmove_number = self.fullmove_number
+        other.hash = self.hash
+        other.middlegame = self.middlegame
+        other.endgame = self.endgame
+        other.phase = self.phase
+        other.pawn_files = [self.pawn_files[WHITE][:], self.pawn_files[BLACK][:]]
+        other.history = self.history[:]
+        # Copies start without attack maps: they are mostly handed to the search, which reads attacks
+        # straight off the bitboards and would only pay for keeping the maps up to date
+        other.square_attacks = None
+        other._color_attacks = [None, None]
+        return other
+
+    def position_key(self) -> int:
+        return self.hash
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'Position':
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("Invalid FEN: {}".format(fen))
+        position = cls()
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError("Invalid FEN: {}".format(fen))
+        for index, text in enumerate(rows):
+            row, col = 7 - index, 0
+            for char in text:
+                if char.isdigit():
+                    col += int(char)
+                elif char.lower() in PIECE_LETTERS and col < 8:
+                    position.put(square(row, col), WHITE if char.isupper() else BLACK,
+                                 PIECE_LETTERS.index(char.lower()))
+                    col += 1
+                else:
+                    raise ValueError("Invalid FEN: {}".format(fen))
+            if col != 8:
+                raise ValueError("Invalid FEN: {}".format(fen))
+        if fields[1] not in ('w', 'b'):
+            raise ValueError("Invalid FEN: {}".format(fen))
+        if fields[1] == 'b':
+            position.switch_turn()
+        rights = 0
+        for char, right in zip('KQkq', CASTLING_RIGHTS):
+            if char in fields[2]:
+                rights |= right
+        position.set_castling(rights)
+        position.set_ep_square(None if fields[3] == '-' else parse_square(fields[3]))
+        if len(fields) >= 6:
+            position.halfmove_clock = int(fields[4])
+            position.fullmove_number = int(fields[5])
+        return position
+
+    def to_compact(self) -> Tuple[str, Tuple[int, ...]]:
+        # FEN plus the hashes of earlier positions that can still repeat, cheap to send to another process
+        count = min(self.halfmove_clock, len(self.history))
+        return self.fen(), tuple(record[4] for record in self.history[len(self.history) - count:])
+
+    @classmethod
+    def from_compact(cls, fen: str, keys: Tuple[int, ...] = ()) -> 'Position':
+        position = cls.from_fen(fen)
+        # Placeholder records carry only the earlier hashes for repetition checks; they cannot be unmade
+        position.history = [(0, None, 0, None, key, 0) for key in keys]
+        return position
+
+    def fen(self) -> str:
+        rows = []
+        for row in range(7, -1, -1):
+            text, empty = '', 0
+            for col in range(8):
+                code = self.mailbox[square(row, col)]
+                if code is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                letter = PIECE_LETTERS[code[1]]
+                text += letter.upper() if code[0] == WHITE else letter
+            rows.append(text + (str(empty) if empty else ''))
+        rights = ''.join(char for char, right in zip('KQkq', CASTLING_RIGHTS) if self.castling & right) or '-'
+        ep_square = '-' if self.ep_square is None else square_name(self.ep_square)
+        return '{} {} {} {} {} {}'.format('/'.join(rows), 'wb'[self.turn], rights, ep_square,
+                                          self.halfmove_clock, self.fullmove_number)
+
+    def piece_at(self, sq: int) -> Optional[Tuple[int, int]]:
+        return self.mailbox[sq]
+
+    def put(self, sq: int, color: int, kind: int) -> None:
+        if self.mailbox[sq] is not None:
+            self.remove(sq)
+        mask = 1 << sq
+        self.pieces[color][kind] |= mask
+        self.occupancy[color] |= mask
+        self.occupied |= mask
+        self.mailbox[sq] = PIECE_CODES[color][kind]
+        self.hash ^= PIECE_KEYS[color][kind][sq]
+        self.middlegame += SIGNED_MIDDLEGAME[color][kind][sq]
+        self.endgame += SIGNED_ENDGAME[color][kind][sq]
+        self.phase += PHASE_WEIGHTS[kind]
+        if kind == PAWN:
+            self.pawn_files[color][sq & 7] += 1
+        if self.square_attacks is not None:
+            self._update_attacks(sq)
+
+    def remove(self, sq: int) -> Optional[Tuple[int, int]]:
+        code = self.mailbox[sq]
+        if code is not None:
+            color, kind = code
+            mask = ~(1 << sq)
+            self.pieces[color][kind] &= mask
+            self.occupancy[color] &= mask
+            self.occupied &= mask
+            self.mailbox[sq] = None
+            self.hash ^= PIECE_KEYS[color][kind][sq]
+            self.middlegame -= SIGNED_MIDDLEGAME[color][kind][sq]
+            self.endgame -= SIGNED_ENDGAME[color][kind][sq]
+            self.phase -= PHASE_WEIGHTS[kind]
+            if kind == PAWN:
+                self.pawn_files[color][sq & 7] -= 1
+            if self.square_attacks is not None:
+                self._update_attacks(sq)
+        return code
+
+    def switch_turn(self) -> None:
+        self.turn ^= 1
+        self.hash ^= SIDE_KEY
+
+    def set_castling(self, rights: int) -> None:
+        self.hash ^= CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[rights]
+        self.castling = rights
+
+    def set_ep_square(self, sq: Optional[int]) -> None:
+        if self.ep_square is not None:
+            self.hash ^= EP_KEYS[self.ep_square & 7]
+        if sq is not None:
+            self.hash ^= EP_KEYS[sq & 7]
+        self.ep_square = sq
+
+    def move_piece(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        # Move whatever stands on start to end and return the captured piece, if any
+        captured = self.remove(end)
+        code = self.remove(start)
+        if code is not None:
+            self.put(end, *code)
+        return captured
+
+    def king_square(self, color: int) -> Optional[int]:
+        kings = self.pieces[color][KING]
+        return lsb(kings) if kings else None
+
+    def attackers(self, sq: int, by_color: int, occupied: Optional[int] = None) -> int:
+        # Every piece of by_color that attacks sq, found by looking outwards from sq
+        if occupied is None:
+            occupied = self.occupied
+        theirs = self.pieces[by_color]
+        diagonal = theirs[BISHOP] | theirs[QUEEN]
+        straight = theirs[ROOK] | theirs[QUEEN]
+        return ((PAWN_ATTACKS[by_color ^ 1][sq] & theirs[PAWN])
+                | (KNIGHT_ATTACKS[sq] & theirs[KNIGHT])
+                | (KING_ATTACKS[sq] & theirs[KING])
+                | (bishop_attacks(sq, occupied) & diagonal)
+                | (rook_attacks(sq, occupied) & straight))
+
+    def is_attacked(self, sq: int, by_color: int) -> bool:
+        if self.square_attacks is not None:
+            return bool(self.attack_map(by_color) >> sq & 1)
+        return self.attackers(sq, by_color) != 0
+
+    def in_check(self, color: int) -> bool:
+        king = self.king_square(color)
+        return king is not None and self.is_attacked(king, color ^ 1)
+
+    def track_attacks(self) -> None:
+        # Build the attack maps and keep them up to date from now on
+        self.square_attacks = [self.attacks_from(sq) for sq in range(64)]
+        self._color_attacks = [None, None]
+
+    def _update_attacks(self, sq: int) -> None:
+        # The piece on sq changed, and so did the rays of every slider that reaches sq; nothing else moves
+        square_attacks = self.square_attacks
+        occupied = self.occupied
+        white, black = self.pieces
+        diagonal = white[BISHOP] | white[QUEEN] | black[BISHOP] | black[QUEEN]
+        straight = white[ROOK] | white[QUEEN] | black[ROOK] | black[QUEEN]
+        square_attacks[sq] = self.attacks_from(sq)
+        for slider in iter_bits((bishop_attacks(sq, occupied) & diagonal) | (rook_attacks(sq, occupied) & straight)):
+            square_attacks[slider] = self.attacks_from(slider)
+        self._color_attacks = [None, None]
+
+    def attack_map(self, color: int) -> int:
+        # Every square attacked by a piece of color (needs track_attacks())
+        attacks = self._color_attacks[color]
+        if attacks is None:
+            attacks = 0
+            square_attacks = self.square_attacks
+            for sq in iter_bits(self.occupancy[color]):
+                attacks |= square_attacks[sq]
+            self._color_attacks[color] = attacks
+        return attacks
+
+    def attacks_from(self, sq: int) -> int:
+        # Squares attacked by the piece standing on sq
+        code = self.mailbox[sq]
+        if code is None:
+            return 0
+        color, kind = code
+        if kind == PAWN:
+            return PAWN_ATTACKS[color][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == KING:
+            return KING_ATTACKS[sq]
+        attacks = 0
+        if kind in (BISHOP, QUEEN):
+            attacks |= bishop_attacks(sq, self.occupied)
+        if kind in (ROOK, QUEEN):
+            attacks |= rook_attacks(sq, self.occupied)
+        return attacks
+
+    def build_move(self, start: int, end: int, promotion: int = QUEEN) -> int:
+        # Encode a start/end pair, working out the flag from the pieces on the board
+        color, kind = self.mailbox[start]
+        flag = CAPTURE if self.mailbox[end] is not None else QUIET
+        if kind == PAWN:
+            if end == self.ep_square:
+                flag = EP_CAPTURE
+            elif abs(end - start) == 16:
+                flag = DOUBLE_PUSH
+            elif end >> 3 in (0, 7):
+                flag |= PROMOTION | (promotion - KNIGHT)
+        elif kind == KING and abs(end - start) == 2:
+            flag = KING_CASTLE if end > start else QUEEN_CASTLE
+        return encode_move(start, end, flag)
+
+    def make_move(self, move: int) -> None:
+        start = move & 63
+        end = (move >> 6) & 63
+        flag = move >> 12
+        color, kind = self.mailbox[start]
+        # The record keeps the hash from before the move, so it is taken before the capture changes it
+        key = self.hash
+        if flag == EP_CAPTURE:
+            captured = self.remove(end - 8 if color == WHITE else end + 8)
+        else:
+            captured = self.remove(end)
+        self.history.append((move, captured, self.castling, self.ep_square, key, self.halfmove_clock))
+
+        self.remove(start)
+        self.put(end, color, (flag & 3) + KNIGHT if flag & PROMOTION else kind)
+        if flag == KING_CASTLE:
+            self.put(start + 1, *self.remove(start + 3))
+        elif flag == QUEEN_CASTLE:
+            self.put(start - 1, *self.remove(start - 4))
+
+        self.set_castling(self.castling & CASTLING_MASK[start] & CASTLING_MASK[end])
+        self.set_ep_square((start + end) >> 1 if flag == DOUBLE_PUSH else None)
+        self.halfmove_clock = 0 if kind == PAWN or captured is not None else self.halfmove_clock + 1
+        if color == BLACK:
+            self.fullmove_number += 1
+        self.switch_turn()
+
+    def make_null_move(self) -> None:
+        # Pass the turn, for null-move pruning.  The record holds move 0, which no real move encodes (it
+        # would go from a1 to a1); the clock restarts so repetition checks do not look back across the pass.
+        self.history.append((0, None, self.castling, self.ep_square, self.hash, self.halfmove_clock))
+        self.set_ep_square(None)
+        self.halfmove_clock = 0
+        self.switch_turn()
+
+    def unmake_move(self) -> int:
+        # Take back the last move and return it.  Rights, en passant and the hash come straight off the record.
+        move, captured, castling, ep_square, key, halfmove_clock = self.history.pop()
+        if not move:
+            self.turn ^= 1
+            self.ep_square = ep_square
+            self.halfmove_clock = halfmove_clock
+            self.hash = key
+            return move
+        start = move & 63
+        end = (move >> 6) & 63
+        flag = move >> 12
+        self.turn ^= 1
+        color = self.turn
+        kind = self.remove(end)[1]
+        self.put(start, color, PAWN if flag & PROMOTION else kind)
+        if flag == KING_CASTLE:
+            self.put(start + 3, *self.remove(start + 1))
+        elif flag == QUEEN_CASTLE:
+            self.put(start - 4, *self.remove(start - 1))
+        if captured is not None:
+            if flag == EP_CAPTURE:
+                self.put(end - 8 if color == WHITE else end + 8, *captured)
+            else:
+                self.put(end, *captured)
+        if color == BLACK:
+            self.fullmove_number -= 1
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.hash = key
+        return move
+
+
+def position_from_board(board, turn: str = 'white') -> Position:
+    # Build a Position from any 8x8 grid of pieces, e.g. game.Game.board or gamefinal.Game.board
+    position = Position()
+    kinds = {name: kind for kind, name in enumerate(('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King'))}
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece is not None:
+                color = getattr(piece.color, 'name', piece.color).lower()
+                position.put(square(row, col), COLOR_INDEX[color], kinds[type(piece).__name__])
+    # Grant each castling right whose king and rook still stand on their home squares
+    rights = 0
+    for right, king, rook in ((WHITE_KINGSIDE, 4, 7), (WHITE_QUEENSIDE, 4, 0),
+                              (BLACK_KINGSIDE, 60, 63), (BLACK_QUEENSIDE, 60, 56)):
+        color = WHITE if king < 8 else BLACK
+        if position.mailbox[king] == (color, KING) and position.mailbox[rook] == (color, ROOK):
+            rights |= right
+    position.set_castling(rights)
+    if COLOR_INDEX[turn]:
+        position.switch_turn()
+    return position
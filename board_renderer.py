@@ -0,0 +1,81 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import pygame as pg
+
+import sprites
+
+# Dirty-rectangle board drawing.  The checkerboard is rendered once; each
+# frame only the squares whose piece or highlight changed are redrawn, and
+# their rects are returned for pg.display.update(rects).  Pieces are drawn
+# from the shared sprite atlas at the board's square size.
+
+SELECTED_COLOR = (255, 0, 0)
+MOVE_COLOR = (0, 0, 255)
+_UNDRAWN = object()
+
+
+class BoardRenderer:
+    def __init__(self, surface: pg.Surface, square_size: int = 105, light=(255, 255, 255), dark=(127, 127, 127),
+                 origin: Tuple[int, int] = (0, 0)):
+        self._surface = surface
+        self._size = square_size
+        self._origin = origin
+        self._background = pg.Surface((8 * square_size, 8 * square_size))
+        for row in range(8):
+            for col in range(8):
+                color = light if (row + col) % 2 == 0 else dark
+                pg.draw.rect(self._background, color, pg.Rect(col * square_size, row * square_size,
+                                                              square_size, square_size))
+        if pg.display.get_surface() is not None:
+            self._background = self._background.convert()
+        # What is currently on screen for each square: (piece key, highlight)
+        self._shown = [_UNDRAWN] * 64
+        self._last_frame = _UNDRAWN
+
+    @property
+    def rect(self) -> pg.Rect:
+        return pg.Rect(self._origin[0], self._origin[1], 8 * self._size, 8 * self._size)
+
+    def square_rect(self, row: int, col: int) -> pg.Rect:
+        return pg.Rect(self._origin[0] + col * self._size, self._origin[1] + row * self._size,
+                       self._size, self._size)
+
+    def invalidate(self) -> None:
+        # Force a full redraw, e.g. after the window was covered or resized
+        self._shown = [_UNDRAWN] * 64
+        self._last_frame = _UNDRAWN
+
+    def draw(self, get_piece: Callable[[int, int], object], selected: Optional[Tuple[int, int]] = None,
+             moves: Iterable[Tuple[int, int]] = (), position_key=None) -> List[pg.Rect]:
+        moves = frozenset(moves)
+        # With a position key, an unchanged position and selection means nothing to do at all
+        frame = (position_key, selected, moves)
+        if position_key is not None and frame == self._last_frame:
+            return []
+        self._last_frame = frame
+
+        dirty = []
+        for row in range(8):
+            for col in range(8):
+                piece = get_piece(row, col)
+                piece_key = None if piece is None else (type(piece).__name__, str(piece.color))
+                if (row, col) == selected:
+                    highlight = SELECTED_COLOR
+                elif (row, col) in moves:
+                    highlight = MOVE_COLOR
+                else:
+                    highlight = None
+                state = (piece_key, highlight)
+                index = row * 8 + col
+                if self._shown[index] == state:
+                    continue
+                self._shown[index] = state
+                rect = self.square_rect(row, col)
+                self._surface.blit(self._background, rect,
+                                   pg.Rect(col * self._size, row * self._size, self._size, self._size))
+                if highlight is not None:
+                    pg.draw.rect(self._surface, highlight, rect, 2)
+                if piece is not None:
+                    self._surface.blit(sprites.get_sprite(type(piece).__name__, piece.color, self._size), rect)
+                dirty.append(rect)
+        return dirty
@@ -0,0 +1,174 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bitboard import BLACK, START_FEN, Position, move_name
+from movegen import generate_moves
+from pgn import PgnError, read_games
+from search import SearchResult
+
+# Opening book in a sorted, fixed-width binary file read through mmap.
+#
+# The layout follows Polyglot: 16-byte big-endian entries of
+# (key u64, move u16, weight u16, learn u32), sorted by key and then by
+# descending weight.  The key is our own Zobrist hash (zobrist.py) and the
+# move uses our 16-bit encoding, so these books are not Polyglot
+# compatible.  The file is mapped read-only, so every engine process on a
+# machine shares the same pages of the OS cache instead of loading a copy.
+
+ENTRY = struct.Struct('>QHHI')
+ENTRY_SIZE = ENTRY.size
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % ENTRY_SIZE:
+            self._file.close()
+            raise ValueError('{} is not a book file: size {} is not a multiple of {}'.format(path, size, ENTRY_SIZE))
+        self.entries = size // ENTRY_SIZE
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> 'OpeningBook':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _key_at(self, index: int) -> int:
+        return ENTRY.unpack_from(self._map, index * ENTRY_SIZE)[0]
+
+    def _first_index(self, key: int) -> int:
+        # Binary search for the first entry whose key is not below key
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) >> 1
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, key: int) -> List[Tuple[int, int]]:
+        # (move, weight) for every book move stored under key, heaviest first
+        moves = []
+        if self._map is None:
+            return moves
+        for index in range(self._first_index(key), self.entries):
+            entry_key, move, weight, _ = ENTRY.unpack_from(self._map, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            moves.append((move, weight))
+        return moves
+
+    def moves(self, position: Position) -> List[Tuple[int, int]]:
+        # Book moves that are legal in position; guards against hash collisions and damaged files
+        legal = set(generate_moves(position))
+        return [(move, weight) for move, weight in self.lookup(position.hash) if move in legal and weight]
+
+    def choose(self, position: Position, rng: Optional[random.Random] = None) -> Optional[int]:
+        # A book move picked at random in proportion to its weight, or None when out of book
+        candidates = self.moves(position)
+        if not candidates:
+            return None
+        rng = rng or random
+        pick = rng.randrange(sum(weight for _, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick < 0:
+                return move
+        return candidates[-1][0]
+
+
+def book_result(book: Optional[OpeningBook], position: Position,
+                rng: Optional[random.Random] = None) -> Optional[SearchResult]:
+    # A SearchResult for an instant book move, or None when there is no book or the position is not in it
+    if book is None:
+        return None
+    move = book.choose(position, rng)
+    if move is None:
+        return None
+    result = SearchResult(move, 0, 0, 0, 0.0, [move])
+    result.book = True
+    return result
+
+
+def collect_games(games: Iterable[Tuple[str, List[int], str]], max_plies: int = 20) -> Dict[Tuple[int, int], int]:
+    # Weights for (position hash, move) over the first max_plies of each (start fen, moves, result) game:
+    # two points for every win by the side that played the move, one for every draw or unknown result
+    weights: Dict[Tuple[int, int], int] = {}
+    for start_fen, moves, result in games:
+        position = Position.from_fen(start_fen)
+        for move in moves[:max_plies]:
+            if result == '1/2-1/2' or result == '*':
+                points = 1
+            elif (result == '1-0') == (position.turn != BLACK):
+                points = 2
+            else:
+                points = 0
+            key = (position.hash, move)
+            weights[key] = weights.get(key, 0) + points
+            position.make_move(move)
+    return weights
+
+
+def write_book(path: str, weights: Dict[Tuple[int, int], int], min_weight: int = 1) -> int:
+    # Write the entries sorted by key then descending weight; returns how many were written
+    entries = sorted(((key, move, min(weight, MAX_WEIGHT)) for (key, move), weight in weights.items()
+                      if weight >= min_weight), key=lambda entry: (entry[0], -entry[2], entry[1]))
+    with open(path, 'wb') as out:
+        for key, move, weight in entries:
+            out.write(ENTRY.pack(key, move, weight, 0))
+    return len(entries)
+
+
+def pgn_games(paths: Iterable[str]) -> Iterable[Tuple[str, List[int], str]]:
+    # (start fen, moves, result) for every readable game in the PGN files; unreadable games are skipped
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            for game in read_games(stream):
+                try:
+                    yield game.start_fen, game.moves(), game.result
+                except (PgnError, ValueError):
+                    continue
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Build or query a memory-mapped opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from PGN files')
+    build.add_argument('book')
+    build.add_argument('pgn', nargs='+')
+    build.add_argument('--plies', type=int, default=20, help='book depth in plies')
+    build.add_argument('--min-weight', type=int, default=2, help='drop moves with a lower total weight')
+    probe = commands.add_parser('probe', help='list the book moves for a position')
+    probe.add_argument('book')
+    probe.add_argument('--fen', default=START_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        written = write_book(args.book, collect_games(pgn_games(args.pgn), args.plies), args.min_weight)
+        print('{} entries written to {}'.format(written, args.book))
+        return 0
+    with OpeningBook(args.book) as book:
+        for move, weight in book.moves(Position.from_fen(args.fen)):
+            print('{} {}'.format(move_name(move), weight))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
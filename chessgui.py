@@ -6,17 +6,24 @@ Automatically generated by Colaboratory.
 Original file is located at
     https://colab.research.google.com/drive/17ZtXYWSP4Sk74DUjVRKqaazhvFlHChlY
 
-IMPORTANT!
-
-Make sure that the Piece class has the static attribute:
-
-SPRITESHEET = pg.image.load('./images/pieces.png')
+Piece sprites come from the shared atlas in sprites.py, which decodes
+./images/pieces.png the first time a piece is drawn.
 """
 
+import time
+
 import pygame as pg
 import pygame_gui as gui
+from board_renderer import BoardRenderer
+from engine_thread import DONE, ERROR, PROGRESS
 from game import *
 
+ACTIVE_FPS = 30
+# How long to stay at full frame rate after the last event or board change, in seconds
+ACTIVE_LINGER = 0.5
+# While idle the loop blocks on the event queue, waking this often (ms) to let pygame_gui animate
+IDLE_TIMEOUT_MS = 250
+
 
 class GUI:
     def __init__(self) -> None:
@@ -24,7 +31,6 @@ class GUI:
         self._game = Game()
         self._screen = pg.display.set_mode((1440, 900))
         pg.display.set_caption("Laker Chess")
-        self._pieces = pg.image.load("./images/pieces.png")
         self._ui_manager = gui.UIManager((1440, 900))
         self._side_box = gui.elements.UITextBox('<b>Laker Chess</b><br /><br />White moves first.<br />', relative_rect=pg.Rect((1000, 100), (400, 500)),
                                  manager=self._ui_manager)
@@ -35,50 +41,58 @@ class GUI:
         self._piece_selected = False
         self._first_selected = (0, 0)
         self._second_selected = (0, 0)
-        self._valid_moves = []
+        self._valid_moves = set()
+        self._renderer = BoardRenderer(self._screen, 105)
+        # Only this part of the window belongs to pygame_gui; the board is updated square by square
+        self._ui_rect = pg.Rect((1000, 50), (400, 550))
+        self._active_until = 0.0
+        # Everything written to the side box, so the live search readout can be redrawn below it
+        self._log = '<b>Laker Chess</b><br /><br />White moves first.<br />'
 
     def run_game(self) -> None:
         running = True
         time_delta = 0
         clock = pg.time.Clock()
+        self._wake()
+        self._screen.fill((255, 255, 255))
+        pg.draw.line(self._screen, (0, 0, 0), (0, 840), (840, 840))
+        pg.draw.line(self._screen, (0, 0, 0), (840, 840), (840, 0))
+        self._renderer.invalidate()
+        self.__draw_board__()
+        pg.display.flip()
         while running:
-            for event in pg.event.get():
+            if self._is_active():
+                events = pg.event.get()
+            else:
+                # Idle: sleep until input arrives, waking now and then so pygame_gui can animate
+                event = pg.event.wait(IDLE_TIMEOUT_MS)
+                events = [] if event.type == pg.NOEVENT else [event] + pg.event.get()
+            for event in events:
+                self._wake()
                 if event.type == pg.QUIT:
                     running = False
-                if event.type == pg.MOUSEBUTTONDOWN:
+                # The board ignores clicks while the computer is thinking
+                if event.type == pg.MOUSEBUTTONDOWN and self._game.engine_job is None:
                     x, y = pg.mouse.get_pos()
                     y, x = self.__get_coords__(y, x)
                     piece = self._game.get(y, x)
                     if not self._piece_selected and piece:
-                        if piece.color != self._game.current_player:
+                        if piece.color != self._game.turn:
                             continue
-                        self._piece_selected = True
-                        self._first_selected = y, x
-                        self._valid_moves = piece.valid_moves(y, x)
                         self._piece_selected = piece
+                        self._first_selected = y, x
+                        self._valid_moves = set(self._game.valid_moves(y, x))
                     elif self._piece_selected and (y, x) in self._valid_moves:
                         target = self._game.get(y, x)
-                        moved = self._game.move(self._piece_selected, self._first_selected[0], self._first_selected[1], y, x)
-                        if moved:
-                            self._side_box.append_html_text(self._piece_selected.color.name + ' moved '
-                                                  + str(type(self._piece_selected).__name__))
+                        if self._game.move(self._first_selected, (y, x)):
+                            self._write(self._piece_selected.color + ' moved ' + type(self._piece_selected).__name__)
                             if target:
-                                self._side_box.append_html_text(' and captures ' + str(type(target).__name__))
-                            self._side_box.append_html_text('<br />')
-                            computer_message = self._game._computer_move()
-                            if computer_message:
-                                self._side_box.append_html_text(computer_message)
+                                self._write(' and captures ' + type(target).__name__)
+                            self._write('<br />')
+                            self._game.start_computer_move()
                         else:
-                            self._side_box.append_html_text('Invalid move.  Would leave '
-                                                            + str(self._piece_selected.color.name) + ' in check.<br />')
-                        if self._game.check(Color.WHITE):
-                            self._side_box.append_html_text("WHITE is in CHECK!<br />")
-                        if self._game.check(Color.BLACK):
-                            self._side_box.append_html_text("BLACK is in CHECK!<br />")
-                        if self._game.mate(Color.WHITE):
-                            self._side_box.append_html_text("WHITE is in CHECKMATE!<br />GAME OVER!")
-                        if self._game.mate(Color.BLACK):
-                            self._side_box.append_html_text("BLACK is in CHECKMATE!<br />GAME OVER!")
+                            self._write('Invalid move.<br />')
+                        self._report_status()
 
                         self._piece_selected = False
                     else:
@@ -86,47 +100,83 @@ class GUI:
                 if event.type == gui.UI_BUTTON_PRESSED:
                     if event.ui_element == self._restart_button:
                         self._game.reset()
-                        self._side_box.set_text("Restarting game...<br />")
+                        self._log = "Restarting game...<br />"
+                        self._side_box.set_text(self._log)
                     if event.ui_element == self._undo_button:
+                        if self._game.engine_job is not None:
+                            # Undo cancels the search in progress; drop its live readout
+                            self._side_box.set_text(self._log)
                         if self._game.undo():
-                            self._side_box.append_html_text('Undoing move.<br />')
+                            self._write('Undoing move.<br />')
                         else:
-                            self._side_box.append_html_text('Nothing to undo.<br />')
-            self._ui_manager.process_events(event)
-
-            self._screen.fill((255, 255, 255))
-            self.__draw_board__()
+                            self._write('Nothing to undo.<br />')
+                self._ui_manager.process_events(event)
+
+            if self._game.engine_job is not None:
+                self._poll_engine()
+                self._wake()
+            dirty = self.__draw_board__()
+            if dirty:
+                self._wake()
+            self._screen.fill((255, 255, 255), self._ui_rect)
             self._ui_manager.draw_ui(self._screen)
             self._ui_manager.update(time_delta)
 
-            pg.display.flip()
-            time_delta = clock.tick(30) / 1000.0
+            pg.display.update(dirty + [self._ui_rect])
+            # Full frame rate only while something is changing; an idle tick just measures the time slept
+            time_delta = clock.tick(ACTIVE_FPS if self._is_active() else 0) / 1000.0
+
+    def _write(self, html: str) -> None:
+        self._log += html
+        self._side_box.append_html_text(html)
+
+    def _report_status(self) -> None:
+        # Each query is a cache lookup after the first one for a position
+        if self._game.check('white'):
+            self._write("WHITE is in CHECK!<br />")
+        if self._game.check('black'):
+            self._write("BLACK is in CHECK!<br />")
+        if self._game.mate('white'):
+            self._write("WHITE is in CHECKMATE!<br />GAME OVER!")
+        if self._game.mate('black'):
+            self._write("BLACK is in CHECKMATE!<br />GAME OVER!")
+        if self._game.stalemate(self._game.turn):
+            self._write("STALEMATE!<br />GAME OVER!")
+
+    def _poll_engine(self) -> None:
+        # Stream the background search into the side box and play its move once it is done
+        job = self._game.engine_job
+        for kind, payload in job.poll():
+            if kind == PROGRESS:
+                # The live line is shown below the log and replaced on every finished depth
+                self._side_box.set_text(self._log + 'Thinking: depth {} / {} nodes / {}<br />'.format(
+                    payload.depth, payload.nodes, payload.pv_text()))
+            elif kind == ERROR:
+                self._game.engine_job = None
+                self._side_box.set_text(self._log)
+                self._write('Engine error: {}<br />'.format(payload))
+            elif kind == DONE:
+                self._side_box.set_text(self._log)
+                if self._game.finish_computer_move(job):
+                    self._write('Computer plays ' + payload.summary() + '<br />')
+                    self._report_status()
+
+    def _wake(self) -> None:
+        self._active_until = time.monotonic() + ACTIVE_LINGER
+
+    def _is_active(self) -> bool:
+        return time.monotonic() < self._active_until
 
     def __get_coords__(self, y, x):
         grid_x = x // 105
         grid_y = y // 105
         return grid_y, grid_x
 
-    def __draw_board__(self) -> None:
-        count = 0
-        color = (255, 255, 255)
-        for y in range(0, 8):
-            for x in range(0, 8):
-                if count % 2 == 0:
-                    color = (255, 255, 255)
-                else:
-                    color = (127, 127, 127)
-                count = count + 1
-                pg.draw.rect(self._screen, color, pg.rect.Rect(x * 105, y * 105, 105, 105))
-                if self._piece_selected and (y, x) == self._first_selected:
-                    pg.draw.rect(self._screen, (255, 0, 0), pg.rect.Rect(x * 105, y * 105, 105, 105), 2)
-                if self._valid_moves and self._piece_selected and (y, x) in self._valid_moves:
-                    pg.draw.rect(self._screen, (0, 0, 255), pg.rect.Rect(x * 105, y * 105, 105, 105), 2)
-                if self._game.get(y, x):
-                    self._screen.blit(self._game.get(y, x)._image, (x * 105, y * 105))
-            count = count + 1
-        pg.draw.line(self._screen, (0, 0, 0), (0, 840), (840, 840))
-        pg.draw.line(self._screen, (0, 0, 0), (840, 840), (840, 0))
+    def __draw_board__(self) -> list:
+        # Redraw only the squares that changed and return their rects
+        selected = self._first_selected if self._piece_selected else None
+        moves = self._valid_moves if self._piece_selected else ()
+        return self._renderer.draw(self._game.get, selected, moves, self._game.position_key())
 
 
 def main():
@@ -0,0 +1,75 @@
+import queue
+import random
+import threading
+from typing import List, Optional, Tuple
+
+from bitboard import Position
+from book import OpeningBook, book_result
+from search import SearchResult
+
+# Runs an engine search on a worker thread so the GUI keeps drawing while
+# the computer thinks; book moves come back without a search.  The search
+# gets its own copy of the position; every finished iteration and the
+# final result are put on a thread-safe queue that the GUI drains once per
+# frame.
+
+PROGRESS = 'progress'
+DONE = 'done'
+ERROR = 'error'
+
+
+class EngineJob:
+    def __init__(self, engine, position: Position, time_ms: int, book: Optional[OpeningBook] = None,
+                 book_rng: Optional[random.Random] = None):
+        self.engine = engine
+        self.book = book
+        self._book_rng = book_rng
+        # Hash of the position searched, so a result is never played on a board that has since changed
+        self.key = position.hash
+        self.results: 'queue.Queue[Tuple[str, object]]' = queue.Queue()
+        self.result: Optional[SearchResult] = None
+        self.cancelled = False
+        self._position = position.copy()
+        self._time_ms = time_ms
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='engine-search', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            result = book_result(self.book, self._position, self._book_rng)
+            if result is None:
+                result = self.engine.search(self._position, self._time_ms, stop_event=self._stop,
+                                            progress=lambda info: self.results.put((PROGRESS, info)))
+        except Exception as error:
+            self.results.put((ERROR, error))
+            return
+        self.results.put((DONE, result))
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def poll(self) -> List[Tuple[str, object]]:
+        # All messages queued since the last poll, without blocking
+        messages = []
+        while True:
+            try:
+                kind, payload = self.results.get_nowait()
+            except queue.Empty:
+                return messages
+            if kind == DONE:
+                self.result = payload
+            messages.append((kind, payload))
+
+    def cancel(self) -> None:
+        # Stop the search and wait for the thread to finish, so the engine, its tables and the position
+        # are free for the next job.  The search checks the stop flag every few hundred nodes.
+        self.cancelled = True
+        self._stop.set()
+        self._thread.join()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[SearchResult]:
+        self._thread.join(timeout)
+        self.poll()
+        return self.result
@@ -0,0 +1,31 @@
+from bitboard import WHITE, BLACK, Position, iter_bits
+# The tables live in psqt.py and are re-exported here for the search and batch_evaluate.py
+from psqt import ENDGAME, MAX_PHASE, MIDDLEGAME, PHASE_WEIGHTS, PIECE_VALUES
+
+# Static evaluation in centipawns: material plus piece-square tables, tapered
+# between middlegame and endgame by the non-pawn material left on the board.
+# Position keeps the table totals and the phase up to date as pieces are put
+# and removed, so evaluate() does not look at the board at all.
+
+
+def evaluate(position: Position) -> int:
+    # Score from the side to move's point of view
+    phase = min(position.phase, MAX_PHASE)
+    score = (position.middlegame * phase + position.endgame * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if position.turn == WHITE else -score
+
+
+def evaluate_from_scratch(position: Position) -> int:
+    # The same score summed over every piece; for checking the running totals
+    middlegame = endgame = phase = 0
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        mid_tables = MIDDLEGAME[color]
+        end_tables = ENDGAME[color]
+        for kind, bb in enumerate(position.pieces[color]):
+            for sq in iter_bits(bb):
+                middlegame += sign * mid_tables[kind][sq]
+                endgame += sign * end_tables[kind][sq]
+                phase += PHASE_WEIGHTS[kind]
+    phase = min(phase, MAX_PHASE)
+    score = (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if position.turn == WHITE else -score
@@ -0,0 +1,389 @@
+import argparse
+import heapq
+import mmap
+import os
+import re
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from bitboard import START_FEN, Position, move_name
+from pgn import PgnError, read_games
+
+# Local store of played games with position lookups that never scan the
+# corpus.
+#
+# games.dat is an append-only file of game records: a small header, the
+# start FEN when it is not the standard one, then the moves in our 16-bit
+# encoding.  games.off holds one 8-byte offset per game, so the game id is
+# simply its index there.
+#
+# Two kinds of index point back into the games, both keyed by the Zobrist
+# hash of a position:
+#   positions segments: (key, game id, ply), one entry per position reached
+#   moves segments:     (key, move, games, white wins, draws, black wins)
+# Each segment is a sorted, fixed-width file read through mmap and binary
+# searched, like the opening book.  New games are indexed in memory and
+# written out as a further segment by flush().  Segments are merged by size
+# tier: once MERGE_FACTOR segments of the same tier follow each other, they
+# become one segment of the next tier, so a database of N games has
+# O(log N) segments of each kind.  compact() merges everything into one.
+# A segment's file name records the range of game ids it covers, so after
+# a crash the games not covered yet are simply indexed again when the
+# database is opened.
+
+GAME_HEADER = struct.Struct('<BBH')  # result code, start FEN length (0 for the start position), plies
+MOVE = struct.Struct('<H')
+OFFSET = struct.Struct('<Q')
+POSITION_ENTRY = struct.Struct('>QII')
+MOVE_ENTRY = struct.Struct('>QHIIII')
+
+RESULT_CODES = ('*', '1-0', '1/2-1/2', '0-1')
+POSITIONS = 'positions'
+MOVES = 'moves'
+_ENTRIES = {POSITIONS: POSITION_ENTRY, MOVES: MOVE_ENTRY}
+_SEGMENT_NAME = re.compile(r'^(positions|moves)\.(\d+)-(\d+)\.seg$')
+
+# Games indexed in memory before add_game() writes them out as new segments
+FLUSH_GAMES = 1000
+# Segments of one size tier that are merged into one of the next tier
+MERGE_FACTOR = 4
+
+Key = Union[int, Position]
+
+
+class MoveStats:
+    def __init__(self, move: int, games: int = 0, white_wins: int = 0, draws: int = 0, black_wins: int = 0):
+        self.move = move
+        self.games = games
+        self.white_wins = white_wins
+        self.draws = draws
+        self.black_wins = black_wins
+
+    def add(self, games: int, white_wins: int, draws: int, black_wins: int) -> None:
+        self.games += games
+        self.white_wins += white_wins
+        self.draws += draws
+        self.black_wins += black_wins
+
+    def __repr__(self) -> str:
+        return '{} {} games +{} ={} -{}'.format(move_name(self.move), self.games, self.white_wins, self.draws,
+                                               self.black_wins)
+
+
+def _result_counts(result: str) -> Tuple[int, int, int]:
+    # (white wins, draws, black wins) contributed by one game; unfinished games count towards none
+    return result == '1-0', result == '1/2-1/2', result == '0-1'
+
+
+def _key(position: Key) -> int:
+    return position.hash if isinstance(position, Position) else position
+
+
+class _Segment:
+    def __init__(self, path: str, kind: str, first: int, end: int):
+        self.path = path
+        self.kind = kind
+        # Range of game ids indexed in this segment
+        self.first = first
+        self.end = end
+        self.entry = _ENTRIES[kind]
+        # The mapping keeps the file open by itself, so the file object is not kept
+        with open(path, 'rb') as stream:
+            size = os.fstat(stream.fileno()).st_size
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.entries = size // self.entry.size
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _lower_bound(self, key: int) -> int:
+        low, high = 0, self.entries
+        size = self.entry.size
+        while low < high:
+            middle = (low + high) >> 1
+            if self.entry.unpack_from(self._map, middle * size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, key: int) -> Tuple[int, int]:
+        # Indices [first, end) of the entries stored under key
+        if self._map is None:
+            return 0, 0
+        return self._lower_bound(key), self._lower_bound(key + 1)
+
+    def entries_for(self, key: int, limit: Optional[int] = None) -> Iterator[tuple]:
+        first, end = self.range(key)
+        if limit is not None:
+            end = min(end, first + limit)
+        size = self.entry.size
+        for index in range(first, end):
+            yield self.entry.unpack_from(self._map, index * size)
+
+    def __iter__(self) -> Iterator[tuple]:
+        size = self.entry.size
+        for index in range(self.entries):
+            yield self.entry.unpack_from(self._map, index * size)
+
+
+class GameDatabase:
+    def __init__(self, directory: str, flush_games: int = FLUSH_GAMES):
+        self.directory = directory
+        self.flush_games = flush_games
+        os.makedirs(directory, exist_ok=True)
+        self._games = open(os.path.join(directory, 'games.dat'), 'a+b')
+        self._offsets = open(os.path.join(directory, 'games.off'), 'a+b')
+        self._offsets.seek(0)
+        data = self._offsets.read()
+        if len(data) % OFFSET.size:
+            # Drop an offset cut short by a crash; its game record is then ignored
+            data = data[:len(data) - len(data) % OFFSET.size]
+            self._offsets.truncate(len(data))
+        self._game_offsets = [offset for offset, in OFFSET.iter_unpack(data)]
+        self.segments: Dict[str, List[_Segment]] = {POSITIONS: [], MOVES: []}
+        # Per kind, the first game id that no segment covers yet
+        self._indexed = {POSITIONS: 0, MOVES: 0}
+        self._pending_positions: Dict[int, List[Tuple[int, int]]] = {}
+        self._pending_moves: Dict[int, Dict[int, MoveStats]] = {}
+        self._open_segments()
+        for game_id in range(min(self._indexed.values()), len(self._game_offsets)):
+            start_fen, moves, result = self.game(game_id)
+            self._index_game(game_id, start_fen, moves, result)
+
+    def _open_segments(self) -> None:
+        found = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                found.append((match.group(1), int(match.group(2)), int(match.group(3)), name))
+        for kind, first, end, name in found:
+            # A segment inside the range of a wider one was left behind by an interrupted compact()
+            if any(other[0] == kind and other[1] <= first and end <= other[2] and other[2] - other[1] > end - first
+                   for other in found):
+                os.remove(os.path.join(self.directory, name))
+                continue
+            self.segments[kind].append(_Segment(os.path.join(self.directory, name), kind, first, end))
+            self._indexed[kind] = max(self._indexed[kind], end)
+        for segments in self.segments.values():
+            segments.sort(key=lambda segment: segment.first)
+
+    def close(self) -> None:
+        if self._games.closed:
+            return
+        self.flush()
+        for segments in self.segments.values():
+            for segment in segments:
+                segment.close()
+        self._games.close()
+        self._offsets.close()
+
+    def __enter__(self) -> 'GameDatabase':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._game_offsets)
+
+    def add_game(self, moves: List[int], start_fen: str = START_FEN, result: str = '*') -> int:
+        # Append a game and index it; returns its id
+        game_id = len(self._game_offsets)
+        fen = b'' if start_fen == START_FEN else start_fen.encode('ascii')
+        self._games.seek(0, os.SEEK_END)
+        offset = self._games.tell()
+        self._games.write(GAME_HEADER.pack(RESULT_CODES.index(result), len(fen), len(moves)) + fen
+                          + b''.join(MOVE.pack(move) for move in moves))
+        self._games.flush()
+        # The offset goes in last, so a record cut short by a crash is never referenced
+        self._offsets.write(OFFSET.pack(offset))
+        self._offsets.flush()
+        self._game_offsets.append(offset)
+        self._index_game(game_id, start_fen, moves, result)
+        if len(self._game_offsets) - min(self._indexed.values()) >= self.flush_games:
+            self.flush()
+        return game_id
+
+    def game(self, game_id: int) -> Tuple[str, List[int], str]:
+        # (start fen, moves, result) of a stored game
+        self._games.seek(self._game_offsets[game_id])
+        result, fen_length, plies = GAME_HEADER.unpack(self._games.read(GAME_HEADER.size))
+        start_fen = self._games.read(fen_length).decode('ascii') if fen_length else START_FEN
+        data = self._games.read(plies * MOVE.size)
+        return start_fen, [move for move, in MOVE.iter_unpack(data)], RESULT_CODES[result]
+
+    def _index_game(self, game_id: int, start_fen: str, moves: List[int], result: str) -> None:
+        index_positions = game_id >= self._indexed[POSITIONS]
+        index_moves = game_id >= self._indexed[MOVES]
+        counts = _result_counts(result)
+        position = Position.from_fen(start_fen)
+        for ply in range(len(moves) + 1):
+            key = position.hash
+            if index_positions:
+                self._pending_positions.setdefault(key, []).append((game_id, ply))
+            if ply == len(moves):
+                break
+            move = moves[ply]
+            if index_moves:
+                stats = self._pending_moves.setdefault(key, {})
+                if move not in stats:
+                    stats[move] = MoveStats(move)
+                stats[move].add(1, *counts)
+            position.make_move(move)
+
+    def flush(self) -> None:
+        # Write the games indexed in memory out as one new segment of each kind, then merge full tiers
+        end = len(self._game_offsets)
+        if self._pending_positions:
+            entries = sorted((key, game_id, ply) for key, games in self._pending_positions.items()
+                             for game_id, ply in games)
+            self.segments[POSITIONS].append(self._write_segment(POSITIONS, self._indexed[POSITIONS], end, entries))
+        if self._pending_moves:
+            entries = sorted((key, move, stats.games, stats.white_wins, stats.draws, stats.black_wins)
+                             for key, moves in self._pending_moves.items() for move, stats in moves.items())
+            self.segments[MOVES].append(self._write_segment(MOVES, self._indexed[MOVES], end, entries))
+        self._pending_positions = {}
+        self._pending_moves = {}
+        self._indexed = {POSITIONS: end, MOVES: end}
+        for kind in self.segments:
+            self._merge_tiers(kind)
+
+    def _tier(self, segment: _Segment) -> int:
+        # 0 for segments of fewer than MERGE_FACTOR flushes of games, 1 for up to MERGE_FACTOR ** 2, ...
+        games = segment.end - segment.first
+        tier = 0
+        while games >= self.flush_games * MERGE_FACTOR ** (tier + 1):
+            tier += 1
+        return tier
+
+    def _merge_tiers(self, kind: str) -> None:
+        # The newest segments are the smallest, so a full tier is always a run at the end of the list
+        segments = self.segments[kind]
+        while len(segments) >= MERGE_FACTOR:
+            run = segments[-MERGE_FACTOR:]
+            tier = self._tier(run[-1])
+            if any(self._tier(segment) != tier for segment in run):
+                break
+            segments[-MERGE_FACTOR:] = [self._merge(kind, run)]
+
+    def _merge(self, kind: str, segments: List[_Segment]) -> _Segment:
+        # One segment holding the entries of segments, which cover consecutive game ids; the old files go
+        first = min(segment.first for segment in segments)
+        end = max(segment.end for segment in segments)
+        merged = heapq.merge(*segments)
+        if kind == MOVES:
+            merged = _sum_move_entries(merged)
+        combined = self._write_segment(kind, first, end, merged)
+        for segment in segments:
+            segment.close()
+            os.remove(segment.path)
+        return combined
+
+    def _write_segment(self, kind: str, first: int, end: int, entries: Iterable[tuple]) -> _Segment:
+        path = os.path.join(self.directory, '{}.{}-{}.seg'.format(kind, first, end))
+        entry = _ENTRIES[kind]
+        with open(path + '.tmp', 'wb') as out:
+            for values in entries:
+                out.write(entry.pack(*values))
+        os.replace(path + '.tmp', path)
+        return _Segment(path, kind, first, end)
+
+    def compact(self) -> None:
+        # Merge every segment of each kind into one, so a lookup is a single binary search
+        self.flush()
+        for kind, segments in self.segments.items():
+            if len(segments) >= 2:
+                self.segments[kind] = [self._merge(kind, segments)]
+
+    def occurrences(self, position: Key, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        # (game id, ply) for the games that reach position, oldest game first
+        key = _key(position)
+        found = []
+        for segment in self.segments[POSITIONS]:
+            found.extend((game_id, ply) for _, game_id, ply in segment.entries_for(key, limit))
+            if limit is not None and len(found) >= limit:
+                return found[:limit]
+        found.extend(self._pending_positions.get(key, ()))
+        return found if limit is None else found[:limit]
+
+    def count(self, position: Key) -> int:
+        # How many times position was reached over all games, from the index ranges alone
+        key = _key(position)
+        total = len(self._pending_positions.get(key, ()))
+        for segment in self.segments[POSITIONS]:
+            first, end = segment.range(key)
+            total += end - first
+        return total
+
+    def move_stats(self, position: Key) -> List[MoveStats]:
+        # Every move played from position with its game count and results, most played first
+        key = _key(position)
+        totals: Dict[int, MoveStats] = {}
+        for segment in self.segments[MOVES]:
+            for _, move, games, white_wins, draws, black_wins in segment.entries_for(key):
+                totals.setdefault(move, MoveStats(move)).add(games, white_wins, draws, black_wins)
+        for move, stats in self._pending_moves.get(key, {}).items():
+            totals.setdefault(move, MoveStats(move)).add(stats.games, stats.white_wins, stats.draws,
+                                                         stats.black_wins)
+        return sorted(totals.values(), key=lambda stats: (-stats.games, stats.move))
+
+
+def _sum_move_entries(entries: Iterable[tuple]) -> Iterator[tuple]:
+    # Merge adjacent entries for the same (key, move) coming from different segments
+    current = None
+    for entry in entries:
+        if current is not None and entry[:2] == current[:2]:
+            current = current[:2] + tuple(a + b for a, b in zip(current[2:], entry[2:]))
+            continue
+        if current is not None:
+            yield current
+        current = entry
+    if current is not None:
+        yield current
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Store games and look up the positions they reach.')
+    parser.add_argument('database', help='database directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('import', help='add the games of PGN files')
+    add.add_argument('pgn', nargs='+')
+    stats = commands.add_parser('stats', help='moves played from a position, with their results')
+    stats.add_argument('--fen', default=START_FEN)
+    games = commands.add_parser('games', help='games that reach a position')
+    games.add_argument('--fen', default=START_FEN)
+    games.add_argument('--limit', type=int, default=20)
+    commands.add_parser('compact', help='merge the index segments')
+    args = parser.parse_args(argv)
+
+    with GameDatabase(args.database) as database:
+        if args.command == 'import':
+            added = skipped = 0
+            for path in args.pgn:
+                with open(path, encoding='utf-8', errors='replace') as stream:
+                    for game in read_games(stream):
+                        try:
+                            database.add_game(game.moves(), game.start_fen, game.result)
+                            added += 1
+                        except (PgnError, ValueError):
+                            skipped += 1
+            print('{} games added, {} unreadable, {} in the database'.format(added, skipped, len(database)))
+        elif args.command == 'stats':
+            for move_stats in database.move_stats(Position.from_fen(args.fen)):
+                print(move_stats)
+        elif args.command == 'games':
+            position = Position.from_fen(args.fen)
+            print('reached {} times'.format(database.count(position)))
+            for game_id, ply in database.occurrences(position, args.limit):
+                print('game {} ply {}'.format(game_id, ply))
+        else:
+            database.compact()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
-import pygame
+import sprites
 from typing import List, Tuple
 from enum import Enum
+from bitboard import WHITE, Position, position_from_board
 
 
 class Color(Enum):
@@ -9,32 +10,40 @@ class Color(Enum):
 
 
 class Piece:
-    SPRITESHEET = pygame.image.load("images/pieces.png")
+    # Pieces hold no per-square state, so there is one shared instance per (type, color)
+    __slots__ = ('_color',)
+    SPRITESHEET = sprites.LazySheet()
+    SQUARE_SIZE = 105
+    _instances = {}
+
+    def __new__(cls, color: Color):
+        piece = Piece._instances.get((cls, color))
+        if piece is None:
+            piece = Piece._instances[cls, color] = super().__new__(cls)
+        return piece
 
     def __init__(self, color: Color):
         self._color = color
-        self._image = pygame.Surface((105, 105), pygame.SRCALPHA)
 
     @property
     def color(self):
         return self._color
 
-    def set_image(self, x: int, y: int) -> None:
-        self._image.blit(Piece.SPRITESHEET, (0, 0), pygame.rect.Rect(x, y, 105, 105))
+    @property
+    def _image(self) -> 'pygame.Surface':
+        # Shared with every other piece of the same type and color
+        return sprites.get_sprite(type(self).__name__, self._color, Piece.SQUARE_SIZE)
 
     def valid_moves(self, y: int, x: int) -> List[Tuple[int, int]]:
         pass
 
     def copy(self):
-        pass
+        # Shared and immutable, so a copy is the piece itself
+        return self
 
 
 class King(Piece):
-    def __init__(self, color: Color):
-        super().__init__(color)
-        x = 0 if color == Color.White else 105
-        y = 525
-        self.set_image(x, y)
+    __slots__ = ()
 
     def valid_moves(self, y: int, x: int) -> List[Tuple[int, int]]:
         directions = [
@@ -51,16 +60,9 @@ class King(Piece):
 
         return moves
 
-    def copy(self):
-        return King(self.color)
-
 
 class Queen(Piece):
-    def __init__(self, color: Color):
-        super().__init__(color)
-        x = 210 if color == Color.White else 315
-        y = 525
-        self.set_image(x, y)
+    __slots__ = ()
 
     def valid_moves(self, y: int, x: int) -> List[Tuple[int, int]]:
         moves = []
@@ -70,15 +72,9 @@ class Queen(Piece):
 
         return moves
 
-    def copy(self):
-        return Queen(self.color)
 
 class Knight(Piece):
-    def __init__(self, color: Color):
-        super().__init__(color)
-        x = 630 if color == Color.White else 735
-        y = 525
-        self.set_image(x, y)
+    __slots__ = ()
 
     def valid_moves(self, y: int, x: int) -> List[Tuple[int, int]]:
         directions = [
@@ -97,29 +93,16 @@ class Knight(Piece):
 
         return moves
 
-    def copy(self):
-        return King(self.color)
-
 
 class Bishop(Piece):
-    def __init__(self, color: Color):
-        super().__init__(color)
-        x = 420 if color == Color.White else 525
-        y = 525
-        self.set_image(x, y)
+    __slots__ = ()
 
     def valid_moves(self, y: int, x: int) -> List[Tuple[int, int]]:
         return self.get_diagonal_moves(y, x)
 
-    def copy(self):
-        return Bishop(self.color)
 
 class Rook(Piece):
-    def __init__(self, color: Color):
-        super().__init__(color)
-        x = 840 if color == Color.White else 945
-        y = 525
-        self.set_image(x, y)
+    __slots__ = ()
 
     def valid_moves(self, y: int, x: int) -> List[Tuple[int, int]]:
         moves = []
@@ -128,16 +111,9 @@ class Rook(Piece):
 
         return moves
 
-    def copy(self):
-        return Rook(self.color)
-
 
 class Pawn(Piece):
-    def __init__(self, color: Color):
-        super().__init__(color)
-        x = 1050 if color == Color.White else 1155
-        y = 525
-        self.set_image(x, y)
+    __slots__ = ()
 
     def valid_moves(self, y: int, x: int) -> List[Tuple[int, int]]:
         moves = []
@@ -156,8 +132,9 @@ class Pawn(Piece):
 
         return moves
 
-    def copy(self):
-        return Pawn(self.color)
+
+# In the bitboard's kind order: pawn, knight, bishop, rook, queen, king
+PIECE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
 
 
 class Game:
@@ -213,8 +190,15 @@ class Game:
             self.board[1][i] = Pawn(Color.White)
             self.board[6][i] = Pawn(Color.Black)
 
-        # Set images for all pieces
-        for i in range(8):
-            for j in range(8):
-                if self.board[i][j]:
-                    self.board[i][j].set_image(j * 105, i * 105)
\ No newline at end of file
+    def load_fen(self, fen: str) -> None:
+        # Replace the board with the pieces of a FEN position
+        position = Position.from_fen(fen)
+        self.board = [[None for _ in range(8)] for _ in range(8)]
+        for sq, code in enumerate(position.mailbox):
+            if code is not None:
+                color = Color.White if code[0] == WHITE else Color.Black
+                self.board[sq >> 3][sq & 7] = PIECE_TYPES[code[1]](color)
+
+    def fen(self, turn: str = 'white') -> str:
+        # The board as FEN; castling rights are kept where king and rook still stand on their home squares
+        return position_from_board(self.board, turn).fen()
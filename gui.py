@@ -35,7 +35,6 @@ class GUI:
         self._game = Game()
         self._screen = pg.display.set_mode((1440, 900))
         pg.display.set_caption("Laker Chess")
-        self._pieces = pg.image.load("./images/pieces.png")
         self._ui_manager = gui.UIManager((1440, 900))
         self._side_box = gui.elements.UITextBox('<b>Laker Chess</b><br /><br />White moves first.<br />',
                                                 relative_rect=pg.Rect((1000, 100), (400, 500)),
@@ -1,11 +1,11 @@
 import pygame
 from Scripts.gamefinal import Game
+from board_renderer import BoardRenderer
 
 pygame.init()
 
 WIDTH = 840
 HEIGHT = 840
-FPS = 60
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -14,26 +14,25 @@ game = Game()
 
 WINDOW = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Chess")
-clock = pygame.time.Clock()
+renderer = BoardRenderer(WINDOW, 105, WHITE, BLACK)
 
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
 
-    WINDOW.fill(WHITE)
+def get_piece(y, x):
+    return game.board[y][x]
+
 
-    for y in range(8):
-        for x in range(8):
-            rect = pygame.Rect(x * 105, y * 105, 105, 105)
-            if (x + y) % 2 == 0:
-                pygame.draw.rect(WINDOW, WHITE, rect)
-            else:
-                pygame.draw.rect(WINDOW, BLACK, rect)
+running = True
+while running:
+    # Nothing on this board animates, so sleep on the event queue instead of polling at a fixed frame rate
+    events = [pygame.event.wait()] + pygame.event.get()
+    for event in events:
+        if event.type == pygame.QUIT:
+            running = False
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            renderer.invalidate()
 
-            piece = game.board[y][x]
-            if piece:
-                WINDOW.blit(piece._image, rect)
+    if running:
+        # Only squares whose piece changed since the last frame are redrawn and sent to the display
+        pygame.display.update(renderer.draw(get_piece))
 
-    pygame.display.flip()
-    clock.tick(FPS)
+pygame.quit()
@@ -0,0 +1,204 @@
+from typing import List, Optional
+
+from attacks import BETWEEN, KING_ATTACKS, KNIGHT_ATTACKS, LINE, PAWN_ATTACKS, RAYS, bishop_attacks, rook_attacks
+from bitboard import (WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, FULL, ROW_1, ROW_8,
+                      WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+                      QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE, CAPTURE, EP_CAPTURE, PROMOTION,
+                      Position, iter_bits, lsb, north, south)
+
+# Every square a rook or bishop could see from sq on an empty board, used to find pinning pieces
+_ROOK_RAYS = [RAYS[0][sq] | RAYS[2][sq] | RAYS[4][sq] | RAYS[6][sq] for sq in range(64)]
+_BISHOP_RAYS = [RAYS[1][sq] | RAYS[3][sq] | RAYS[5][sq] | RAYS[7][sq] for sq in range(64)]
+
+# (right, king start, king end, flag, rook start, squares that must be empty, squares the king passes)
+_CASTLES = {
+    WHITE: ((WHITE_KINGSIDE, 4, 6, KING_CASTLE, 7, 0x60, (5, 6)),
+            (WHITE_QUEENSIDE, 4, 2, QUEEN_CASTLE, 0, 0x0E, (3, 2))),
+    BLACK: ((BLACK_KINGSIDE, 60, 62, KING_CASTLE, 63, 0x60 << 56, (61, 62)),
+            (BLACK_QUEENSIDE, 60, 58, QUEEN_CASTLE, 56, 0x0E << 56, (59, 58))),
+}
+_PROMOTION_FLAGS = tuple(PROMOTION | (kind - KNIGHT) for kind in (QUEEN, ROOK, BISHOP, KNIGHT))
+
+
+class CheckInfo:
+    # What the legality filter needs, worked out once from the king's square
+    def __init__(self, position: Position, color: int):
+        them = color ^ 1
+        self.king = position.king_square(color)
+        self.checkers = 0
+        self.pinned = 0
+        self.pin_lines = {}
+        # Squares a non-king move may land on: anywhere, or the checker and the squares in front of it
+        self.evasions = FULL
+        if self.king is None:
+            return
+        king = self.king
+        occupied = position.occupied
+        theirs = position.pieces[them]
+        self.checkers = position.attackers(king, them)
+        if self.checkers:
+            if self.checkers & (self.checkers - 1):
+                self.evasions = 0
+            else:
+                checker = lsb(self.checkers)
+                self.evasions = self.checkers | BETWEEN[king][checker]
+        snipers = ((_ROOK_RAYS[king] & (theirs[ROOK] | theirs[QUEEN]))
+                   | (_BISHOP_RAYS[king] & (theirs[BISHOP] | theirs[QUEEN])))
+        ours = position.occupancy[color]
+        for sniper in iter_bits(snipers):
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & ours:
+                self.pinned |= blockers
+                self.pin_lines[lsb(blockers)] = LINE[king][sniper]
+
+
+def _add_pawn_moves(moves: List[int], start: int, end: int, flag: int) -> None:
+    if end >> 3 in (0, 7):
+        capture = flag & CAPTURE
+        for promotion in _PROMOTION_FLAGS:
+            moves.append(start | (end << 6) | ((promotion | capture) << 12))
+    else:
+        moves.append(start | (end << 6) | (flag << 12))
+
+
+def generate_pseudo_moves(position: Position, color: Optional[int] = None, targets: int = FULL) -> List[int]:
+    # Moves that obey piece movement but may leave the king in check.  Non-king moves are limited to targets.
+    if color is None:
+        color = position.turn
+    them = color ^ 1
+    moves = []
+    mine = position.pieces[color]
+    ours = position.occupancy[color]
+    theirs = position.occupancy[them]
+    occupied = position.occupied
+    empty = FULL ^ occupied
+
+    # Pawns: pushes set-wise, captures from the attack table
+    pawns = mine[PAWN]
+    if color == WHITE:
+        single = north(pawns) & empty
+        double = north(single & (ROW_1 << 16)) & empty
+        step = 8
+    else:
+        single = south(pawns) & empty
+        double = south(single & (ROW_8 >> 16)) & empty
+        step = -8
+    for end in iter_bits(single & targets):
+        _add_pawn_moves(moves, end - step, end, QUIET)
+    for end in iter_bits(double & targets):
+        moves.append((end - 2 * step) | (end << 6) | (DOUBLE_PUSH << 12))
+    for start in iter_bits(pawns):
+        for end in iter_bits(PAWN_ATTACKS[color][start] & theirs & targets):
+            _add_pawn_moves(moves, start, end, CAPTURE)
+    ep_square = position.ep_square
+    if ep_square is not None and color == position.turn:
+        for start in iter_bits(PAWN_ATTACKS[them][ep_square] & pawns):
+            moves.append(start | (ep_square << 6) | (EP_CAPTURE << 12))
+
+    # Pieces
+    available = ~ours & targets
+    for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+        for start in iter_bits(mine[kind]):
+            if kind == KNIGHT:
+                attacks = KNIGHT_ATTACKS[start]
+            elif kind == BISHOP:
+                attacks = bishop_attacks(start, occupied)
+            elif kind == ROOK:
+                attacks = rook_attacks(start, occupied)
+            else:
+                attacks = bishop_attacks(start, occupied) | rook_attacks(start, occupied)
+            for end in iter_bits(attacks & available):
+                moves.append(start | (end << 6) | ((CAPTURE if theirs >> end & 1 else QUIET) << 12))
+
+    # King, including castling
+    king = position.king_square(color)
+    if king is not None:
+        for end in iter_bits(KING_ATTACKS[king] & ~ours):
+            moves.append(king | (end << 6) | ((CAPTURE if theirs >> end & 1 else QUIET) << 12))
+        for right, start, end, flag, rook, between, _ in _CASTLES[color]:
+            if (position.castling & right and king == start and mine[ROOK] >> rook & 1
+                    and not occupied & between):
+                moves.append(start | (end << 6) | (flag << 12))
+    return moves
+
+
+def is_legal(position: Position, move: int, info: CheckInfo, color: int) -> bool:
+    start = move & 63
+    end = (move >> 6) & 63
+    flag = move >> 12
+    them = color ^ 1
+    if start == info.king:
+        if flag == KING_CASTLE or flag == QUEEN_CASTLE:
+            if info.checkers:
+                return False
+            for _, _, _, castle_flag, _, _, passes in _CASTLES[color]:
+                if castle_flag == flag:
+                    return not any(position.attackers(sq, them) for sq in passes)
+        # The king itself must not shield the square it steps to from a slider behind it
+        return not position.attackers(end, them, position.occupied ^ (1 << start))
+    if flag == EP_CAPTURE:
+        # Rare enough to check by playing it: the capture removes two pieces from one rank
+        position.make_move(move)
+        legal = not position.in_check(color)
+        position.unmake_move()
+        return legal
+    if not (1 << end) & info.evasions:
+        return False
+    if info.pinned >> start & 1:
+        return bool(info.pin_lines[start] >> end & 1)
+    return True
+
+
+def is_pseudo_legal(position: Position, move: int) -> bool:
+    # Whether a move from outside the generator (hash table, killer slots) is one generate_pseudo_moves()
+    # could produce for the side to move; is_legal() must still vet it
+    color = position.turn
+    start = move & 63
+    end = (move >> 6) & 63
+    flag = move >> 12
+    mailbox = position.mailbox
+    code = mailbox[start]
+    if code is None or code[0] != color:
+        return False
+    kind = code[1]
+    if flag == KING_CASTLE or flag == QUEEN_CASTLE:
+        if kind != KING:
+            return False
+        for right, king, king_end, castle_flag, rook, between, _ in _CASTLES[color]:
+            if castle_flag == flag:
+                return bool(start == king and end == king_end and position.castling & right
+                            and position.pieces[color][ROOK] >> rook & 1 and not position.occupied & between)
+    if flag == EP_CAPTURE:
+        return kind == PAWN and end == position.ep_square and bool(PAWN_ATTACKS[color][start] >> end & 1)
+    target = mailbox[end]
+    if flag & CAPTURE:
+        if target is None or target[0] == color:
+            return False
+    elif target is not None:
+        return False
+    if kind != PAWN:
+        return not flag & ~CAPTURE and bool(position.attacks_from(start) >> end & 1)
+    if not flag & PROMOTION and flag not in (QUIET, DOUBLE_PUSH, CAPTURE):
+        return False
+    if bool(flag & PROMOTION) != (end >> 3 in (0, 7)):
+        return False
+    if flag & CAPTURE:
+        return bool(PAWN_ATTACKS[color][start] >> end & 1)
+    step = 8 if color == WHITE else -8
+    if flag == DOUBLE_PUSH:
+        return (end == start + 2 * step and start >> 3 == (1 if color == WHITE else 6)
+                and mailbox[start + step] is None)
+    return end == start + step
+
+
+def generate_moves(position: Position, color: Optional[int] = None) -> List[int]:
+    if color is None:
+        color = position.turn
+    info = CheckInfo(position, color)
+    # Out of check every target is open; in double check evasions is empty and only the king moves
+    pseudo_moves = generate_pseudo_moves(position, color, info.evasions)
+    return [move for move in pseudo_moves if is_legal(position, move, info, color)]
+
+
+def has_legal_move(position: Position, color: Optional[int] = None) -> bool:
+    return bool(generate_moves(position, color))
@@ -0,0 +1,122 @@
+from typing import Iterator, List, Optional, Sequence
+
+from bitboard import WHITE, PAWN, KING, FULL, ROW_1, ROW_8, CAPTURE, EP_CAPTURE, PROMOTION, Position
+from evaluate import PIECE_VALUES
+from movegen import CheckInfo, generate_pseudo_moves, is_legal, is_pseudo_legal
+
+# Staged move generation for the search.  pick_moves() is a generator that
+# hands out legal moves in the order the search wants to try them:
+#
+#   1. the hash move (from the transposition table or the previous PV)
+#   2. captures that do not lose material, and promotions, by MVV-LVA
+#   3. the killer moves of the ply
+#   4. the remaining quiet moves, by history score
+#   5. captures that lose material by static exchange
+#
+# Each stage is generated only when the one before runs out, and moves are
+# checked for legality only as they are handed out, so a node that cuts off
+# on the hash move or a capture never generates its quiet moves at all.
+
+# Piece values for the static exchange; the king is worth more than everything it could win
+SEE_VALUES = (100, 320, 330, 500, 900, 20_000)
+
+_NOISY = CAPTURE | PROMOTION
+
+
+def see(position: Position, move: int) -> int:
+    # Material the side to move expects to gain from a capture on move's target square when both sides
+    # keep recapturing with their least valuable piece and may stop whenever that is better
+    start = move & 63
+    end = (move >> 6) & 63
+    flag = move >> 12
+    mailbox = position.mailbox
+    pieces = position.pieces
+    occupied = position.occupied ^ (1 << start)
+    if flag == EP_CAPTURE:
+        gains = [SEE_VALUES[PAWN]]
+        occupied ^= 1 << (end - 8 if position.turn == WHITE else end + 8)
+    else:
+        target = mailbox[end]
+        gains = [SEE_VALUES[target[1]] if target is not None else 0]
+    on_square = mailbox[start][1]
+    if flag & PROMOTION:
+        on_square = (flag & 3) + 1
+        gains[0] += SEE_VALUES[on_square] - SEE_VALUES[PAWN]
+    color = position.turn ^ 1
+    while True:
+        attackers = position.attackers(end, color, occupied) & occupied
+        if not attackers:
+            break
+        for kind in range(6):
+            chosen = attackers & pieces[color][kind]
+            if chosen:
+                break
+        chosen &= -chosen
+        # A king may only recapture when nothing defends the square any more
+        if kind == KING and position.attackers(end, color ^ 1, occupied ^ chosen) & occupied:
+            break
+        gains.append(SEE_VALUES[on_square] - gains[-1])
+        on_square = kind
+        occupied ^= chosen
+        color ^= 1
+    for depth in range(len(gains) - 1, 0, -1):
+        gains[depth - 1] = -max(-gains[depth - 1], gains[depth])
+    return gains[0]
+
+
+def pick_moves(position: Position, hash_move: int = 0, killers: Sequence[int] = (),
+               history: Optional[List[int]] = None, quiets: bool = True, losing: bool = True) -> Iterator[int]:
+    # Legal moves of the side to move, staged as above.  history is indexed by move & 4095.  With quiets
+    # False only captures and promotions are produced, and with losing False the losing captures are
+    # dropped, as quiescence search wants.  The position must not change between steps of the generator
+    # except by moves that are unmade again.
+    color = position.turn
+    info = CheckInfo(position, color)
+    if hash_move and (not quiets and not hash_move >> 12 & _NOISY or not is_pseudo_legal(position, hash_move)
+                      or not is_legal(position, hash_move, info, color)):
+        hash_move = 0
+    if hash_move:
+        yield hash_move
+
+    mailbox = position.mailbox
+    promotion_row = ROW_8 if color == WHITE else ROW_1
+    targets = (position.occupancy[color ^ 1] | promotion_row) & info.evasions
+    keys = {}
+    losing_captures = {}
+    for move in generate_pseudo_moves(position, color, targets):
+        flag = move >> 12
+        if not flag & _NOISY or move == hash_move:
+            continue
+        if flag & CAPTURE:
+            victim = PAWN if flag == EP_CAPTURE else mailbox[(move >> 6) & 63][1]
+            attacker = mailbox[move & 63][1]
+            key = PIECE_VALUES[victim] * 8 - attacker
+            if SEE_VALUES[victim] < SEE_VALUES[attacker] and see(position, move) < 0:
+                losing_captures[move] = key
+                continue
+            keys[move] = key
+        else:
+            keys[move] = flag & 3
+    for move in sorted(keys, key=keys.__getitem__, reverse=True):
+        if is_legal(position, move, info, color):
+            yield move
+
+    if quiets:
+        played = [hash_move]
+        for killer in killers:
+            if (killer and killer not in played and not killer >> 12 & _NOISY and is_pseudo_legal(position, killer)
+                    and is_legal(position, killer, info, color)):
+                played.append(killer)
+                yield killer
+        moves = [move for move in generate_pseudo_moves(position, color, (FULL ^ position.occupied) & info.evasions)
+                 if not move >> 12 & _NOISY and move not in played]
+        if history is not None:
+            moves.sort(key=lambda move: history[move & 4095], reverse=True)
+        for move in moves:
+            if is_legal(position, move, info, color):
+                yield move
+
+    if losing:
+        for move in sorted(losing_captures, key=losing_captures.__getitem__, reverse=True):
+            if is_legal(position, move, info, color):
+                yield move
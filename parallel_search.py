@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Callable, Optional, Tuple
+
+from bitboard import Position
+from movegen import generate_moves
+from search import SearchOptions, SearchResult, Searcher
+from tablebase import Tablebases
+from tt import TranspositionTable, shared_buffer
+
+# Lazy SMP over a process pool.  Every worker runs the ordinary iterative
+# deepening search on the same root position, and all of them read and
+# write one transposition table in shared memory, so each one profits from
+# the lines the others have already searched.  Every other worker starts
+# one ply deeper so they do not walk the tree in lockstep.
+#
+# All workers stop at one absolute deadline, on the node budget, or when
+# the root raises the shared stop flag (the caller's stop event, or the
+# main worker finishing).  The deepest finished iteration is played, ties
+# going to the main worker.  Positions travel as a FEN string plus the
+# hashes needed for repetition checks, never as pickled Piece objects.
+
+_worker_searcher: Optional[Searcher] = None
+_worker_stop = None
+_worker_progress = None
+# How often (seconds) the root looks at the stop event, the deadline and the progress queue
+_STOP_POLL = 0.05
+
+
+def _init_worker(table, stop, progress, tablebase_dir: Optional[str], options: Optional[SearchOptions]) -> None:
+    global _worker_searcher, _worker_stop, _worker_progress
+    _worker_searcher = Searcher(options=options, table=TranspositionTable(buffer=table))
+    _worker_stop = stop
+    _worker_progress = progress
+    if tablebase_dir is not None:
+        # Each worker maps the same table files, so the OS shares their pages
+        _worker_searcher.tablebases = Tablebases(tablebase_dir)
+
+
+def _search_task(task: Tuple[str, Tuple[int, ...], float, int, Optional[int], int, bool]) -> SearchResult:
+    fen, keys, deadline, max_depth, max_nodes, start_depth, report = task
+    position = Position.from_compact(fen, keys)
+    # perf_counter() reads a system-wide monotonic clock, so the root's deadline holds in every worker
+    time_ms = max(0.0, (deadline - time.perf_counter()) * 1000)
+    return _worker_searcher.search(position, time_ms, max_depth, _worker_stop,
+                                   _worker_progress.put if report else None, max_nodes, start_depth)
+
+
+class ParallelSearcher:
+    def __init__(self, workers: Optional[int] = None, time_ms: int = 1000, max_depth: int = 64, tt_mb: float = 16,
+                 tablebase_dir: Optional[str] = None, options: Optional[SearchOptions] = None,
+                 max_nodes: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.time_ms = time_ms
+        self.max_depth = max_depth
+        self.tt_mb = tt_mb
+        self.tablebase_dir = tablebase_dir
+        # Selective search switches, handed to every worker's Searcher
+        self.options = options or SearchOptions()
+        # Node budget per search, split evenly between the workers; None searches until the time runs out
+        self.max_nodes = max_nodes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stop = None
+        self._progress = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Started on first use so that creating a Game never forks processes
+        if self._executor is None:
+            self._stop = multiprocessing.Event()
+            # A SimpleQueue writes straight to its pipe, so a worker's reports arrive before its result does
+            self._progress = multiprocessing.SimpleQueue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(shared_buffer(self.tt_mb), self._stop, self._progress, self.tablebase_dir, self.options))
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._stop.set()
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> 'ParallelSearcher':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _report(self, progress: Optional[Callable[[SearchResult], None]]) -> None:
+        # Hand the main worker's finished iterations to the caller
+        while not self._progress.empty():
+            result = self._progress.get()
+            if progress is not None:
+                progress(result)
+
+    def search(self, position: Position, time_ms: Optional[int] = None, max_depth: Optional[int] = None,
+               stop_event: Optional[threading.Event] = None,
+               progress: Optional[Callable[[SearchResult], None]] = None,
+               max_nodes: Optional[int] = None) -> SearchResult:
+        start = time.perf_counter()
+        deadline = start + (self.time_ms if time_ms is None else time_ms) / 1000.0
+        max_depth = self.max_depth if max_depth is None else max_depth
+        max_nodes = self.max_nodes if max_nodes is None else max_nodes
+        moves = generate_moves(position)
+        if len(moves) <= 1:
+            return SearchResult(moves[0] if moves else None, 0, 0, 0, time.perf_counter() - start, moves[:1])
+
+        fen, keys = position.to_compact()
+        pool = self._pool()
+        self._stop.clear()
+        share = None if max_nodes is None else max(1, max_nodes // self.workers)
+        futures = [pool.submit(_search_task, (fen, keys, deadline, max_depth, share, 1 + index % 2, index == 0))
+                   for index in range(self.workers)]
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=_STOP_POLL)
+            self._report(progress)
+            if (pending and not self._stop.is_set()
+                    and (futures[0].done() or time.perf_counter() > deadline
+                         or (stop_event is not None and stop_event.is_set()))):
+                # Running searches see the flag within a few hundred nodes; queued ones never start
+                self._stop.set()
+                for future in pending:
+                    future.cancel()
+        self._report(progress)
+
+        results = [future.result() for future in futures if not future.cancelled()]
+        best = max(results, key=lambda found: found.depth)
+        return SearchResult(best.move, best.score, best.depth, sum(found.nodes for found in results),
+                            time.perf_counter() - start, best.pv)
@@ -0,0 +1,123 @@
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bitboard import START_FEN, Position, move_name, position_from_board
+from movegen import generate_moves
+
+# Standard perft positions with their published leaf counts, indexed by depth - 1
+REFERENCE_POSITIONS: List[Tuple[str, str, List[int]]] = [
+    ('start', START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(position: Position, depth: int) -> int:
+    # Count the leaf nodes of the legal move tree, counting the last ply in bulk
+    if depth == 0:
+        return 1
+    moves = generate_moves(position)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position: Position, depth: int) -> Dict[str, int]:
+    # Leaf counts below each root move, for tracking down a wrong total
+    counts = {}
+    for move in generate_moves(position):
+        position.make_move(move)
+        counts[move_name(move)] = perft(position, depth - 1) if depth > 1 else 1
+        position.unmake_move()
+    return counts
+
+
+def timed_perft(position: Position, depth: int) -> Tuple[int, float]:
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    return nodes, time.perf_counter() - start
+
+
+def game_start_position(module: str) -> Position:
+    # The start position as set up by rules.Game.setup_board or gamefinal.Game._setup_pieces
+    if module == 'game':
+        import rules
+        board_game = rules.Game()
+        board_game.setup_board()
+        return board_game.position.copy()
+    import gamefinal
+    return position_from_board(gamefinal.Game().board)
+
+
+def run_suite(max_depth: int, out=sys.stdout) -> bool:
+    ok = True
+    total_nodes, total_time = 0, 0.0
+    for name, fen, counts in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        for depth in range(1, min(max_depth, len(counts)) + 1):
+            nodes, elapsed = timed_perft(position, depth)
+            total_nodes += nodes
+            total_time += elapsed
+            status = 'ok' if nodes == counts[depth - 1] else 'MISMATCH (expected {})'.format(counts[depth - 1])
+            ok = ok and nodes == counts[depth - 1]
+            out.write('{:<10} depth {} {:>12} nodes {:>10.0f} nps  {}\n'.format(
+                name, depth, nodes, nodes / elapsed if elapsed else 0, status))
+    out.write('total {} nodes in {:.2f}s, {:.0f} nps\n'.format(
+        total_nodes, total_time, total_nodes / total_time if total_time else 0))
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Count move generator leaf nodes and report nodes per second.')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fen', help='position to search instead of the reference suite')
+    parser.add_argument('--game', choices=('game', 'gamefinal'),
+                        help='use the start position set up by this module instead of the reference suite')
+    parser.add_argument('--divide', action='store_true', help='print the node count under each root move')
+    parser.add_argument('--expect', type=int, help='fail unless the count at --depth matches')
+    args = parser.parse_args(argv)
+
+    if args.fen is None and args.game is None:
+        return 0 if run_suite(args.depth) else 1
+
+    position = Position.from_fen(args.fen) if args.fen else game_start_position(args.game)
+    expected = args.expect
+    if expected is None:
+        for _, fen, counts in REFERENCE_POSITIONS:
+            if fen.split()[:4] == position.fen().split()[:4] and args.depth <= len(counts):
+                expected = counts[args.depth - 1]
+    if args.divide:
+        start = time.perf_counter()
+        counts = divide(position, args.depth)
+        elapsed = time.perf_counter() - start
+        for name in sorted(counts):
+            print('{}: {}'.format(name, counts[name]))
+        nodes = sum(counts.values())
+    else:
+        nodes, elapsed = timed_perft(position, args.depth)
+    print('depth {} nodes {} time {:.2f}s nps {:.0f}'.format(args.depth, nodes, elapsed,
+                                                            nodes / elapsed if elapsed else 0))
+    if expected is not None:
+        print('expected {}: {}'.format(expected, 'ok' if nodes == expected else 'MISMATCH'))
+        return 0 if nodes == expected else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
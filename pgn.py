@@ -0,0 +1,364 @@
+import argparse
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from bitboard import (PAWN, KING, KING_CASTLE, QUEEN_CASTLE, CAPTURE, START_FEN, FILE_NAMES, PIECE_LETTERS,
+                      Position, move_end, move_flag, move_start, parse_square, promotion_kind, square_name)
+from movegen import generate_moves, has_legal_move
+
+# Standard algebraic notation, and PGN reading and writing for games
+# played on a Position.
+#
+# read_games() streams an open file one game at a time, so memory does not
+# grow with the size of the archive.  map_games() splits a file into chunks
+# of roughly CHUNK_BYTES that each begin at a game boundary and hands them
+# to a pool of worker processes, each of which reads only its own byte range.
+
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+_LINE_LENGTH = 80
+# Size of the byte ranges map_games() gives each worker, before rounding to game boundaries
+CHUNK_BYTES = 4 << 20
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, rest-of-line comments, NAGs and move numbers carry no moves
+_NOISE = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(?:\.\.)?')
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+class PgnError(ValueError):
+    pass
+
+
+class PgnGame:
+    def __init__(self, tags: Dict[str, str], sans: List[str], result: str):
+        self.tags = tags
+        self.sans = sans
+        self.result = result
+
+    @property
+    def start_fen(self) -> str:
+        return self.tags.get('FEN', START_FEN)
+
+    def moves(self) -> List[int]:
+        # The game's moves as encoded ints; raises PgnError at the first illegal or unreadable move
+        position = Position.from_fen(self.start_fen)
+        moves = []
+        for san in self.sans:
+            move = parse_san(position, san)
+            position.make_move(move)
+            moves.append(move)
+        return moves
+
+    def final_position(self) -> Position:
+        position = Position.from_fen(self.start_fen)
+        for san in self.sans:
+            position.make_move(parse_san(position, san))
+        return position
+
+    def format(self) -> str:
+        # PGN text for the game as read, without replaying its moves
+        return _format(self.tags, self.sans, self.start_fen, self.result)
+
+
+def move_san(position: Position, move: int, legal_moves: Optional[List[int]] = None) -> str:
+    # SAN for a legal move in position, e.g. Nbd7, exd5, e8=Q+, O-O
+    flag = move_flag(move)
+    start = move_start(move)
+    end = move_end(move)
+    kind = position.mailbox[start][1]
+    if flag == KING_CASTLE:
+        san = 'O-O'
+    elif flag == QUEEN_CASTLE:
+        san = 'O-O-O'
+    elif kind == PAWN:
+        san = FILE_NAMES[start & 7] + 'x' if flag & CAPTURE else ''
+        san += square_name(end)
+        promotion = promotion_kind(move)
+        if promotion is not None:
+            san += '=' + PIECE_LETTERS[promotion].upper()
+    else:
+        san = PIECE_LETTERS[kind].upper()
+        if kind != KING:
+            if legal_moves is None:
+                legal_moves = generate_moves(position)
+            # Other pieces of the same kind that could also go to end
+            rivals = [move_start(other) for other in legal_moves
+                      if move_end(other) == end and move_start(other) != start
+                      and position.mailbox[move_start(other)][1] == kind]
+            if rivals:
+                if all(rival & 7 != start & 7 for rival in rivals):
+                    san += FILE_NAMES[start & 7]
+                elif all(rival >> 3 != start >> 3 for rival in rivals):
+                    san += str((start >> 3) + 1)
+                else:
+                    san += square_name(start)
+        if flag & CAPTURE:
+            san += 'x'
+        san += square_name(end)
+
+    position.make_move(move)
+    if position.in_check(position.turn):
+        san += '+' if has_legal_move(position) else '#'
+    position.unmake_move()
+    return san
+
+
+def parse_san(position: Position, san: str) -> int:
+    # The legal move in position written as san; raises PgnError if there is none or it is ambiguous
+    text = san.rstrip('+#!?')
+    legal = generate_moves(position)
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        flag = KING_CASTLE if len(text) == 3 else QUEEN_CASTLE
+        candidates = [move for move in legal if move_flag(move) == flag]
+    else:
+        match = _SAN.match(text)
+        if match is None:
+            raise PgnError('Unreadable move: {}'.format(san))
+        piece, file, rank, target, promotion = match.groups()
+        kind = PIECE_LETTERS.index(piece.lower()) if piece else PAWN
+        end = parse_square(target)
+        promotion = PIECE_LETTERS.index(promotion.lower()) if promotion else None
+        mailbox = position.mailbox
+        candidates = [move for move in legal
+                      if move_end(move) == end and mailbox[move_start(move)][1] == kind
+                      and promotion_kind(move) == promotion
+                      and (file is None or FILE_NAMES[move_start(move) & 7] == file)
+                      and (rank is None or str((move_start(move) >> 3) + 1) == rank)]
+    if len(candidates) != 1:
+        raise PgnError('{} move: {}'.format('Illegal' if not candidates else 'Ambiguous', san))
+    return candidates[0]
+
+
+def san_moves(position: Position, moves: Iterable[int]) -> List[str]:
+    # SAN for a sequence of moves played from position (which is left unchanged)
+    position = position.copy()
+    sans = []
+    for move in moves:
+        sans.append(move_san(position, move))
+        position.make_move(move)
+    return sans
+
+
+def _format(tags: Optional[Dict[str, str]], sans: List[str], start_fen: str, result: str) -> str:
+    # One PGN game: the seven tag roster (unknown values as '?'), any extra tags, then the wrapped movetext
+    tags = dict(tags or {})
+    tags['Result'] = result
+    if start_fen != START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = start_fen
+    lines = ['[{} "{}"]'.format(name, str(tags.get(name, '?')).replace('\\', '\\\\').replace('"', '\\"'))
+             for name in SEVEN_TAG_ROSTER]
+    lines += ['[{} "{}"]'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+              for name, value in tags.items() if name not in SEVEN_TAG_ROSTER]
+    lines.append('')
+
+    fields = start_fen.split()
+    turn = 1 if fields[1:2] == ['b'] else 0
+    fullmove_number = int(fields[5]) if len(fields) >= 6 and fields[5].isdigit() else 1
+    tokens = []
+    for index, san in enumerate(sans):
+        # Move numbers go before White's moves, and before Black's first move when Black starts
+        ply = index + turn
+        number = fullmove_number + ply // 2
+        if ply % 2 == 0:
+            tokens.append('{}.'.format(number))
+        elif not index:
+            tokens.append('{}...'.format(number))
+        tokens.append(san)
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > _LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def format_game(moves: Iterable[int], tags: Optional[Dict[str, str]] = None, start_fen: str = START_FEN,
+                result: str = '*') -> str:
+    return _format(tags, san_moves(Position.from_fen(start_fen), moves), start_fen, result)
+
+
+def write_game(stream: TextIO, moves: Iterable[int], tags: Optional[Dict[str, str]] = None,
+               start_fen: str = START_FEN, result: str = '*') -> None:
+    stream.write(format_game(moves, tags, start_fen, result))
+
+
+def write_games(stream: TextIO, games: Iterable[PgnGame]) -> int:
+    # Write games as they arrive (e.g. straight from read_games); returns how many were written
+    count = 0
+    for game in games:
+        stream.write(game.format())
+        count += 1
+    return count
+
+
+def _movetext_tokens(movetext: str) -> List[str]:
+    # Moves and the result, with comments, NAGs, move numbers and variations removed
+    text = _NOISE.sub(' ', movetext)
+    depth = 0
+    kept = []
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        elif not depth:
+            kept.append(char)
+    return ''.join(kept).split()
+
+
+def _parse_game(tag_lines: List[str], movetext_lines: List[str]) -> PgnGame:
+    tags = {}
+    for line in tag_lines:
+        for name, value in _TAG.findall(line):
+            tags[name] = value.replace('\\"', '"').replace('\\\\', '\\')
+    tokens = _movetext_tokens('\n'.join(movetext_lines))
+    result = tags.get('Result', '*')
+    if tokens and tokens[-1] in RESULTS:
+        result = tokens.pop()
+    return PgnGame(tags, tokens, result)
+
+
+def read_games(stream: Iterable[str]) -> Iterator[PgnGame]:
+    # Stream games one at a time from an open PGN file (or any iterable of lines)
+    tag_lines: List[str] = []
+    movetext_lines: List[str] = []
+    for line in stream:
+        line = line.strip()
+        if line.startswith('%'):
+            continue
+        if line.startswith('['):
+            if movetext_lines:
+                yield _parse_game(tag_lines, movetext_lines)
+                tag_lines, movetext_lines = [], []
+            tag_lines.append(line)
+        elif line:
+            movetext_lines.append(line)
+    if tag_lines or movetext_lines:
+        yield _parse_game(tag_lines, movetext_lines)
+
+
+def _next_game_start(stream: BinaryIO, offset: int) -> int:
+    # Offset of the first game that starts at or after offset, by the rule read_games() splits on:
+    # a tag line that follows movetext.  A game whose tag section reaches offset belongs to the chunk before.
+    if offset <= 0:
+        return 0
+    stream.seek(offset - 1)
+    # Finish the line offset falls in; at a line start this only consumes the previous newline
+    position = offset - 1 + len(stream.readline())
+    seen_movetext = False
+    while True:
+        line = stream.readline()
+        if not line:
+            return position
+        text = line.strip()
+        if text.startswith(b'['):
+            if seen_movetext:
+                return position
+        elif text and not text.startswith(b'%'):
+            seen_movetext = True
+        position += len(line)
+
+
+def game_chunks(path: str, chunk_bytes: int = CHUNK_BYTES) -> List[Tuple[int, int]]:
+    # (start, end) byte ranges that cover the file and each hold whole games
+    size = os.path.getsize(path)
+    with open(path, 'rb') as stream:
+        starts = sorted({_next_game_start(stream, offset) for offset in range(0, size, max(chunk_bytes, 1))})
+    bounds = starts + [size]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def _chunk_lines(path: str, start: int, end: int) -> Iterator[str]:
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        while start < end:
+            line = stream.readline()
+            if not line:
+                return
+            start += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+
+def _map_chunk(function: Callable[[PgnGame], Any], path: str, start: int, end: int) -> List[Any]:
+    return [function(game) for game in read_games(_chunk_lines(path, start, end))]
+
+
+def map_games(path: str, function: Callable[[PgnGame], Any], workers: Optional[int] = None,
+              chunk_bytes: int = CHUNK_BYTES) -> Iterator[Any]:
+    # function(game) for every game in the file, in file order.  function must be picklable (defined at
+    # module level).  At most two chunks per worker are in flight, so memory stays bounded by the chunk
+    # size however large the file is.
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            for game in read_games(stream):
+                yield function(game)
+        return
+    chunks = iter(game_chunks(path, chunk_bytes))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start, end in chunks:
+            pending.append(pool.submit(_map_chunk, function, path, start, end))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def check_game(game: PgnGame) -> Tuple[int, Optional[str]]:
+    # (plies, error message or None) after replaying every move
+    try:
+        return len(game.moves()), None
+    except (PgnError, ValueError) as error:
+        return 0, str(error)
+
+
+def final_fen(game: PgnGame) -> Optional[str]:
+    # FEN of the position the game ends in, or None if a move cannot be replayed
+    try:
+        return game.final_position().fen()
+    except (PgnError, ValueError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None, out: TextIO = sys.stdout) -> int:
+    parser = argparse.ArgumentParser(description='Stream large PGN files through worker processes.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help='replay every game and report the ones that cannot be read')
+    fens = commands.add_parser('fen', help='print the final FEN of every game, one per line')
+    for command in (check, fens):
+        command.add_argument('pgn')
+        command.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+        command.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / (1 << 20),
+                             help='megabytes of the file per worker task')
+    args = parser.parse_args(argv)
+    chunk_bytes = int(args.chunk_mb * (1 << 20))
+
+    if args.command == 'fen':
+        for fen in map_games(args.pgn, final_fen, args.workers, chunk_bytes):
+            out.write('-\n' if fen is None else fen + '\n')
+        return 0
+    games = plies = bad = 0
+    for plies_read, error in map_games(args.pgn, check_game, args.workers, chunk_bytes):
+        games += 1
+        plies += plies_read
+        if error is not None:
+            bad += 1
+            out.write('game {}: {}\n'.format(games, error))
+    out.write('{} games, {} plies, {} unreadable\n'.format(games, plies, bad))
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
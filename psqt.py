@@ -0,0 +1,108 @@
+from typing import List
+
+# Material values and piece-square tables for the evaluation.  Colors and
+# kinds use the numbering from bitboard.py, which imports this module to
+# keep the running totals on Position up to date; it imports nothing from
+# the engine itself.
+
+WHITE, BLACK = 0, 1
+KING = 5
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+# Weight of each kind in the game phase; 24 means a full middlegame
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+
+# Tables are written from White's side with row 7 (Black's back rank) on top
+_PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+_KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+_BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+_ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+_QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+_KING_MIDDLEGAME_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+_KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+
+def _by_square(table, color: int) -> List[int]:
+    # White reads the table upside down because it is written with row 7 first
+    if color == WHITE:
+        return [table[(7 - (sq >> 3)) * 8 + (sq & 7)] for sq in range(64)]
+    return [table[sq] for sq in range(64)]
+
+
+_TABLES = (_PAWN_TABLE, _KNIGHT_TABLE, _BISHOP_TABLE, _ROOK_TABLE, _QUEEN_TABLE, _KING_MIDDLEGAME_TABLE)
+# MIDDLEGAME[color][kind][sq] and ENDGAME[color][kind][sq]: material plus square bonus
+MIDDLEGAME: List[List[List[int]]] = [[[PIECE_VALUES[kind] + bonus for bonus in _by_square(_TABLES[kind], color)]
+                                      for kind in range(6)] for color in (WHITE, BLACK)]
+ENDGAME: List[List[List[int]]] = [[row[:] for row in tables] for tables in MIDDLEGAME]
+for _color in (WHITE, BLACK):
+    ENDGAME[_color][KING] = _by_square(_KING_ENDGAME_TABLE, _color)
+
+# The same values signed for White's point of view, as Position accumulates them
+SIGNED_MIDDLEGAME: List[List[List[int]]] = [[[sign * value for value in table] for table in MIDDLEGAME[color]]
+                                            for color, sign in ((WHITE, 1), (BLACK, -1))]
+SIGNED_ENDGAME: List[List[List[int]]] = [[[sign * value for value in table] for table in ENDGAME[color]]
+                                         for color, sign in ((WHITE, 1), (BLACK, -1))]
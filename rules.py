@@ -0,0 +1,554 @@
+import random
+import sprites
+from attacks import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, queen_attacks, rook_attacks
+from bitboard import (Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, ALL_CASTLING, COLOR_NAMES, COLOR_INDEX, MOVE_SQUARES, iter_bits, move_end,
+                      move_from_row_col, move_start, promotion_kind, square, square_row_col)
+from movegen import generate_moves, has_legal_move
+
+# The game rules on top of the bitboard Position.  Nothing here imports
+# pygame: sprites are only cut from the sheet when a GUI first draws a piece.
+# The engine, book, tablebase, database and PGN modules are imported by the
+# methods that use them, so a game that only checks moves starts quickly.
+
+
+class Piece:
+    # No per-instance __dict__; Game keeps one shared piece per (color, kind)
+    __slots__ = ('game', 'color')
+    SPRITESHEET = sprites.LazySheet()
+    SPRITE_SIZE = 64
+    SQUARE_SIZE = 105
+
+    def __new__(cls, color, game):
+        # Interned per game, like gamefinal.Piece: constructing a piece again returns the game's shared one
+        code = (COLOR_INDEX[color], PIECE_KINDS[cls])
+        piece = game._piece_objects.get(code)
+        if piece is None:
+            piece = game._piece_objects[code] = super().__new__(cls)
+        return piece
+
+    def __init__(self, color, game):
+        self.game = game
+        self.color = color
+
+    def is_valid_move(self, start, end):
+        raise NotImplementedError("This method should be implemented in the subclass")
+
+    def attacks(self, start):
+        # Bitboard of every square this piece attacks from start
+        raise NotImplementedError("This method should be implemented in the subclass")
+
+    def attacked_squares(self, start):
+        return [square_row_col(sq) for sq in iter_bits(self.attacks(start))]
+
+    def _lands_on(self, end, attacks):
+        # The target square must be attacked and must not hold one of our own pieces
+        if not (0 <= end[0] < 8 and 0 <= end[1] < 8):
+            return False
+        target = 1 << square(*end)
+        return bool(attacks & target) and not self.game.position.occupancy[COLOR_INDEX[self.color]] & target
+
+    def get_sprite(self):
+        raise NotImplementedError("This method should be implemented in the subclass")
+
+    def get_piece_sprite(self, x, y):
+        # x is the piece's column in the sheet, y the color row; the sprite comes from the shared atlas
+        return sprites.get_sprite(type(self).__name__, 'white' if y == 0 else 'black', self.SPRITE_SIZE)
+
+    @property
+    def _image(self):
+        return sprites.get_sprite(type(self).__name__, self.color, self.SQUARE_SIZE)
+
+
+class King(Piece):
+    __slots__ = ()
+
+    def is_valid_move(self, start, end):
+        return self._lands_on(end, self.attacks(start))
+
+    def attacks(self, start):
+        return KING_ATTACKS[square(*start)]
+
+    def get_sprite(self):
+        x, y = (0, 0) if self.color == 'white' else (0, 1)
+        return self.get_piece_sprite(x, y)
+
+
+class Queen(Piece):
+    __slots__ = ()
+
+    def is_valid_move(self, start, end):
+        return self._lands_on(end, self.attacks(start))
+
+    def attacks(self, start):
+        return queen_attacks(square(*start), self.game.position.occupied)
+
+    def get_sprite(self):
+        x, y = (1, 0) if self.color == 'white' else (1, 1)
+        return self.get_piece_sprite(x, y)
+
+
+class Rook(Piece):
+    __slots__ = ()
+
+    def is_valid_move(self, start, end):
+        return self._lands_on(end, self.attacks(start))
+
+    def attacks(self, start):
+        return rook_attacks(square(*start), self.game.position.occupied)
+
+    def get_sprite(self):
+        x, y = (4, 0) if self.color == 'white' else (4, 1)
+        return self.get_piece_sprite(x, y)
+
+
+class Bishop(Piece):
+    __slots__ = ()
+
+    def is_valid_move(self, start, end):
+        return self._lands_on(end, self.attacks(start))
+
+    def attacks(self, start):
+        return bishop_attacks(square(*start), self.game.position.occupied)
+
+    def get_sprite(self):
+        x, y = (2, 0) if self.color == 'white' else (2, 1)
+        return self.get_piece_sprite(x, y)
+
+
+class Knight(Piece):
+    __slots__ = ()
+
+    def is_valid_move(self, start, end):
+        return self._lands_on(end, self.attacks(start))
+
+    def attacks(self, start):
+        return KNIGHT_ATTACKS[square(*start)]
+
+    def get_sprite(self):
+        x, y = (3, 0) if self.color == 'white' else (3, 1)
+        return self.get_piece_sprite(x, y)
+
+
+class Pawn(Piece):
+    __slots__ = ()
+
+    def is_valid_move(self, start, end):
+        row_diff = abs(start[0] - end[0])
+        col_diff = abs(start[1] - end[1])
+
+        forward = 1 if self.color == "white" else -1
+
+        # Check if the move is a single step forward
+        if start[0] + forward == end[0] and start[1] == end[1]:
+            # If the target square is empty, the move is valid
+            if self.game.get_piece(*end) is None:
+                return True
+
+        # Check if the move is a diagonal capture
+        if start[0] + forward == end[0] and col_diff == 1:
+            # If the target square contains an opponent's piece, the move is valid
+            target_piece = self.game.get_piece(*end)
+            if target_piece is not None and target_piece.color != self.color:
+                return True
+
+        # Implement rules for en passant and pawn promotion as needed
+
+        return False
+
+    def attacks(self, start):
+        return PAWN_ATTACKS[COLOR_INDEX[self.color]][square(*start)]
+
+    def get_sprite(self):
+        x, y = (5, 0) if self.color == 'white' else (5, 1)
+        return self.get_piece_sprite(x, y)
+
+
+PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)
+PIECE_KINDS = {cls: kind for kind, cls in enumerate(PIECE_CLASSES)}
+BACK_RANK = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+
+
+class BoardRow:
+    __slots__ = ('_game', '_row')
+
+    def __init__(self, game, row):
+        self._game = game
+        self._row = row
+
+    def __getitem__(self, col):
+        return self._game.get_piece(self._row, col)
+
+    def __setitem__(self, col, piece):
+        self._game.set_piece(self._row, col, piece)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return (self[col] for col in range(8))
+
+
+class BoardView:
+    # Keeps the old board[row][col] grid of Piece objects working on top of the bitboard Position
+    __slots__ = ('_game', '_rows')
+
+    def __init__(self, game):
+        self._game = game
+        self._rows = tuple(BoardRow(game, row) for row in range(8))
+
+    def __getitem__(self, row):
+        return self._rows[row] if 0 <= row < 8 else BoardRow(self._game, row)
+
+    def __setitem__(self, row, pieces):
+        for col, piece in enumerate(pieces):
+            self._game.set_piece(row, col, piece)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return (self[row] for row in range(8))
+
+
+# Number of positions whose check/mate status is remembered before the cache starts over
+STATUS_CACHE_SIZE = 4096
+
+
+class Game:
+    def __init__(self):
+        self.position = Position()
+        # The game's own position keeps per-square attack maps up to date through every move and undo
+        self.position.track_attacks()
+        self.board = BoardView(self)
+        # (position key, color) -> (in check, has a legal move)
+        self._status_cache = {}
+        # Pieces hold no per-square state, so one object per (color, kind) is shared by every square
+        self._piece_objects = {}
+        # Which selective search techniques the engine uses (a search.SearchOptions; None for all of them)
+        self.search_options = None
+        # Searcher or ParallelSearcher for the computer's moves, built on first use (see engine)
+        self._engine = None
+        # Thinking time per computer move, in milliseconds
+        self.think_time_ms = 1000
+        # Search running in the background, if any
+        self.engine_job = None
+        # Opening book consulted before searching, if one is open, and the generator that picks its moves
+        self.book = None
+        self.book_rng = random.Random()
+        # Endgame tablebases used by the search, if opened
+        self.tablebases = None
+        # Database every finished or abandoned game is stored in, if one is open
+        self.database = None
+        # (game id, plies, position key) of the last save, so a game that has not changed is stored only once
+        self._saved = None
+
+    @property
+    def engine(self):
+        # Built when the computer first moves, so games that never search (perft, PGN import) skip the
+        # transposition table
+        if self._engine is None:
+            from search import Searcher
+            self._engine = Searcher(options=self.search_options)
+            self._engine.tablebases = self.tablebases
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine):
+        self._engine = engine
+
+    @property
+    def turn(self):
+        return COLOR_NAMES[self.position.turn]
+
+    def setup_board(self):
+        # The pieces go straight into the Position; board[row][col] hands out the shared Piece objects on demand
+        position = self.position
+        position.clear()
+        self._saved = None
+        for col, kind in enumerate(BACK_RANK):
+            position.put(square(0, col), WHITE, kind)
+            position.put(square(1, col), WHITE, PAWN)
+            position.put(square(6, col), BLACK, PAWN)
+            position.put(square(7, col), BLACK, kind)
+        position.set_castling(ALL_CASTLING)
+
+    def load_fen(self, fen):
+        # Set up the position fen describes; an invalid fen raises ValueError and leaves the game as it was
+        position = Position.from_fen(fen)
+        self.cancel_computer_move()
+        self.save_game()
+        position.track_attacks()
+        self.position = position
+        self._saved = None
+
+    def fen(self):
+        return self.position.fen()
+
+    def play_san(self, san):
+        # Play a move written in SAN and return it encoded; raises PgnError if it is illegal or unreadable
+        from pgn import parse_san
+        move = parse_san(self.position, san)
+        self.position.make_move(move)
+        self._moved()
+        return move
+
+    def load_pgn(self, pgn_game):
+        # Replay a pgn.PgnGame from its start position
+        self.load_fen(pgn_game.start_fen)
+        for san in pgn_game.sans:
+            self.play_san(san)
+
+    def moves_played(self):
+        # (fen of the position the game was set up in, moves played since)
+        start = self.position.copy()
+        moves = [record[0] for record in start.history]
+        while start.history:
+            start.unmake_move()
+        return start.fen(), moves
+
+    def result(self):
+        # PGN result of the game as it stands: '*' until one side is mated or stalemated
+        turn = self.turn
+        if self.mate(turn):
+            return '0-1' if turn == 'white' else '1-0'
+        if self.stalemate(turn):
+            return '1/2-1/2'
+        return '*'
+
+    def pgn(self, tags=None, result=None):
+        # The moves played so far as PGN text, from the position the game was set up in
+        from pgn import format_game
+        start_fen, moves = self.moves_played()
+        return format_game(moves, tags, start_fen, self.result() if result is None else result)
+
+    def open_database(self, directory):
+        # Store games in the database in directory from now on; returns how many games it holds
+        from gamedb import GameDatabase
+        self.close_database()
+        self.database = GameDatabase(directory)
+        return len(self.database)
+
+    def close_database(self):
+        if self.database is not None:
+            self.save_game()
+            self.database.close()
+            self.database = None
+
+    def save_game(self):
+        # Store the moves played so far in the open database; returns the game id (None if nothing was stored).
+        # Saving again before another move is played or taken back returns the same id without a second copy.
+        if self.database is None or not self.position.history:
+            return None
+        plies = len(self.position.history)
+        if self._saved is not None and self._saved[1:] == (plies, self.position.hash):
+            return self._saved[0]
+        start_fen, moves = self.moves_played()
+        game_id = self.database.add_game(moves, start_fen, self.result())
+        self._saved = (game_id, plies, self.position.hash)
+        return game_id
+
+    def _moved(self):
+        # A game that has just ended by mate or stalemate is stored at once
+        if self.database is not None and self.result() != '*':
+            self.save_game()
+
+    def _piece_object(self, code):
+        piece = self._piece_objects.get(code)
+        if piece is None:
+            color, kind = code
+            piece = PIECE_CLASSES[kind](COLOR_NAMES[color], self)
+        return piece
+
+    def get_piece(self, row, col):
+        if 0 <= row < 8 and 0 <= col < 8:
+            code = self.position.piece_at(square(row, col))
+            if code is not None:
+                return self._piece_object(code)
+        return None
+
+    def get(self, row, col):
+        return self.get_piece(row, col)
+
+    def set_piece(self, row, col, piece):
+        if piece is None:
+            self.position.remove(square(row, col))
+        else:
+            self.position.put(square(row, col), COLOR_INDEX[piece.color], PIECE_KINDS[type(piece)])
+
+    def place_piece(self, row, col):
+        if not self.board[row][col]:
+            self.board[row][col] = King("white", self)
+        else:
+            self.board[row][col] = None
+
+    def generate_moves(self, color=None):
+        # Legal moves for the given color (default: the side to move), as encoded ints
+        return generate_moves(self.position, None if color is None else COLOR_INDEX[color])
+
+    def valid_moves(self, row, col):
+        # Legal destination squares for the piece on (row, col), for highlighting
+        start = square(row, col)
+        return [square_row_col(move_end(move)) for move in self.generate_moves() if move_start(move) == start]
+
+    def find_move(self, start, end, promotion=QUEEN):
+        # The legal encoded move from start to end, given as (row, col) pairs, or None
+        squares = move_from_row_col(start, end)
+        for move in self.generate_moves():
+            if move & MOVE_SQUARES == squares and promotion_kind(move) in (None, promotion):
+                return move
+        return None
+
+    def move(self, start, end):
+        # Pawns always promote to a Queen
+        move = self.find_move(start, end)
+        if move is None:
+            return False
+        self.position.make_move(move)
+        self._moved()
+        return True
+
+    def move_piece(self, start, end):
+        self.position.move_piece(square(*start), square(*end))
+
+    def position_key(self):
+        return self.position.hash
+
+    def _status(self, color):
+        # (in check, has a legal move) for the given color, computed once per position from the attack maps
+        key = (self.position.hash, color)
+        status = self._status_cache.get(key)
+        if status is None:
+            if len(self._status_cache) >= STATUS_CACHE_SIZE:
+                self._status_cache.clear()
+            position = self.position
+            color = COLOR_INDEX[color]
+            king = position.king_square(color)
+            enemy_attacks = position.attack_map(color ^ 1)
+            in_check = king is not None and bool(enemy_attacks >> king & 1)
+            # Out of check, a king step to a square the enemy does not attack is always legal: no slider
+            # looks through the king, so the map is exact there.  Otherwise ask the move generator.
+            can_move = ((not in_check and king is not None
+                         and bool(KING_ATTACKS[king] & ~position.occupancy[color] & ~enemy_attacks))
+                        or has_legal_move(position, color))
+            status = self._status_cache[key] = (in_check, can_move)
+        return status
+
+    def check(self, color):
+        # Check if the king of the given color is in check.
+        return self._status(color)[0]
+
+    def mate(self, color):
+        # Check if the king of the given color is in checkmate.
+        in_check, can_move = self._status(color)
+        return in_check and not can_move
+
+    def stalemate(self, color):
+        # The given color is to move, is not in check and has no legal move.
+        in_check, can_move = self._status(color)
+        return self.turn == color and not in_check and not can_move
+
+    def find_king(self, color):
+        # Find the position of the king of the given color.
+        king = self.position.king_square(COLOR_INDEX[color])
+        if king is None:
+            raise ValueError("No king of color {} found in game.".format(color))
+        return square_row_col(king)
+
+    def _search_workers(self):
+        # Worker processes of the engine; 0 for the single-process Searcher or while none is built
+        return getattr(self._engine, 'workers', 0)
+
+    def set_search_workers(self, workers=1):
+        # Use a process pool for the computer's search; 1 keeps the single-process Searcher
+        self.cancel_computer_move()
+        if self._search_workers():
+            self._engine.close()
+        if workers != 1:
+            from parallel_search import ParallelSearcher
+            directory = self.tablebases.directory if self.tablebases is not None else None
+            self._engine = ParallelSearcher(workers, tablebase_dir=directory, options=self.search_options)
+            return self._engine.workers
+        # The single-process Searcher is built again on its next use
+        self._engine = None
+        return 1
+
+    def set_search_options(self, options):
+        # Switch selective search techniques on or off; a process pool is restarted so its workers see them
+        self.cancel_computer_move()
+        self.search_options = options
+        if self._search_workers():
+            self.set_search_workers(self._engine.workers)
+        elif self._engine is not None:
+            self._engine.options = options
+
+    def open_tablebases(self, directory):
+        # Let the search look up endgames in the tables found in directory; returns their names
+        from tablebase import Tablebases
+        self.cancel_computer_move()
+        if self.tablebases is not None:
+            self.tablebases.close()
+        self.tablebases = Tablebases(directory)
+        if self._search_workers():
+            self.set_search_workers(self._engine.workers)
+        elif self._engine is not None:
+            self._engine.tablebases = self.tablebases
+        return sorted(self.tablebases.tables)
+
+    def open_book(self, path):
+        from book import OpeningBook
+        self.close_book()
+        self.book = OpeningBook(path)
+        return self.book.entries
+
+    def close_book(self):
+        self.cancel_computer_move()
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+
+    def _computer_move(self):
+        # Search for the side to move, play the chosen move and return the SearchResult (None if no move exists)
+        from book import book_result
+        result = book_result(self.book, self.position, self.book_rng)
+        if result is None:
+            result = self.engine.search(self.position, self.think_time_ms)
+        if result.move is None:
+            return None
+        self.position.make_move(result.move)
+        self._moved()
+        return result
+
+    def start_computer_move(self):
+        # Start searching for the side to move on a worker thread and return the EngineJob to poll
+        from engine_thread import EngineJob
+        self.cancel_computer_move()
+        self.engine_job = EngineJob(self.engine, self.position, self.think_time_ms, self.book, self.book_rng)
+        return self.engine_job
+
+    def finish_computer_move(self, job):
+        # Play the move found by a finished job; False if it was cancelled, found nothing or the board changed
+        if job is self.engine_job:
+            self.engine_job = None
+        if job.cancelled or job.result is None or job.result.move is None or job.key != self.position.hash:
+            return False
+        self.position.make_move(job.result.move)
+        self._moved()
+        return True
+
+    def cancel_computer_move(self):
+        if self.engine_job is not None:
+            self.engine_job.cancel()
+            self.engine_job = None
+
+    def reset(self):
+        self.cancel_computer_move()
+        self.save_game()
+        self.setup_board()
+
+    def undo(self):
+        self.cancel_computer_move()
+        if not self.position.history:
+            return False
+        self.position.unmake_move()
+        return True
+
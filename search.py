@@ -0,0 +1,422 @@
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+from bitboard import PAWN, KING, CAPTURE, PROMOTION, Position, move_name
+from evaluate import evaluate
+from movegen import generate_moves
+from movepick import pick_moves
+from tt import EXACT, LOWER, UPPER, TranspositionTable
+
+INFINITY = 1_000_000
+MATE = 100_000
+# Scores beyond this are forced mates; the distance to mate is MATE - abs(score)
+MATE_BOUND = MATE - 1000
+MAX_PLY = 128
+# Positions with at most this many pieces are looked up in the tablebases when they are available
+TABLEBASE_PIECES = 4
+
+# History scores are halved once one passes this
+_HISTORY_LIMIT = 1 << 28
+# Nodes between looks at the clock and the stop event
+CHECK_NODES = 256
+
+# Selective search.  Null move: skip a turn and search depth - 1 - R plies, from NULL_MOVE_DEPTH on;
+# R grows by one from NULL_MOVE_DEEP_DEPTH, and from NULL_VERIFY_DEPTH a cutoff is confirmed by a
+# reduced normal search in case the side to move is in zugzwang.
+NULL_MOVE_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_DEEP_DEPTH = 7
+NULL_VERIFY_DEPTH = 7
+# Late move reductions: quiet moves after the first LMR_MOVES are searched one ply shallower (two from
+# LMR_DEEP_MOVES on at LMR_DEEP_DEPTH), and searched again at full depth if they beat alpha
+LMR_DEPTH = 3
+LMR_MOVES = 3
+LMR_DEEP_MOVES = 6
+LMR_DEEP_DEPTH = 6
+# Futility: at these remaining depths, quiet moves are skipped when the static evaluation plus the margin
+# cannot reach alpha
+FUTILITY_MARGINS = (0, 150, 300)
+# Reverse futility: up to this depth, return when the static evaluation beats beta by the margin per ply
+REVERSE_FUTILITY_DEPTH = 3
+REVERSE_FUTILITY_MARGIN = 120
+# Aspiration windows: from this depth, search a window around the last score and widen it on a miss
+ASPIRATION_DEPTH = 4
+ASPIRATION_WINDOW = 40
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def _score_to_tt(score: int, ply: int) -> int:
+    # Mate scores are stored relative to the node so they stay valid wherever the position is reached
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchResult:
+    def __init__(self, move: Optional[int], score: int, depth: int, nodes: int, elapsed: float, pv: List[int]):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.pv = pv
+        # Set for a move taken from the opening book instead of searched
+        self.book = False
+
+    @property
+    def nps(self) -> float:
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def score_text(self) -> str:
+        if abs(self.score) >= MATE_BOUND:
+            plies = MATE - abs(self.score)
+            return 'mate {}'.format((plies + 1) // 2 if self.score > 0 else -((plies + 1) // 2))
+        return 'cp {}'.format(self.score)
+
+    def pv_text(self) -> str:
+        return ' '.join(move_name(move) for move in self.pv)
+
+    def summary(self) -> str:
+        if self.book:
+            return '{} (book)'.format(move_name(self.move))
+        return '{} ({}, depth {}, {} nodes, {:.0f} nps)'.format(
+            move_name(self.move) if self.move is not None else '(none)', self.score_text(),
+            self.depth, self.nodes, self.nps)
+
+
+class SearchOptions:
+    # Switches for the selective search techniques, so each can be compared on its own in self-play
+    FEATURES = ('null_move', 'lmr', 'futility', 'reverse_futility', 'aspiration')
+
+    def __init__(self, null_move: bool = True, lmr: bool = True, futility: bool = True,
+                 reverse_futility: bool = True, aspiration: bool = True):
+        self.null_move = null_move
+        self.lmr = lmr
+        self.futility = futility
+        self.reverse_futility = reverse_futility
+        self.aspiration = aspiration
+
+    @classmethod
+    def without(cls, names: Iterable[str]) -> 'SearchOptions':
+        # Everything on except the named features ('all' turns every one off); '-' may stand for '_'
+        options = cls()
+        for name in names:
+            name = name.strip().replace('-', '_')
+            if name == 'all':
+                for feature in cls.FEATURES:
+                    setattr(options, feature, False)
+            elif name in cls.FEATURES:
+                setattr(options, name, False)
+            elif name:
+                raise ValueError('Unknown search feature: {}'.format(name))
+        return options
+
+    def describe(self) -> str:
+        disabled = [feature for feature in self.FEATURES if not getattr(self, feature)]
+        return 'no ' + ', '.join(disabled) if disabled else 'all pruning'
+
+
+class Searcher:
+    # Iterative deepening negamax with alpha-beta, quiescence on captures,
+    # staged move picking (hash move, good captures, killers, history-ordered
+    # quiets, losing captures; see movepick.py), the selective techniques in
+    # SearchOptions and a time budget.
+    def __init__(self, time_ms: int = 1000, max_depth: int = 64, tt_mb: float = 16, max_nodes: Optional[int] = None,
+                 options: Optional[SearchOptions] = None, table: Optional[TranspositionTable] = None):
+        self.time_ms = time_ms
+        self.max_depth = max_depth
+        self.options = options or SearchOptions()
+        # Node budget per search; None searches until the time runs out
+        self.max_nodes = max_nodes
+        # tablebase.Tablebases probed for positions with few pieces, if set
+        self.tablebases = None
+        # table: a transposition table to use instead of a new one of tt_mb, e.g. one shared between processes
+        self.tt = TranspositionTable(tt_mb) if table is None else table
+        self.nodes = 0
+        self.position: Optional[Position] = None
+        self._deadline = 0.0
+        self._node_limit: Optional[int] = None
+        self._next_check = 0
+        self._stop_event: Optional[threading.Event] = None
+        self._killers = [[0, 0] for _ in range(MAX_PLY)]
+        self._history = [[0] * 4096 for _ in range(2)]
+        self._pv = [[] for _ in range(MAX_PLY + 1)]
+        # Principal variation of the last finished iteration, searched first in the next one
+        self._previous_pv: List[int] = []
+
+    def search(self, position: Position, time_ms: Optional[int] = None, max_depth: Optional[int] = None,
+               stop_event: Optional[threading.Event] = None,
+               progress: Optional[Callable[[SearchResult], None]] = None,
+               max_nodes: Optional[int] = None, start_depth: int = 1) -> SearchResult:
+        # stop_event ends the search early (the last finished iteration is returned); progress is called
+        # with the result of every finished iteration.  start_depth skips the shallow iterations, so helper
+        # searches sharing a table do not all walk the same tree.
+        self.position = position
+        self.nodes = 0
+        self._stop_event = stop_event
+        self._node_limit = self.max_nodes if max_nodes is None else max_nodes
+        self._next_check = 0
+        self.tt.new_search()
+        self._killers = [[0, 0] for _ in range(MAX_PLY)]
+        # Age history scores so old games do not dominate move ordering
+        for table in self._history:
+            for index, value in enumerate(table):
+                if value:
+                    table[index] = value >> 3
+        start = time.perf_counter()
+        self._deadline = start + (self.time_ms if time_ms is None else time_ms) / 1000.0
+        max_depth = min(self.max_depth if max_depth is None else max_depth, MAX_PLY - 1)
+        root_depth = len(position.history)
+
+        moves = generate_moves(position)
+        result = SearchResult(moves[0] if moves else None, 0, 0, 0, 0.0, moves[:1])
+        if len(moves) <= 1:
+            result.elapsed = time.perf_counter() - start
+            return result
+
+        self._previous_pv = []
+        score = 0
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            try:
+                score = self._aspiration_search(depth, score)
+            except SearchTimeout:
+                while len(position.history) > root_depth:
+                    position.unmake_move()
+                break
+            pv = self._previous_pv = self._pv[0][:]
+            result = SearchResult(pv[0], score, depth, self.nodes, time.perf_counter() - start, pv)
+            if progress is not None:
+                progress(result)
+            # Stop early on a forced mate, or when the next iteration clearly cannot finish
+            if abs(score) >= MATE_BOUND or time.perf_counter() > self._deadline:
+                break
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _aspiration_search(self, depth: int, previous: int) -> int:
+        # Search a narrow window around the previous iteration's score, widening it on the side that failed
+        if not self.options.aspiration or depth < ASPIRATION_DEPTH or abs(previous) >= MATE_BOUND:
+            return self._negamax(depth, -INFINITY, INFINITY, 0)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous - delta, previous + delta
+        while True:
+            score = self._negamax(depth, alpha, beta, 0)
+            if score <= alpha:
+                alpha = max(score - delta, -INFINITY)
+            elif score >= beta:
+                beta = min(score + delta, INFINITY)
+            else:
+                return score
+            delta *= 2
+
+    def _check_time(self) -> None:
+        # Called when the node count reaches _next_check: every CHECK_NODES nodes, and exactly at the node limit
+        if (time.perf_counter() > self._deadline or (self._stop_event is not None and self._stop_event.is_set())
+                or (self._node_limit is not None and self.nodes >= self._node_limit)):
+            raise SearchTimeout()
+        self._next_check = self.nodes + CHECK_NODES
+        if self._node_limit is not None and self._next_check > self._node_limit:
+            self._next_check = self._node_limit
+
+    def _is_draw(self) -> bool:
+        position = self.position
+        if position.halfmove_clock >= 100:
+            return True
+        # Each history record holds the hash from before its move; equal keys an even number of plies back repeat
+        history = position.history
+        key = position.hash
+        count = len(history)
+        for back in range(4, min(position.halfmove_clock, count) + 1, 2):
+            if history[count - back][4] == key:
+                return True
+        return False
+
+    def _negamax(self, depth: int, alpha: int, beta: int, ply: int, null_allowed: bool = True) -> int:
+        position = self.position
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_time()
+        self._pv[ply] = []
+        if ply and self._is_draw():
+            return 0
+        if ply and self.tablebases is not None and bin(position.occupied).count('1') <= TABLEBASE_PIECES:
+            entry = self.tablebases.probe(position)
+            if entry is not None:
+                # Exact distance to mate, so the winning side heads straight for it
+                outcome, plies = entry
+                if not outcome:
+                    return 0
+                return MATE - ply - plies if outcome > 0 else -MATE + ply + plies
+        in_check = position.in_check(position.turn)
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiescence(alpha, beta, ply)
+
+        key = position.hash
+        entry = self.tt.probe(key)
+        hash_move = 0
+        if entry is not None:
+            hash_move, tt_score, tt_depth, bound = entry
+            if ply and tt_depth >= depth:
+                tt_score = _score_from_tt(tt_score, ply)
+                if (bound == EXACT or (bound == LOWER and tt_score >= beta)
+                        or (bound == UPPER and tt_score <= alpha)):
+                    return tt_score
+
+        options = self.options
+        # Only null-window nodes are pruned selectively, so the principal variation is searched in full
+        pv_node = beta - alpha > 1
+        static_eval = None
+        if ply and not in_check and not pv_node and abs(beta) < MATE_BOUND:
+            static_eval = evaluate(position)
+            if (options.reverse_futility and depth <= REVERSE_FUTILITY_DEPTH
+                    and static_eval - REVERSE_FUTILITY_MARGIN * depth >= beta):
+                return static_eval
+            if (options.null_move and null_allowed and depth >= NULL_MOVE_DEPTH and static_eval >= beta
+                    and self._has_pieces(position.turn)):
+                score = self._null_move_search(depth, beta, ply)
+                if score is not None:
+                    return score
+
+        if not hash_move and ply < len(self._previous_pv):
+            hash_move = self._previous_pv[ply]
+        killers = self._killers[ply]
+        futile = (options.futility and static_eval is not None and depth < len(FUTILITY_MARGINS)
+                  and static_eval + FUTILITY_MARGINS[depth] <= alpha)
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = 0
+        searched = 0
+        for move in pick_moves(position, hash_move, killers, self._history[position.turn]):
+            quiet = not move >> 12 & (CAPTURE | PROMOTION)
+            position.make_move(move)
+            if quiet and searched and (futile or (options.lmr and searched >= LMR_MOVES and depth >= LMR_DEPTH
+                                                  and move not in killers)):
+                gives_check = position.in_check(position.turn)
+                if futile and not gives_check:
+                    # Cannot reach alpha.  It still counts towards the move index, for the reductions of
+                    # later moves, and as a score, so a node with only futile moves is not a mate.
+                    position.unmake_move()
+                    searched += 1
+                    if best < static_eval:
+                        best = static_eval
+                    continue
+                if not gives_check and searched >= LMR_MOVES and depth >= LMR_DEPTH and options.lmr:
+                    reduction = 2 if searched >= LMR_DEEP_MOVES and depth >= LMR_DEEP_DEPTH else 1
+                    score = -self._negamax(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                    if score > alpha:
+                        # Confirm at full depth with the null window before opening it
+                        score = -self._negamax(depth - 1, -alpha - 1, -alpha, ply + 1)
+                        if alpha < score < beta:
+                            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+                else:
+                    score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            searched += 1
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if alpha >= beta:
+                        if not move >> 12 & (CAPTURE | PROMOTION):
+                            self._store_quiet_cutoff(move, depth, ply)
+                        break
+        if best == -INFINITY:
+            # No legal move
+            return -MATE + ply if in_check else 0
+        if best <= original_alpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, best_move, _score_to_tt(best, ply), depth, bound)
+        return best
+
+    def _has_pieces(self, color: int) -> bool:
+        # Null move is unsafe in pawn endings, where zugzwang is common
+        pieces = self.position.pieces[color]
+        return bool(self.position.occupancy[color] & ~(pieces[PAWN] | pieces[KING]))
+
+    def _null_move_search(self, depth: int, beta: int, ply: int) -> Optional[int]:
+        # Give the opponent a free move; if a reduced search still fails high, so would a real move.
+        # Returns beta on a cutoff, or None when the node has to be searched normally.
+        position = self.position
+        reduction = NULL_MOVE_REDUCTION + (depth >= NULL_MOVE_DEEP_DEPTH)
+        position.make_null_move()
+        score = -self._negamax(depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+        position.unmake_move()
+        if score < beta:
+            return None
+        if depth >= NULL_VERIFY_DEPTH:
+            # Verification: a reduced search without null moves must fail high as well
+            score = self._negamax(depth - 1 - reduction, beta - 1, beta, ply, False)
+            if score < beta:
+                return None
+        # A mate found after passing is not a proven mate, so only the bound is returned
+        return beta
+
+    def _store_quiet_cutoff(self, move: int, depth: int, ply: int) -> None:
+        killers = self._killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        table = self._history[self.position.turn]
+        table[move & 4095] += depth * depth
+        if table[move & 4095] > _HISTORY_LIMIT:
+            for index, value in enumerate(table):
+                table[index] = value >> 1
+
+    def _quiescence(self, alpha: int, beta: int, ply: int) -> int:
+        position = self.position
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_time()
+        self._pv[ply] = []
+        if ply >= MAX_PLY - 1:
+            # Out of room for killers and PV, even in the middle of a line of checks
+            return evaluate(position)
+        in_check = position.in_check(position.turn)
+        if in_check:
+            # No standing pat in check: every evasion is searched
+            best = -INFINITY
+        else:
+            best = evaluate(position)
+            if best >= beta:
+                return best
+            alpha = max(alpha, best)
+        # Out of check only captures and promotions that do not lose material are tried
+        for move in pick_moves(position, killers=self._killers[ply], history=self._history[position.turn],
+                               quiets=in_check, losing=in_check):
+            position.make_move(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if best == -INFINITY:
+            return -MATE + ply
+        return best
@@ -0,0 +1,268 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from bitboard import BISHOP, KING, KNIGHT, START_FEN, COLOR_NAMES
+from gamedb import GameDatabase
+from pgn import format_game
+from rules import Game
+from search import SearchOptions, Searcher
+
+# Headless engine-vs-engine (or engine-vs-random) games over a process
+# pool.  Each game is played with a fresh rules.Game in a worker and comes
+# back as a GameRecord; records are written as PGN as soon as they finish.
+#
+# Games are reproducible from --seed when searches are limited by --nodes:
+# the opening moves and the random player's choices come from a generator
+# seeded per game, and a node budget does not depend on machine load.
+#
+# Engines A and B each have their own Searcher and SearchOptions, so a
+# selective search technique can be measured by switching it off for one
+# side only (--b-disable lmr).
+
+ENGINE = 'engine'
+RANDOM = 'random'
+# Plies after which an unfinished game is adjudicated a draw
+DEFAULT_MAX_PLIES = 400
+
+
+class SelfPlayOptions:
+    def __init__(self, time_ms: int = 100, max_nodes: Optional[int] = None, max_depth: int = 64,
+                 opponent: str = ENGINE, random_plies: int = 0, seed: int = 0, max_plies: int = DEFAULT_MAX_PLIES,
+                 tt_mb: float = 8, book_path: Optional[str] = None, tablebase_dir: Optional[str] = None,
+                 a_search: Optional[SearchOptions] = None, b_search: Optional[SearchOptions] = None):
+        self.time_ms = time_ms
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.opponent = opponent
+        self.random_plies = random_plies
+        self.seed = seed
+        self.max_plies = max_plies
+        self.tt_mb = tt_mb
+        self.book_path = book_path
+        self.tablebase_dir = tablebase_dir
+        self.a_search = a_search or SearchOptions()
+        self.b_search = b_search or SearchOptions()
+
+
+class GameRecord:
+    def __init__(self, index: int, white: str, black: str, moves: List[int], result: str, termination: str,
+                 nodes: int, search_time: float, worker: int):
+        self.index = index
+        self.white = white
+        self.black = black
+        self.moves = moves
+        self.result = result
+        self.termination = termination
+        self.nodes = nodes
+        self.search_time = search_time
+        self.worker = worker
+
+    def pgn(self, event: str = 'Self-play') -> str:
+        tags = {'Event': event, 'Site': 'selfplay', 'Date': time.strftime('%Y.%m.%d'), 'Round': self.index + 1,
+                'White': self.white, 'Black': self.black, 'Termination': self.termination}
+        return format_game(self.moves, tags, START_FEN, self.result)
+
+
+def _insufficient_material(game: Game) -> bool:
+    # Bare kings, or a single knight or bishop against a bare king
+    position = game.position
+    others = position.occupied & ~(position.pieces[0][KING] | position.pieces[1][KING])
+    if not others:
+        return True
+    if others & (others - 1):
+        return False
+    minors = (position.pieces[0][KNIGHT] | position.pieces[0][BISHOP]
+              | position.pieces[1][KNIGHT] | position.pieces[1][BISHOP])
+    return bool(others & minors)
+
+
+def _repetitions(game: Game) -> int:
+    # How many times the current position occurred before, within reach of the fifty-move clock
+    position = game.position
+    history = position.history
+    count = len(history)
+    return sum(1 for back in range(4, min(position.halfmove_clock, count) + 1, 2)
+               if history[count - back][4] == position.hash)
+
+
+def _game_over(game: Game, max_plies: int) -> Optional[Tuple[str, str]]:
+    # (result, termination) once the game has ended, otherwise None
+    turn = game.turn
+    if game.mate(turn):
+        return ('0-1' if turn == COLOR_NAMES[0] else '1-0'), 'checkmate'
+    if game.stalemate(turn):
+        return '1/2-1/2', 'stalemate'
+    if game.position.halfmove_clock >= 100:
+        return '1/2-1/2', 'fifty-move rule'
+    if _repetitions(game) >= 2:
+        return '1/2-1/2', 'threefold repetition'
+    if _insufficient_material(game):
+        return '1/2-1/2', 'insufficient material'
+    if len(game.position.history) >= max_plies:
+        return '1/2-1/2', 'adjudicated after {} plies'.format(max_plies)
+    return None
+
+
+def play_game(index: int, options: SelfPlayOptions) -> GameRecord:
+    # Player A is the engine; it takes White in even games.  Player B is the engine again or a random mover.
+    rng = random.Random(options.seed * 1_000_003 + index)
+    game = Game()
+    game.setup_board()
+    engines = [Searcher(options.time_ms, options.max_depth, options.tt_mb, options.max_nodes, search)
+               for search in (options.a_search, options.b_search)]
+    game.engine = engines[0]
+    game.think_time_ms = options.time_ms
+    if options.book_path:
+        # Every worker maps the same book file, so its pages are shared rather than copied
+        game.open_book(options.book_path)
+        game.book_rng = rng
+    if options.tablebase_dir:
+        game.open_tablebases(options.tablebase_dir)
+        engines[1].tablebases = game.tablebases
+    a_color = index % 2
+    if options.opponent == RANDOM:
+        a_name, b_name = '{} ({})'.format(ENGINE, options.a_search.describe()), RANDOM
+    else:
+        a_name, b_name = ('{} {} ({})'.format(ENGINE, player, search.describe())
+                          for player, search in (('A', options.a_search), ('B', options.b_search)))
+    white, black = (a_name, b_name) if a_color == 0 else (b_name, a_name)
+
+    nodes = 0
+    search_time = 0.0
+    ending = _game_over(game, options.max_plies)
+    while ending is None:
+        position = game.position
+        ply = len(position.history)
+        if ply < options.random_plies or (options.opponent == RANDOM and position.turn != a_color):
+            position.make_move(rng.choice(game.generate_moves()))
+        else:
+            game.engine = engines[position.turn != a_color]
+            result = game._computer_move()
+            nodes += result.nodes
+            search_time += result.elapsed
+        ending = _game_over(game, options.max_plies)
+    game.close_book()
+    if game.tablebases is not None:
+        game.tablebases.close()
+
+    moves = [record[0] for record in game.position.history]
+    return GameRecord(index, white, black, moves, ending[0], ending[1], nodes, search_time, os.getpid())
+
+
+def _play_task(task: Tuple[int, SelfPlayOptions]) -> GameRecord:
+    return play_game(*task)
+
+
+def run_selfplay(games: int, options: SelfPlayOptions, workers: Optional[int] = None) -> Iterator[GameRecord]:
+    # Yield records in the order the games finish
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for index in range(games):
+            yield play_game(index, options)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_play_task, (index, options)) for index in range(games)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+class SelfPlaySummary:
+    def __init__(self):
+        self.games = 0
+        # From player A's point of view
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.plies = 0
+        self.terminations: Dict[str, int] = {}
+        # worker pid -> [nodes, search seconds]
+        self.workers: Dict[int, List[float]] = {}
+
+    def add(self, record: GameRecord) -> None:
+        self.games += 1
+        self.plies += len(record.moves)
+        a_white = record.index % 2 == 0
+        if record.result == '1/2-1/2':
+            self.draws += 1
+        elif (record.result == '1-0') == a_white:
+            self.wins += 1
+        else:
+            self.losses += 1
+        self.terminations[record.termination] = self.terminations.get(record.termination, 0) + 1
+        totals = self.workers.setdefault(record.worker, [0, 0.0])
+        totals[0] += record.nodes
+        totals[1] += record.search_time
+
+    def report(self, elapsed: float) -> str:
+        lines = ['{} games in {:.1f}s ({:.0f} games/hour)'.format(
+                     self.games, elapsed, self.games * 3600 / elapsed if elapsed else 0),
+                 'engine A: +{} ={} -{}  score {:.1f}%'.format(
+                     self.wins, self.draws, self.losses,
+                     100 * (self.wins + self.draws / 2) / self.games if self.games else 0),
+                 'average length {:.1f} plies'.format(self.plies / self.games if self.games else 0)]
+        for termination, count in sorted(self.terminations.items()):
+            lines.append('  {}: {}'.format(termination, count))
+        for worker, (nodes, seconds) in sorted(self.workers.items()):
+            lines.append('worker {}: {} nodes, {:.0f} nps'.format(worker, int(nodes), nodes / seconds if seconds else 0))
+        return '\n'.join(lines) + '\n'
+
+
+def main(argv: Optional[List[str]] = None, out: TextIO = sys.stdout) -> int:
+    parser = argparse.ArgumentParser(description='Play engine games without the GUI and write them as PGN.')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--time', type=int, default=100, help='thinking time per move in milliseconds')
+    parser.add_argument('--nodes', type=int, default=None, help='node budget per move; makes games reproducible')
+    parser.add_argument('--depth', type=int, default=64, help='maximum search depth per move')
+    parser.add_argument('--opponent', choices=(ENGINE, RANDOM), default=ENGINE)
+    parser.add_argument('--random-plies', type=int, default=0, help='play this many random plies to open each game')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES)
+    parser.add_argument('--book', help='opening book file built by book.py')
+    parser.add_argument('--tablebases', help='directory of endgame tables built by tablebase.py')
+    features = ', '.join(SearchOptions.FEATURES)
+    parser.add_argument('--a-disable', default='', metavar='FEATURES',
+                        help='comma-separated search features engine A plays without ({}, or all)'.format(features))
+    parser.add_argument('--b-disable', default='', metavar='FEATURES',
+                        help='the same for engine B')
+    parser.add_argument('--pgn', help='write games to this file instead of standard output')
+    parser.add_argument('--database', help='also store the games in this game database directory')
+    args = parser.parse_args(argv)
+    try:
+        a_search = SearchOptions.without(args.a_disable.split(','))
+        b_search = SearchOptions.without(args.b_disable.split(','))
+    except ValueError as error:
+        parser.error(str(error))
+
+    # With a node budget the clock should never be what ends a search
+    time_ms = args.time if args.nodes is None else max(args.time, 3_600_000)
+    options = SelfPlayOptions(time_ms, args.nodes, args.depth, args.opponent, args.random_plies, args.seed,
+                              args.max_plies, book_path=args.book,
+                              tablebase_dir=args.tablebases, a_search=a_search, b_search=b_search)
+    summary = SelfPlaySummary()
+    pgn_out = open(args.pgn, 'w') if args.pgn else out
+    database = GameDatabase(args.database) if args.database else None
+    start = time.perf_counter()
+    try:
+        for record in run_selfplay(args.games, options, args.workers):
+            pgn_out.write(record.pgn())
+            pgn_out.flush()
+            if database is not None:
+                database.add_game(record.moves, START_FEN, record.result)
+            summary.add(record)
+    finally:
+        if pgn_out is not out:
+            pgn_out.close()
+        if database is not None:
+            database.close()
+    sys.stderr.write(summary.report(time.perf_counter() - start))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
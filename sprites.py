@@ -0,0 +1,57 @@
+# Shared piece sprite atlas.  pieces.png is decoded once, and each
+# (piece type, color, square size) sprite is cut out, scaled and converted
+# to the display format the first time it is asked for.  Every piece on
+# every board shares these surfaces.
+#
+# pygame is only imported when a sprite is first needed, so the rules
+# modules can import this one on hosts without a display.
+
+SHEET_PATH = './images/pieces.png'
+# Column of each piece type in pieces.png; white pieces are on the top row, black on the bottom
+SHEET_COLUMNS = {'King': 0, 'Queen': 1, 'Bishop': 2, 'Knight': 3, 'Rook': 4, 'Pawn': 5}
+
+_sheet = None
+_atlas = {}
+_converted = set()
+
+
+def load_sheet() -> 'pg.Surface':
+    global _sheet
+    if _sheet is None:
+        import pygame as pg
+        _sheet = pg.image.load(SHEET_PATH)
+    return _sheet
+
+
+class LazySheet:
+    # Class attribute that decodes the sheet the first time it is read
+    def __get__(self, instance, owner) -> 'pg.Surface':
+        return load_sheet()
+
+
+def _color_row(color) -> int:
+    # Accepts 'white'/'black' strings as well as Color enum members
+    return 0 if str(getattr(color, 'name', color)).lower() == 'white' else 1
+
+
+def get_sprite(kind: str, color, size: int) -> 'pg.Surface':
+    import pygame as pg
+    key = (kind, _color_row(color), size)
+    sprite = _atlas.get(key)
+    if sprite is None:
+        sheet = load_sheet()
+        cell_width = sheet.get_width() / len(SHEET_COLUMNS)
+        cell_height = sheet.get_height() / 2
+        rect = pg.Rect(round(SHEET_COLUMNS[kind] * cell_width), round(key[1] * cell_height),
+                       int(cell_width), int(cell_height))
+        sprite = _atlas[key] = pg.transform.smoothscale(sheet.subsurface(rect), (size, size))
+    if key not in _converted and pg.display.get_init() and pg.display.get_surface() is not None:
+        # convert_alpha needs a display mode, so sprites made before the window opens are converted later
+        sprite = _atlas[key] = sprite.convert_alpha()
+        _converted.add(key)
+    return sprite
+
+
+def clear() -> None:
+    _atlas.clear()
+    _converted.clear()
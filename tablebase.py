@@ -0,0 +1,457 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from attacks import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, queen_attacks, rook_attacks
+from bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, Position, lsb
+
+# Endgame tablebases for a lone king against king and one or two pieces,
+# built by retrograde analysis and stored as bit-packed distance-to-mate.
+#
+# Positions are indexed with the strong side as White.  Pawnless tables use
+# the eight symmetries of the board (the strong king is kept in the a1-d1-d4
+# triangle); KPK only mirrors files (the pawn stays on files a-d).  Each
+# entry is 0 for a draw or dtm + 1, where dtm is the number of plies to mate
+# with best play; the strong side wins every non-drawn position because the
+# lone king can never win.  Entries are packed with as few bits as the
+# largest value needs and the file is read through mmap when probing.
+
+TABLES: Dict[str, Tuple[int, ...]] = {
+    'KQK': (QUEEN,),
+    'KRK': (ROOK,),
+    'KPK': (PAWN,),
+    'KBNK': (BISHOP, KNIGHT),
+}
+# Tables a promotion in the key table leads into.  Under-promotions to a minor piece only draw.
+PROMOTIONS = {'KPK': (('KQK', QUEEN), ('KRK', ROOK))}
+MAX_PIECES = 4
+DEFAULT_DIRECTORY = './tablebases'
+
+_HEADER = struct.Struct('<4sB8sBQ')
+_MAGIC = b'TBPK'
+_VERSION = 1
+_ILLEGAL = 255
+_PIECE_ORDER = (QUEEN, ROOK, BISHOP, KNIGHT, PAWN)
+_LETTERS = 'PNBRQK'
+
+
+def _transform(symmetry: int, sq: int) -> int:
+    row, col = sq >> 3, sq & 7
+    if symmetry & 1:
+        col = 7 - col
+    if symmetry & 2:
+        row = 7 - row
+    if symmetry & 4:
+        row, col = col, row
+    return row * 8 + col
+
+
+_SYMMETRIES = [[_transform(symmetry, sq) for sq in range(64)] for symmetry in range(8)]
+_MIRROR_FILES = _SYMMETRIES[1]
+# The ten strong-king squares of a pawnless table, and for every square the symmetries that bring it there
+_TRIANGLE = [sq for sq in range(64) if sq >> 3 <= sq & 7 <= 3]
+_TRIANGLE_INDEX = [_TRIANGLE.index(sq) if sq in _TRIANGLE else -1 for sq in range(64)]
+_KING_SYMMETRIES = []
+for _sq in range(64):
+    _best = min(table[_sq] for table in _SYMMETRIES)
+    _KING_SYMMETRIES.append([table for table in _SYMMETRIES if table[_sq] == _best])
+
+
+class TableSpec:
+    # Index layout of one table.  squares is (strong king, weak king, pieces in TABLES order).
+    def __init__(self, name: str):
+        self.name = name
+        self.kinds = TABLES[name]
+        self.pawns = PAWN in self.kinds
+        if self.pawns:
+            # Pawn on ranks 2-7 and files a-d, then both kings
+            self.size = 2 * 24 * 64 * 64
+        else:
+            self.size = 2 * len(_TRIANGLE) * 64 * 64 ** len(self.kinds)
+
+    def canonical(self, squares: Tuple[int, ...]) -> Tuple[int, ...]:
+        if self.pawns:
+            if squares[2] & 7 > 3:
+                return tuple(_MIRROR_FILES[sq] for sq in squares)
+            return squares
+        tables = _KING_SYMMETRIES[squares[0]]
+        if len(tables) == 1:
+            table = tables[0]
+            return tuple(table[sq] for sq in squares)
+        return min(tuple(table[sq] for sq in squares) for table in tables)
+
+    def index(self, squares: Tuple[int, ...], weak_to_move: int) -> int:
+        # Index of canonical squares
+        if self.pawns:
+            pawn = squares[2]
+            return ((weak_to_move * 24 + ((pawn >> 3) - 1) * 4 + (pawn & 7)) * 64 + squares[0]) * 64 + squares[1]
+        index = weak_to_move * len(_TRIANGLE) + _TRIANGLE_INDEX[squares[0]]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return index
+
+    def decode(self, index: int) -> Tuple[Tuple[int, ...], int]:
+        if self.pawns:
+            weak_king = index & 63
+            strong_king = (index >> 6) & 63
+            rest = index >> 12
+            pawn = ((rest % 24) // 4 + 1) * 8 + (rest % 24) % 4
+            return (strong_king, weak_king, pawn), rest // 24
+        pieces = []
+        for _ in range(len(self.kinds) + 1):
+            pieces.append(index & 63)
+            index >>= 6
+        pieces.reverse()
+        return (_TRIANGLE[index % len(_TRIANGLE)],) + tuple(pieces), index // len(_TRIANGLE)
+
+    def placements(self):
+        # Every canonical placement of the pieces, legal or not
+        if self.pawns:
+            for pawn_row in range(1, 7):
+                for pawn_col in range(4):
+                    pawn = pawn_row * 8 + pawn_col
+                    for strong_king in range(64):
+                        for weak_king in range(64):
+                            yield strong_king, weak_king, pawn
+            return
+        for strong_king in _TRIANGLE:
+            symmetric = len(_KING_SYMMETRIES[strong_king]) > 1
+            for weak_king in range(64):
+                stack = [()]
+                for _ in self.kinds:
+                    stack = [pieces + (sq,) for pieces in stack for sq in range(64)]
+                for pieces in stack:
+                    squares = (strong_king, weak_king) + pieces
+                    if not symmetric or self.canonical(squares) == squares:
+                        yield squares
+
+
+def _strong_attacks(kinds: Tuple[int, ...], squares: Tuple[int, ...], occupied: int, skip: int = -1) -> int:
+    # Squares attacked by the strong side; the piece standing on skip (a captured one) is left out
+    attacks = KING_ATTACKS[squares[0]]
+    for kind, sq in zip(kinds, squares[2:]):
+        if sq == skip:
+            continue
+        if kind == PAWN:
+            attacks |= PAWN_ATTACKS[WHITE][sq]
+        elif kind == KNIGHT:
+            attacks |= KNIGHT_ATTACKS[sq]
+        elif kind == BISHOP:
+            attacks |= bishop_attacks(sq, occupied)
+        elif kind == ROOK:
+            attacks |= rook_attacks(sq, occupied)
+        else:
+            attacks |= queen_attacks(sq, occupied)
+    return attacks
+
+
+def _occupancy(squares: Tuple[int, ...]) -> int:
+    occupied = 0
+    for sq in squares:
+        occupied |= 1 << sq
+    return occupied
+
+
+def _weak_moves(kinds: Tuple[int, ...], squares: Tuple[int, ...]) -> Tuple[List[int], bool]:
+    # Legal destinations of the lone king, and whether it can capture a piece (which leaves the table as a draw)
+    strong_king, weak_king = squares[0], squares[1]
+    occupied = _occupancy(squares) & ~(1 << weak_king)
+    attacked = _strong_attacks(kinds, squares, occupied)
+    targets = []
+    escapes = False
+    for end in range(64):
+        if not KING_ATTACKS[weak_king] >> end & 1 or KING_ATTACKS[strong_king] >> end & 1:
+            continue
+        if occupied >> end & 1:
+            if not _strong_attacks(kinds, squares, occupied, end) >> end & 1:
+                escapes = True
+        elif not attacked >> end & 1:
+            targets.append(end)
+    return targets, escapes
+
+
+def _strong_unmoves(kinds: Tuple[int, ...], squares: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+    # Placements the strong side could have moved from to reach squares (never a capture: the lone king is all
+    # the weak side has)
+    occupied = _occupancy(squares)
+    empty = ~occupied
+    previous = []
+    for start in _bits(KING_ATTACKS[squares[0]] & empty):
+        previous.append((start,) + squares[1:])
+    for slot, (kind, end) in enumerate(zip(kinds, squares[2:]), 2):
+        if kind == PAWN:
+            starts = []
+            if end >> 3 >= 2 and empty >> (end - 8) & 1:
+                starts.append(end - 8)
+                if end >> 3 == 3 and empty >> (end - 16) & 1:
+                    starts.append(end - 16)
+        elif kind == KNIGHT:
+            starts = _bits(KNIGHT_ATTACKS[end] & empty)
+        elif kind == BISHOP:
+            starts = _bits(bishop_attacks(end, occupied) & empty)
+        elif kind == ROOK:
+            starts = _bits(rook_attacks(end, occupied) & empty)
+        else:
+            starts = _bits(queen_attacks(end, occupied) & empty)
+        for start in starts:
+            previous.append(squares[:slot] + (start,) + squares[slot + 1:])
+    return previous
+
+
+def _bits(bb: int) -> List[int]:
+    squares = []
+    while bb:
+        low = bb & -bb
+        squares.append(low.bit_length() - 1)
+        bb ^= low
+    return squares
+
+
+def generate(name: str, dependencies: Optional[Dict[str, 'Table']] = None, log=None) -> bytearray:
+    # Values (0 draw, dtm + 1 win for the strong side) for every index of the named table
+    spec = TableSpec(name)
+    kinds = spec.kinds
+    values = bytearray([_ILLEGAL]) * spec.size
+    frontier = []
+    seeds: Dict[int, List[int]] = {}
+    promotions = [(TableSpec(target), kind, dependencies[target]) for target, kind in PROMOTIONS.get(name, ())]
+
+    for squares in spec.placements():
+        strong_king, weak_king = squares[0], squares[1]
+        if len(set(squares)) != len(squares) or KING_ATTACKS[strong_king] >> weak_king & 1:
+            continue
+        occupied = _occupancy(squares)
+        in_check = _strong_attacks(kinds, squares, occupied) >> weak_king & 1
+        if not in_check:
+            # With the strong side to move the lone king must not be in check
+            index = spec.index(squares, 0)
+            values[index] = 0
+            for target_spec, kind, target in promotions:
+                pawn = squares[2]
+                if pawn >> 3 == 6 and not occupied >> (pawn + 8) & 1:
+                    promoted = target_spec.canonical((strong_king, weak_king, pawn + 8))
+                    value = target.value(target_spec.index(promoted, 1))
+                    if value:
+                        # Won dtm plies after promoting, so dtm + 1 from here
+                        seeds.setdefault(value, []).append(index)
+        index = spec.index(squares, 1)
+        values[index] = 0
+        targets, escapes = _weak_moves(kinds, squares)
+        if in_check and not targets and not escapes:
+            values[index] = 1
+            frontier.append(index)
+
+    level = 0
+    while frontier or seeds:
+        for index in seeds.pop(level, ()):
+            if not values[index]:
+                values[index] = level + 1
+                frontier.append(index)
+        following = []
+        for index in frontier:
+            squares, weak_to_move = spec.decode(index)
+            if weak_to_move:
+                # Lost for the lone king in level plies: every position that can move here is won in level + 1
+                for previous in _strong_unmoves(kinds, squares):
+                    previous = spec.canonical(previous)
+                    other = spec.index(previous, 0)
+                    if not values[other]:
+                        values[other] = level + 2
+                        following.append(other)
+            else:
+                # Won in level plies: a lone-king position that moved here is lost once all its moves are lost
+                occupied = _occupancy(squares)
+                for start in _bits(KING_ATTACKS[squares[1]] & ~occupied & ~KING_ATTACKS[squares[0]]):
+                    previous = spec.canonical((squares[0], start) + squares[2:])
+                    other = spec.index(previous, 1)
+                    if values[other] or not _all_moves_lost(spec, values, previous):
+                        continue
+                    values[other] = level + 2
+                    following.append(other)
+        frontier = following
+        level += 1
+        if log is not None and frontier:
+            log('{}: {} positions at {} plies\n'.format(name, len(frontier), level))
+
+    for index in range(spec.size):
+        if values[index] == _ILLEGAL:
+            values[index] = 0
+    return values
+
+
+def _all_moves_lost(spec: TableSpec, values: bytearray, squares: Tuple[int, ...]) -> bool:
+    targets, escapes = _weak_moves(spec.kinds, squares)
+    if escapes or not targets:
+        return False
+    for end in targets:
+        following = spec.canonical((squares[0], end) + squares[2:])
+        value = values[spec.index(following, 0)]
+        if not value or value == _ILLEGAL:
+            return False
+    return True
+
+
+def write_table(path: str, name: str, values: bytearray) -> None:
+    bits = max(1, max(values).bit_length())
+    if bits > 8:
+        raise ValueError('{} needs {} bits per entry; at most 8 are supported'.format(name, bits))
+    # One spare byte so a probe can always read two bytes
+    packed = bytearray((len(values) * bits + 7) // 8 + 1)
+    accumulator = 0
+    pending = 0
+    offset = 0
+    for value in values:
+        accumulator |= value << pending
+        pending += bits
+        while pending >= 8:
+            packed[offset] = accumulator & 0xFF
+            accumulator >>= 8
+            pending -= 8
+            offset += 1
+    if pending:
+        packed[offset] = accumulator
+    with open(path, 'wb') as out:
+        out.write(_HEADER.pack(_MAGIC, _VERSION, name.encode('ascii'), bits, len(values)))
+        out.write(packed)
+
+
+class Table:
+    # One table file, mapped read-only
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, name, bits, entries = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError('{} is not a tablebase file'.format(path))
+        self.name = name.rstrip(b'\0').decode('ascii')
+        self.spec = TableSpec(self.name)
+        self.bits = bits
+        self.entries = entries
+        self._mask = (1 << bits) - 1
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def value(self, index: int) -> int:
+        bit = index * self.bits
+        offset = _HEADER.size + (bit >> 3)
+        data = self._map
+        return ((data[offset] | data[offset + 1] << 8) >> (bit & 7)) & self._mask
+
+
+class Tablebases:
+    # Every table found in a directory; probe() answers for positions covered by one of them
+    def __init__(self, directory: str = DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables: Dict[str, Table] = {}
+        for name in TABLES:
+            path = table_path(directory, name)
+            if os.path.exists(path):
+                self.tables[name] = Table(path)
+        self.hits = 0
+
+    def close(self) -> None:
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+    def __enter__(self) -> 'Tablebases':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def probe(self, position: Position) -> Optional[Tuple[int, int]]:
+        # (1 win / 0 draw / -1 loss for the side to move, plies to mate), or None if no table covers position
+        if position.castling:
+            return None
+        strong = None
+        for color in (WHITE, BLACK):
+            if position.occupancy[color] & ~position.pieces[color][KING]:
+                if strong is not None:
+                    return None
+                strong = color
+        if strong is None:
+            self.hits += 1
+            return 0, 0
+        pieces = position.pieces[strong]
+        name = 'K' + ''.join(_LETTERS[kind] * bin(pieces[kind]).count('1') for kind in _PIECE_ORDER) + 'K'
+        table = self.tables.get(name)
+        if table is None:
+            return None
+        # Tables are built with the strong side as White moving up the board
+        flip = 56 if strong == BLACK else 0
+        squares = (lsb(pieces[KING]) ^ flip, lsb(position.pieces[strong ^ 1][KING]) ^ flip) + tuple(
+            lsb(pieces[kind]) ^ flip for kind in table.spec.kinds)
+        weak_to_move = int(position.turn != strong)
+        value = table.value(table.spec.index(table.spec.canonical(squares), weak_to_move))
+        self.hits += 1
+        if not value:
+            return 0, 0
+        return (-1 if weak_to_move else 1), value - 1
+
+
+def table_path(directory: str, name: str) -> str:
+    return os.path.join(directory, name + '.tb')
+
+
+def build(names: List[str], directory: str = DEFAULT_DIRECTORY, log=None) -> None:
+    # Generate the named tables (and the tables they depend on) into directory, skipping existing files
+    os.makedirs(directory, exist_ok=True)
+    for name in names:
+        for target, _ in PROMOTIONS.get(name, ()):
+            if target not in names and not os.path.exists(table_path(directory, target)):
+                build([target], directory, log)
+        path = table_path(directory, name)
+        if os.path.exists(path):
+            continue
+        start = time.perf_counter()
+        dependencies = {target: Table(table_path(directory, target)) for target, _ in PROMOTIONS.get(name, ())}
+        try:
+            values = generate(name, dependencies, log)
+        finally:
+            for table in dependencies.values():
+                table.close()
+        write_table(path, name, values)
+        if log is not None:
+            log('{}: {} entries, longest mate {} plies, {:.1f}s\n'.format(
+                name, len(values), max(values) - 1, time.perf_counter() - start))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Generate or probe the endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help='build tables by retrograde analysis')
+    generate_parser.add_argument('tables', nargs='*', default=list(TABLES), help='any of ' + ' '.join(TABLES))
+    generate_parser.add_argument('--dir', default=DEFAULT_DIRECTORY)
+    probe_parser = commands.add_parser('probe', help='look up a position')
+    probe_parser.add_argument('fen')
+    probe_parser.add_argument('--dir', default=DEFAULT_DIRECTORY)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        unknown = [name for name in args.tables if name not in TABLES]
+        if unknown:
+            parser.error('unknown table: ' + ', '.join(unknown))
+        build(args.tables, args.dir, sys.stdout.write)
+        return 0
+    with Tablebases(args.dir) as tablebases:
+        result = tablebases.probe(Position.from_fen(args.fen))
+    if result is None:
+        print('not in the tablebases')
+    elif result[0] == 0:
+        print('draw')
+    else:
+        print('{} in {} plies'.format('win' if result[0] > 0 else 'loss', result[1]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
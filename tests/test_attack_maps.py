@@ -0,0 +1,63 @@
+import random
+
+from bitboard import BLACK, WHITE, Position
+from movegen import generate_moves
+from perft import REFERENCE_POSITIONS
+from rules import Game
+
+
+def _check_maps(position: Position) -> None:
+    assert position.square_attacks == [position.attacks_from(sq) for sq in range(64)]
+    for color in (WHITE, BLACK):
+        expected = 0
+        for sq in range(64):
+            if position.mailbox[sq] is not None and position.mailbox[sq][0] == color:
+                expected |= position.attacks_from(sq)
+        assert position.attack_map(color) == expected
+
+
+def test_attack_maps_follow_make_and_unmake():
+    rng = random.Random(14)
+    for _, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        position.track_attacks()
+        for _ in range(60):
+            _check_maps(position)
+            moves = generate_moves(position)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        while position.history:
+            position.unmake_move()
+            _check_maps(position)
+        assert position.fen() == Position.from_fen(fen).fen()
+
+
+def test_copies_and_fresh_positions_do_not_track():
+    position = Position.from_fen(REFERENCE_POSITIONS[1][1])
+    assert position.square_attacks is None
+    position.track_attacks()
+    assert position.copy().square_attacks is None
+    position.clear()
+    _check_maps(position)
+
+
+def test_game_status_from_the_attack_maps():
+    game = Game()
+    game.setup_board()
+    _check_maps(game.position)
+    assert not game.check('white') and not game.mate('white') and not game.stalemate('white')
+    # Fool's mate
+    for start, end in (((1, 5), (2, 5)), ((6, 4), (4, 4)), ((1, 6), (3, 6)), ((7, 3), (3, 7))):
+        assert game.move(start, end)
+    _check_maps(game.position)
+    assert game.check('white') and game.mate('white') and not game.check('black')
+    assert game.result() == '0-1'
+    assert game.undo()
+    assert not game.check('white') and not game.mate('white')
+
+    game.load_fen('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1')
+    _check_maps(game.position)
+    assert game.stalemate('black') and not game.check('black') and not game.mate('black')
+    game.load_fen('7k/8/6K1/8/8/8/8/R7 b - - 0 1')
+    assert not game.check('black') and not game.stalemate('black') and not game.mate('black')
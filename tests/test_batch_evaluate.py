@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from batch_evaluate import evaluate_batch, evaluate_many, evaluate_position
+from bitboard import Position
+from movegen import generate_moves
+from perft import REFERENCE_POSITIONS
+
+
+def _random_walk(seed: int, count: int) -> list:
+    # Positions from random games, starting from each of the perft positions
+    rng = random.Random(seed)
+    positions = []
+    for _, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        for _ in range(count):
+            moves = generate_moves(position)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+            positions.append(Position.from_fen(position.fen()))
+    return positions
+
+
+def test_batch_matches_scalar_path():
+    np = pytest.importorskip('numpy')
+    positions = _random_walk(19, 60)
+    scores = evaluate_batch(positions)
+    assert isinstance(scores, np.ndarray) and scores.dtype == np.int64
+    assert scores.tolist() == [evaluate_position(position) for position in positions]
+
+
+def test_evaluate_many_returns_plain_ints():
+    positions = _random_walk(20, 10)
+    scores = evaluate_many(positions)
+    assert all(type(score) is int for score in scores)
+    assert scores == [evaluate_position(position) for position in positions]
+    assert evaluate_many([]) == []
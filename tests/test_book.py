@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+from bitboard import START_FEN, Position, move_name
+from book import OpeningBook, book_result, collect_games, main, pgn_games, write_book
+from pgn import parse_san
+
+PGN = '''[Event "a"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 1-0
+
+[Event "b"]
+[Result "0-1"]
+
+1. e4 c5 0-1
+
+[Event "c"]
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+'''
+
+
+def _position(*sans: str) -> Position:
+    position = Position.from_fen(START_FEN)
+    for san in sans:
+        position.make_move(parse_san(position, san))
+    return position
+
+
+def _named(moves: list) -> list:
+    return [(move_name(move), weight) for move, weight in moves]
+
+
+@pytest.fixture
+def book_path(tmp_path):
+    pgn_path = tmp_path / 'games.pgn'
+    pgn_path.write_text(PGN)
+    path = str(tmp_path / 'openings.bin')
+    # Wins score two for the side that played the move, draws one; moves that never scored are dropped
+    assert write_book(path, collect_games(pgn_games([str(pgn_path)])), min_weight=1) == 5
+    return path
+
+
+def test_book_moves_and_weights(book_path):
+    with OpeningBook(book_path) as book:
+        assert book.entries == 5
+        assert _named(book.moves(_position())) == [('e2e4', 2), ('d2d4', 1)]
+        assert _named(book.moves(_position('e4'))) == [('c7c5', 2)]
+        assert _named(book.moves(_position('d4'))) == [('d7d5', 1)]
+        assert _named(book.moves(_position('e4', 'e5'))) == [('g1f3', 2)]
+
+
+def test_positions_out_of_book(book_path):
+    with OpeningBook(book_path) as book:
+        position = _position('a3')
+        assert book.moves(position) == []
+        assert book.choose(position, random.Random(1)) is None
+        assert book_result(book, position) is None
+    assert book_result(None, _position()) is None
+
+
+def test_choose_follows_the_weights(book_path):
+    rng = random.Random(17)
+    with OpeningBook(book_path) as book:
+        picks = [move_name(book.choose(_position(), rng)) for _ in range(3000)]
+        result = book_result(book, _position('e4'), rng)
+    assert set(picks) == {'e2e4', 'd2d4'}
+    assert 1850 < picks.count('e2e4') < 2150
+    assert move_name(result.move) == 'c7c5' and result.book
+
+
+def test_binary_search_finds_every_key(tmp_path):
+    rng = random.Random(170)
+    weights = {(rng.getrandbits(64), rng.getrandbits(12)): rng.randint(1, 9) for _ in range(600)}
+    # A few keys with several moves each
+    for key, _ in list(weights)[:20]:
+        weights[(key, 4095)] = 10
+    path = str(tmp_path / 'large.bin')
+    write_book(path, weights)
+    by_key = {}
+    for (key, move), weight in weights.items():
+        by_key.setdefault(key, []).append((move, weight))
+    with OpeningBook(path) as book:
+        for key, moves in by_key.items():
+            assert book.lookup(key) == sorted(moves, key=lambda entry: (-entry[1], entry[0]))
+        for key in (0, min(by_key) - 1, max(by_key) + 1, (1 << 64) - 1):
+            if key not in by_key:
+                assert book.lookup(key) == []
+
+
+def test_empty_and_damaged_files(tmp_path):
+    empty = tmp_path / 'empty.bin'
+    empty.write_bytes(b'')
+    with OpeningBook(str(empty)) as book:
+        assert book.entries == 0 and book.lookup(0) == []
+    damaged = tmp_path / 'damaged.bin'
+    damaged.write_bytes(b'\0' * 17)
+    with pytest.raises(ValueError):
+        OpeningBook(str(damaged))
+
+
+def test_command_line_build_and_probe(tmp_path, capsys):
+    pgn_path = tmp_path / 'games.pgn'
+    pgn_path.write_text(PGN)
+    path = str(tmp_path / 'cli.bin')
+    assert main(['build', path, str(pgn_path), '--min-weight', '2']) == 0
+    assert capsys.readouterr().out == '3 entries written to {}\n'.format(path)
+    assert main(['probe', path]) == 0
+    assert capsys.readouterr().out == 'e2e4 2\n'
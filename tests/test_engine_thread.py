@@ -0,0 +1,33 @@
+from movegen import generate_moves
+from rules import Game
+
+
+def test_cancel_then_restart_reuses_the_engine():
+    game = Game()
+    game.setup_board()
+    game.think_time_ms = 60_000
+    job = game.start_computer_move()
+    game.cancel_computer_move()
+    # The thread is gone before the engine is handed to another job
+    assert job.cancelled and not job.running
+    assert game.engine_job is None
+
+    game.think_time_ms = 200
+    restarted = game.start_computer_move()
+    assert restarted.engine is job.engine
+    result = restarted.wait(30)
+    assert not restarted.running
+    assert result.move in generate_moves(game.position)
+    assert game.finish_computer_move(restarted)
+    assert len(game.position.history) == 1
+
+
+def test_cancelled_job_is_not_played():
+    game = Game()
+    game.setup_board()
+    game.think_time_ms = 60_000
+    job = game.start_computer_move()
+    job.cancel()
+    assert not job.running
+    assert not game.finish_computer_move(job)
+    assert not game.position.history
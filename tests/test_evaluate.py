@@ -0,0 +1,49 @@
+import random
+
+from bitboard import BLACK, PAWN, WHITE, Position, iter_bits
+from evaluate import evaluate, evaluate_from_scratch
+from movegen import generate_moves
+from perft import REFERENCE_POSITIONS
+
+
+def _check_terms(position: Position) -> None:
+    assert evaluate(position) == evaluate_from_scratch(position)
+    for color in (WHITE, BLACK):
+        files = [0] * 8
+        for sq in iter_bits(position.pieces[color][PAWN]):
+            files[sq & 7] += 1
+        assert position.pawn_files[color] == files
+
+
+def test_running_terms_match_a_rescan_across_make_and_unmake():
+    rng = random.Random(23)
+    for _, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        scores = []
+        for _ in range(80):
+            _check_terms(position)
+            moves = generate_moves(position)
+            if not moves:
+                break
+            scores.append(evaluate(position))
+            position.make_move(rng.choice(moves))
+        _check_terms(position)
+        while scores:
+            position.unmake_move()
+            assert evaluate(position) == scores.pop()
+            _check_terms(position)
+
+
+def test_copy_keeps_the_terms():
+    position = Position.from_fen(REFERENCE_POSITIONS[1][1])
+    other = position.copy()
+    other.make_move(generate_moves(other)[0])
+    _check_terms(position)
+    _check_terms(other)
+
+
+def test_score_is_from_the_side_to_move():
+    position = Position.from_fen(REFERENCE_POSITIONS[0][1])
+    assert evaluate(position) == 0
+    flipped = Position.from_fen('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBN1 b Qkq - 0 1')
+    assert evaluate(flipped) > 0
@@ -0,0 +1,95 @@
+import random
+
+from bitboard import START_FEN, Position
+from gamedb import MERGE_FACTOR, MOVES, POSITIONS, GameDatabase
+from movegen import generate_moves
+from rules import Game
+
+RESULTS = ('1-0', '1/2-1/2', '0-1', '*')
+
+
+def _random_games(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        position = Position.from_fen(START_FEN)
+        moves = []
+        for _ in range(rng.randrange(2, 30)):
+            legal = generate_moves(position)
+            if not legal:
+                break
+            move = rng.choice(legal)
+            position.make_move(move)
+            moves.append(move)
+        games.append((moves, rng.choice(RESULTS)))
+    return games
+
+
+def _expected(games: list) -> dict:
+    # position key -> [(game id, ply)], by replaying every game
+    found = {}
+    for game_id, (moves, _) in enumerate(games):
+        position = Position.from_fen(START_FEN)
+        found.setdefault(position.hash, []).append((game_id, 0))
+        for ply, move in enumerate(moves, 1):
+            position.make_move(move)
+            found.setdefault(position.hash, []).append((game_id, ply))
+    return found
+
+
+def test_segments_merge_by_tier_and_lookups_stay_exact(tmp_path):
+    games = _random_games(90)
+    with GameDatabase(str(tmp_path), flush_games=2) as database:
+        for moves, result in games:
+            database.add_game(moves, START_FEN, result)
+            for kind in (POSITIONS, MOVES):
+                # At most MERGE_FACTOR - 1 segments per tier, and tiers only shrink towards the newest
+                tiers = [database._tier(segment) for segment in database.segments[kind]]
+                assert tiers == sorted(tiers, reverse=True)
+                assert all(tiers.count(tier) < MERGE_FACTOR for tier in tiers)
+        expected = _expected(games)
+        for key, occurrences in expected.items():
+            assert sorted(database.occurrences(key)) == sorted(occurrences)
+            assert database.count(key) == len(occurrences)
+        start = database.move_stats(Position.from_fen(START_FEN))
+        assert sum(stats.games for stats in start) == len(games)
+        assert sum(stats.white_wins for stats in start) == sum(result == '1-0' for _, result in games)
+
+    segment_files = [path.name for path in tmp_path.iterdir() if path.suffix == '.seg']
+    with GameDatabase(str(tmp_path), flush_games=2) as database:
+        assert len(database) == len(games)
+        assert sum(len(segments) for segments in database.segments.values()) == len(segment_files)
+        assert database.game(7) == (START_FEN, games[7][0], games[7][1])
+        database.compact()
+        assert [len(segments) for segments in database.segments.values()] == [1, 1]
+        for key, occurrences in expected.items():
+            assert database.count(key) == len(occurrences)
+
+
+def test_game_is_stored_once_and_when_it_ends(tmp_path):
+    game = Game()
+    game.setup_board()
+    assert game.open_database(str(tmp_path)) == 0
+    assert game.move((1, 4), (3, 4))
+    first = game.save_game()
+    # Nothing new was played, so neither the second save nor closing the database adds a copy
+    assert game.save_game() == first
+    game.close_database()
+    with GameDatabase(str(tmp_path)) as database:
+        assert len(database) == 1
+        assert database.game(first) == (START_FEN, [record[0] for record in game.position.history], '*')
+
+    # Fool's mate is stored as soon as it is played, and only then
+    assert game.open_database(str(tmp_path)) == 1
+    game.reset()
+    assert len(game.database) == 1
+    for start, end in (((1, 5), (2, 5)), ((6, 4), (4, 4)), ((1, 6), (3, 6))):
+        assert game.move(start, end)
+    assert len(game.database) == 1
+    assert game.move((7, 3), (3, 7))
+    assert len(game.database) == 2
+    assert game.database.game(1)[2] == '0-1'
+    game.reset()
+    game.close_database()
+    with GameDatabase(str(tmp_path)) as database:
+        assert len(database) == 2
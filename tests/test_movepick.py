@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from bitboard import CAPTURE, EP_CAPTURE, PAWN, PROMOTION, Position, parse_square
+from evaluate import PIECE_VALUES
+from movegen import generate_moves
+from movepick import SEE_VALUES, pick_moves, see
+from perft import REFERENCE_POSITIONS
+
+_NOISY = CAPTURE | PROMOTION
+
+
+def _move(position: Position, name: str) -> int:
+    return position.build_move(parse_square(name[:2]), parse_square(name[2:4]))
+
+
+@pytest.mark.parametrize('fen, move, value', [
+    # Undefended knight
+    ('4k3/8/8/3n4/4P3/8/8/4K3 w - - 0 1', 'e4d5', 320),
+    # Rook takes a pawn defended once
+    ('4k3/8/4p3/3p4/8/8/8/3RK3 w - - 0 1', 'd1d5', -400),
+    # Pawn defended twice, attacked by two knights: the first knight is lost for the pawn
+    ('4k3/8/2p1p3/3p4/5N2/2N5/8/4K3 w - - 0 1', 'c3d5', -220),
+    # Doubled rooks: the back rook x-rays through the front one and wins the exchange back
+    ('3rk3/8/8/3p4/8/8/3R4/3RK3 w - - 0 1', 'd2d5', 100),
+    ('3rk3/8/8/3p4/8/8/3R4/4K3 w - - 0 1', 'd2d5', -400),
+    # Queen behind bishop on a diagonal: two pawns for the bishop
+    ('4k3/6p1/5p2/8/8/2B5/1Q6/4K3 w - - 0 1', 'c3f6', -130),
+    # The king recaptures an undefended rook, but not one the rook behind it still defends
+    ('4k3/3p4/8/8/8/8/8/3RK3 w - - 0 1', 'd1d7', -400),
+    ('4k3/3p4/8/8/8/8/3R4/3RK3 w - - 0 1', 'd2d7', 100),
+    # En passant
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', 100),
+])
+def test_static_exchange(fen, move, value):
+    position = Position.from_fen(fen)
+    assert see(position, _move(position, move)) == value
+
+
+def _stage(position: Position, move: int, hash_move: int, killers: tuple) -> int:
+    # The stage pick_moves must hand move out in
+    if move == hash_move:
+        return 0
+    flag = move >> 12
+    if flag & _NOISY:
+        if flag & CAPTURE and _is_losing(position, move):
+            return 4
+        return 1
+    return 2 if move in killers else 3
+
+
+def _is_losing(position: Position, move: int) -> bool:
+    victim = PAWN if move >> 12 == EP_CAPTURE else position.mailbox[(move >> 6) & 63][1]
+    attacker = position.mailbox[move & 63][1]
+    return SEE_VALUES[victim] < SEE_VALUES[attacker] and see(position, move) < 0
+
+
+def _positions(seed: int) -> list:
+    rng = random.Random(seed)
+    positions = []
+    for _, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        for _ in range(25):
+            positions.append(Position.from_fen(position.fen()))
+            moves = generate_moves(position)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+    return positions
+
+
+def test_every_legal_move_exactly_once_in_stage_order():
+    rng = random.Random(24)
+    for position in _positions(24):
+        legal = generate_moves(position)
+        quiet = [move for move in legal if not move >> 12 & _NOISY]
+        # Hash and killer moves may be stale: illegal here, or noisy
+        hash_move = rng.choice(legal + [rng.getrandbits(16)])
+        killers = tuple(rng.choice(quiet + [rng.getrandbits(16)] + legal) if quiet else 0 for _ in range(2))
+        history = [rng.randrange(1000) for _ in range(4096)]
+        fen = position.fen()
+        picked = list(pick_moves(position, hash_move, killers, history))
+        assert position.fen() == fen
+        assert sorted(picked) == sorted(legal)
+
+        stages = [_stage(position, move, hash_move, killers) for move in picked]
+        assert stages == sorted(stages)
+        good = [move for move, stage in zip(picked, stages) if stage == 1 and move >> 12 & CAPTURE]
+        keys = [PIECE_VALUES[PAWN if move >> 12 == EP_CAPTURE else position.mailbox[(move >> 6) & 63][1]] * 8
+                - position.mailbox[move & 63][1] for move in good]
+        assert keys == sorted(keys, reverse=True)
+        quiets = [history[move & 4095] for move, stage in zip(picked, stages) if stage == 3]
+        assert quiets == sorted(quiets, reverse=True)
+
+
+def test_quiescence_filters():
+    for position in _positions(25):
+        legal = generate_moves(position)
+        noisy = {move for move in legal if move >> 12 & _NOISY}
+        losing = {move for move in noisy if move >> 12 & CAPTURE and _is_losing(position, move)}
+        assert set(pick_moves(position, quiets=False)) == noisy
+        assert set(pick_moves(position, quiets=False, losing=False)) == noisy - losing
+        # A quiet hash move is not handed out when only noisy moves are wanted
+        quiet = sorted(set(legal) - noisy)
+        if quiet:
+            assert set(pick_moves(position, quiet[0], quiets=False)) == noisy
+
+
+def test_hash_move_comes_first_and_killers_before_quiets():
+    position = Position.from_fen(REFERENCE_POSITIONS[1][1])
+    hash_move = _move(position, 'a2a3')
+    killer = _move(position, 'g2g3')
+    picked = list(pick_moves(position, hash_move, (killer, 0)))
+    assert picked[0] == hash_move and picked.count(hash_move) == 1 and picked.count(killer) == 1
+    first_quiet = next(index for index, move in enumerate(picked[1:], 1) if not move >> 12 & _NOISY)
+    assert picked[first_quiet] == killer
+    assert all(move >> 12 & _NOISY for move in picked[1:first_quiet])
@@ -0,0 +1,22 @@
+import pytest
+
+from bitboard import Position
+from perft import REFERENCE_POSITIONS, divide, perft
+
+# Deepest depth checked per position, kept small enough for the whole suite to run in seconds
+DEPTHS = {'start': 4, 'kiwipete': 3, 'position3': 5, 'position4': 4, 'position5': 3, 'position6': 3}
+
+
+@pytest.mark.parametrize('name, fen, counts', REFERENCE_POSITIONS, ids=[entry[0] for entry in REFERENCE_POSITIONS])
+def test_reference_counts(name, fen, counts):
+    position = Position.from_fen(fen)
+    for depth in range(1, DEPTHS[name] + 1):
+        assert perft(position, depth) == counts[depth - 1]
+    # Every move was taken back
+    assert position.fen() == Position.from_fen(fen).fen()
+    assert not position.history
+
+
+def test_divide_adds_up():
+    name, fen, counts = REFERENCE_POSITIONS[1]
+    assert sum(divide(Position.from_fen(fen), 2).values()) == counts[1]
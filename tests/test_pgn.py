@@ -0,0 +1,72 @@
+import io
+import random
+
+from bitboard import Position
+from movegen import generate_moves
+from perft import REFERENCE_POSITIONS
+from pgn import final_fen, format_game, map_games, read_games, write_games
+
+
+def _random_game(fen: str, plies: int, rng: random.Random) -> list:
+    position = Position.from_fen(fen)
+    moves = []
+    for _ in range(plies):
+        legal = generate_moves(position)
+        if not legal:
+            break
+        move = rng.choice(legal)
+        position.make_move(move)
+        moves.append(move)
+    return moves
+
+
+def _final_fen(fen: str, moves: list) -> str:
+    position = Position.from_fen(fen)
+    for move in moves:
+        position.make_move(move)
+    return position.fen()
+
+
+def _games(count: int, seed: int = 7) -> list:
+    # (start fen, moves) from every reference position, covering castling, en passant and promotions
+    rng = random.Random(seed)
+    fens = [fen for _, fen, _ in REFERENCE_POSITIONS]
+    return [(fen, _random_game(fen, rng.randrange(1, 120), rng)) for fen in (fens * count)[:count]]
+
+
+def test_write_then_read_gives_the_same_moves():
+    tags = {'Event': 'Round "trip" \\ test', 'White': 'A', 'Black': 'B', 'Annotator': 'tests'}
+    for fen, moves in _games(24):
+        text = format_game(moves, tags, fen, '1/2-1/2')
+        (game,) = list(read_games(io.StringIO(text)))
+        assert game.moves() == moves
+        assert game.start_fen == fen
+        assert game.result == '1/2-1/2'
+        assert game.tags['Event'] == tags['Event'] and game.tags['Annotator'] == 'tests'
+
+
+def test_reformatting_a_read_game_is_stable():
+    text = ''.join(format_game(moves, {'Round': index}, fen, '*') for index, (fen, moves) in enumerate(_games(12)))
+    out = io.StringIO()
+    assert write_games(out, read_games(io.StringIO(text))) == 12
+    assert out.getvalue() == text
+
+
+def test_comments_variations_and_nags_are_skipped():
+    text = ('[Event "?"]\n\n1. e4 {best by test} e5 2. Nf3 $1 (2. f4 exf4) Nc6 3. Bb5 a6 '
+            '; the Ruy Lopez\n4. Ba4 Nf6 5. O-O 1-0\n')
+    (game,) = list(read_games(io.StringIO(text)))
+    assert game.sans == ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6', 'O-O']
+    assert game.result == '1-0'
+    assert game.final_position().fen() == 'r1bqkb1r/1ppp1ppp/p1n2n2/4p3/B3P3/5N2/PPPP1PPP/RNBQ1RK1 b kq - 3 5'
+
+
+def test_chunked_reader_matches_serial_reader(tmp_path):
+    games = _games(30, seed=11)
+    path = tmp_path / 'games.pgn'
+    path.write_text(''.join(format_game(moves, {'Round': index}, fen, '*') for index, (fen, moves) in enumerate(games)))
+    serial = list(map_games(str(path), final_fen, workers=1))
+    # Small chunks so that chunk boundaries fall inside games
+    parallel = list(map_games(str(path), final_fen, workers=2, chunk_bytes=700))
+    assert serial == parallel
+    assert serial == [_final_fen(fen, moves) for fen, moves in games]
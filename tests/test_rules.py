@@ -0,0 +1,28 @@
+from bitboard import START_FEN, move_from_row_col
+from rules import Game, King, Pawn, Queen
+
+
+def test_setup_board_shares_one_piece_per_color_and_kind():
+    game = Game()
+    game.setup_board()
+    assert game.fen() == START_FEN
+    assert game.board[1][0] is game.board[1][7] is Pawn('white', game)
+    assert game.board[7][4] is King('black', game)
+    assert type(game.board[0][3]) is Queen and game.board[0][3].color == 'white'
+    assert game.board[4][4] is None
+    # Each game has its own pieces, since they refer back to it
+    other = Game()
+    assert Pawn('white', other) is not Pawn('white', game) and Pawn('white', other).game is other
+
+    pieces = set(map(id, game._piece_objects.values()))
+    game.reset()
+    assert set(map(id, game._piece_objects.values())) == pieces
+
+
+def test_moves_go_through_packed_ints():
+    game = Game()
+    game.setup_board()
+    move = game.find_move((1, 4), (3, 4))
+    assert move & 0xFFF == move_from_row_col((1, 4), (3, 4))
+    assert game.move((1, 4), (3, 4))
+    assert game.get(3, 4) is Pawn('white', game) and game.get(1, 4) is None
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from bitboard import Position, move_name
+from search import INFINITY, MATE, MAX_PLY, SearchOptions, Searcher
+
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+# Back rank mate: 1. Rd8#
+BACK_RANK = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+
+
+@pytest.mark.parametrize('limit', [800, 5000])
+def test_node_limit_is_exact(limit):
+    result = Searcher(tt_mb=1).search(Position.from_fen(KIWIPETE), time_ms=10 ** 6, max_nodes=limit)
+    assert result.nodes == limit
+
+
+@pytest.mark.parametrize('disabled', [(), ('all',), ('null_move',), ('lmr',), ('futility', 'reverse-futility')])
+def test_back_rank_mate_found_with_any_options(disabled):
+    searcher = Searcher(tt_mb=1, max_depth=4, options=SearchOptions.without(disabled))
+    result = searcher.search(Position.from_fen(BACK_RANK), time_ms=10 ** 6)
+    assert move_name(result.move) == 'd1d8'
+    assert result.score == MATE - 1
+
+
+def test_position_is_restored_after_search():
+    position = Position.from_fen(KIWIPETE)
+    Searcher(tt_mb=1, max_depth=4).search(position, time_ms=10 ** 6)
+    assert position.fen() == KIWIPETE
+    assert not position.history
+
+
+def test_unknown_feature_is_rejected():
+    with pytest.raises(ValueError):
+        SearchOptions.without(['late_moves'])
+    options = SearchOptions.without(['lmr', ''])
+    assert not options.lmr and options.null_move
+    assert options.describe() == 'no lmr'
+
+
+def test_quiescence_stops_at_the_ply_limit_in_check():
+    # White is in check and can capture the checking rook with check, so the line stays in check
+    position = Position.from_fen('6rk/8/8/3Q4/8/8/8/6K1 w - - 0 1')
+    searcher = Searcher(tt_mb=1)
+    searcher.position = position
+    searcher._deadline = time.perf_counter() + 60
+    for ply in range(MAX_PLY - 3, MAX_PLY):
+        score = searcher._quiescence(-INFINITY, INFINITY, ply)
+        assert -INFINITY < score < INFINITY
+        assert position.fen() == '6rk/8/8/3Q4/8/8/8/6K1 w - - 0 1'
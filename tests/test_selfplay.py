@@ -0,0 +1,50 @@
+import io
+
+from pgn import read_games
+from selfplay import RANDOM, SelfPlayOptions, SelfPlaySummary, main, play_game
+
+ARGS = ['--games', '2', '--workers', '1', '--nodes', '400', '--depth', '6', '--random-plies', '4',
+        '--max-plies', '24', '--seed', '16']
+
+
+def _run(capsys) -> tuple:
+    out = io.StringIO()
+    assert main(ARGS, out) == 0
+    return out.getvalue(), capsys.readouterr().err
+
+
+def test_node_limited_games_are_reproducible_and_well_formed(capsys):
+    pgn_text, report = _run(capsys)
+    again, _ = _run(capsys)
+    assert again == pgn_text
+
+    games = list(read_games(io.StringIO(pgn_text)))
+    assert [game.tags['Round'] for game in games] == ['1', '2']
+    for game in games:
+        moves = game.moves()
+        assert 0 < len(moves) <= 24
+        assert game.result in ('1-0', '0-1', '1/2-1/2')
+        assert game.tags['Termination']
+        assert game.tags['White'] != game.tags['Black']
+    # Player A has White in the first game and Black in the second
+    assert games[0].tags['White'] == games[1].tags['Black']
+
+    lines = report.splitlines()
+    assert lines[0].startswith('2 games in ')
+    assert lines[1].startswith('engine A: +')
+    assert lines[2].startswith('average length ')
+    assert any(line.startswith('worker ') and line.endswith(' nps') for line in lines)
+
+
+def test_summary_counts_results_from_player_a():
+    options = SelfPlayOptions(time_ms=3_600_000, max_nodes=200, max_depth=4, opponent=RANDOM, seed=3, max_plies=16)
+    records = [play_game(index, options) for index in range(2)]
+    assert [record.moves for record in records] == [play_game(index, options).moves for index in range(2)]
+    summary = SelfPlaySummary()
+    for record in records:
+        summary.add(record)
+    assert summary.games == 2
+    assert summary.wins + summary.draws + summary.losses == 2
+    assert summary.plies == sum(len(record.moves) for record in records)
+    assert sum(summary.terminations.values()) == 2
+    assert records[0].black == RANDOM and records[1].white == RANDOM
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from bitboard import BLACK, KING, WHITE, Position, move_name
+from movegen import generate_moves
+from tablebase import TABLES, Tablebases, build
+
+
+@pytest.fixture(scope='module')
+def tablebases(tmp_path_factory):
+    # KPK promotes into KQK and KRK, so all three are built
+    directory = str(tmp_path_factory.mktemp('tablebases'))
+    build(['KRK', 'KPK'], directory)
+    with Tablebases(directory) as tables:
+        yield tables
+
+
+def _random_position(rng: random.Random, name: str, strong: int) -> Position:
+    # A legal position with the named material for strong and either side to move
+    while True:
+        squares = rng.sample(range(64), 2 + len(TABLES[name]))
+        if abs((squares[0] >> 3) - (squares[1] >> 3)) <= 1 and abs((squares[0] & 7) - (squares[1] & 7)) <= 1:
+            continue
+        if any(sq >> 3 in (0, 7) for sq, kind in zip(squares[2:], TABLES[name]) if kind == 0):
+            continue
+        position = Position.from_fen('8/8/8/8/8/8/8/8 {} - - 0 1'.format(rng.choice('wb')))
+        position.put(squares[0], strong, KING)
+        position.put(squares[1], strong ^ 1, KING)
+        for sq, kind in zip(squares[2:], TABLES[name]):
+            position.put(sq, strong, kind)
+        if not position.in_check(position.turn ^ 1):
+            return Position.from_fen(position.fen())
+
+
+def _children(tablebases: Tablebases, position: Position) -> list:
+    # (move, probe) for every legal move; a minor piece left against a bare king is a draw no table covers
+    children = []
+    for move in generate_moves(position):
+        position.make_move(move)
+        children.append((move, tablebases.probe(position) or (0, 0)))
+        position.unmake_move()
+    return children
+
+
+def _check_lookahead(tablebases: Tablebases, position: Position) -> None:
+    outcome, plies = tablebases.probe(position)
+    children = _children(tablebases, position)
+    if not children:
+        # Mate, or stalemate of the lone king
+        assert plies == 0
+        assert outcome == (-1 if position.in_check(position.turn) else 0)
+        return
+    assert outcome == max(-child_outcome for _, (child_outcome, _) in children)
+    if outcome == 1:
+        # The fastest mate
+        assert plies == min(child_plies for _, (child_outcome, child_plies) in children if child_outcome == -1) + 1
+    elif outcome == -1:
+        # The defender holds out as long as possible
+        assert plies == max(child_plies for _, (_, child_plies) in children) + 1
+    else:
+        assert plies == 0
+
+
+@pytest.mark.parametrize('name', ['KRK', 'KPK'])
+@pytest.mark.parametrize('strong', [WHITE, BLACK])
+def test_distances_agree_with_one_ply_lookahead(tablebases, name, strong):
+    rng = random.Random(18 + strong)
+    for _ in range(150):
+        _check_lookahead(tablebases, _random_position(rng, name, strong))
+
+
+def test_krk_mates(tablebases):
+    assert tablebases.probe(Position.from_fen('3R2k1/8/6K1/8/8/8/8/8 b - - 0 1')) == (-1, 0)
+    assert tablebases.probe(Position.from_fen('6k1/8/6K1/8/8/8/8/3R4 w - - 0 1')) == (1, 1)
+    assert tablebases.probe(Position.from_fen('4k3/8/8/8/8/8/8/R3K3 w Q - 0 1')) is None
+
+
+def test_kpk_results(tablebases):
+    # King in front of its pawn on the sixth rank wins whoever is to move, on either wing and for either color
+    for fen, expected in (('4k3/8/4K3/4P3/8/8/8/8 w - - 0 1', 1), ('4k3/8/4K3/4P3/8/8/8/8 b - - 0 1', -1),
+                          ('8/8/8/8/3p4/3k4/8/3K4 b - - 0 1', 1), ('6k1/8/6K1/6P1/8/8/8/8 w - - 0 1', 1)):
+        position = Position.from_fen(fen)
+        outcome, plies = tablebases.probe(position)
+        assert outcome == expected and plies > 0
+        _check_lookahead(tablebases, position)
+    # The lone king in the rook pawn's corner cannot be driven out
+    for fen in ('k7/8/8/8/P7/8/8/4K3 w - - 0 1', '7k/8/5K2/7P/8/8/8/8 w - - 0 1', '8/8/8/8/8/k7/p7/K7 w - - 0 1'):
+        assert tablebases.probe(Position.from_fen(fen)) == (0, 0)
+
+
+def test_kpk_promotes_in_one(tablebases):
+    position = Position.from_fen('8/7P/8/8/8/8/8/K1k5 w - - 0 1')
+    outcome, plies = tablebases.probe(position)
+    best = min((child_plies, move) for move, (child_outcome, child_plies) in _children(tablebases, position)
+               if child_outcome == -1)
+    assert outcome == 1 and plies == best[0] + 1
+    assert move_name(best[1]) == 'h7h8q'
+    # The queen then mates from the KQK table
+    position.make_move(best[1])
+    assert tablebases.probe(position) == (-1, plies - 1)
+
+
+@pytest.mark.slow
+def test_kbnk(tmp_path):
+    # Several minutes to generate: run with pytest -m slow
+    build(['KBNK'], str(tmp_path))
+    with Tablebases(str(tmp_path)) as tables:
+        table = tables.tables['KBNK']
+        assert max(table.value(index) for index in range(table.entries)) - 1 == 66
+        rng = random.Random(66)
+        for strong in (WHITE, BLACK):
+            for _ in range(40):
+                _check_lookahead(tables, _random_position(rng, 'KBNK', strong))
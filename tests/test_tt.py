@@ -0,0 +1,75 @@
+from tt import EXACT, LOWER, UPPER, TranspositionTable, shared_buffer
+
+# With a single bucket every key collides: slot 0 is depth-preferred, slot 1 always replaced
+KEYS = [0x9E37_79B9_7F4A_7C15 * (index + 1) & 0xFFFF_FFFF_FFFF_FFFF for index in range(4)]
+
+
+def _single_bucket() -> TranspositionTable:
+    table = TranspositionTable(size_mb=0)
+    assert table.buckets == 1
+    return table
+
+
+def test_store_and_probe_round_trip():
+    table = _single_bucket()
+    table.store(KEYS[0], 0x1234, -250, 7, LOWER)
+    assert table.probe(KEYS[0]) == (0x1234, -250, 7, LOWER)
+    assert table.probe(KEYS[1]) is None
+    assert (table.hits, table.probes) == (1, 2)
+
+
+def test_shallower_entry_goes_to_the_always_replace_slot():
+    table = _single_bucket()
+    table.store(KEYS[0], 1, 10, 6, EXACT)
+    table.store(KEYS[1], 2, 20, 3, EXACT)
+    table.store(KEYS[2], 3, 30, 2, UPPER)
+    # The deep entry stays; the second shallow one pushed out the first
+    assert table.probe(KEYS[0]) == (1, 10, 6, EXACT)
+    assert table.probe(KEYS[1]) is None
+    assert table.probe(KEYS[2]) == (3, 30, 2, UPPER)
+    # An entry at least as deep takes the depth-preferred slot
+    table.store(KEYS[3], 4, 40, 6, LOWER)
+    assert table.probe(KEYS[3]) == (4, 40, 6, LOWER)
+    assert table.probe(KEYS[0]) is None
+
+
+def test_entries_from_an_older_search_are_replaced_regardless_of_depth():
+    table = _single_bucket()
+    table.store(KEYS[0], 1, 10, 12, EXACT)
+    table.store(KEYS[1], 2, 20, 1, EXACT)
+    assert table.probe(KEYS[0]) is not None
+    table.new_search()
+    table.store(KEYS[2], 3, 30, 1, EXACT)
+    assert table.probe(KEYS[0]) is None
+    assert table.probe(KEYS[1]) == (2, 20, 1, EXACT)
+    assert table.probe(KEYS[2]) == (3, 30, 1, EXACT)
+
+
+def test_best_move_survives_a_store_without_one():
+    table = _single_bucket()
+    table.store(KEYS[0], 0x0ABC, 5, 4, LOWER)
+    table.store(KEYS[0], 0, -5, 5, UPPER)
+    assert table.probe(KEYS[0]) == (0x0ABC, -5, 5, UPPER)
+
+
+def test_shared_buffer_is_seen_by_every_table_and_torn_entries_miss():
+    buffer = shared_buffer(0)
+    writer, reader = TranspositionTable(buffer=buffer), TranspositionTable(buffer=buffer)
+    writer.store(KEYS[0], 1, 10, 8, EXACT)
+    writer.store(KEYS[1], 2, 20, 2, EXACT)
+    assert reader.probe(KEYS[0]) == (1, 10, 8, EXACT)
+    # A data word from another write no longer matches its key word
+    buffer[1] ^= 1 << 40
+    assert reader.probe(KEYS[0]) is None
+    assert reader.probe(KEYS[1]) == (2, 20, 2, EXACT)
+    buffer[2] ^= 1
+    assert reader.probe(KEYS[1]) is None
+
+
+def test_clear_empties_the_table():
+    table = _single_bucket()
+    table.new_search()
+    table.store(KEYS[0], 1, 10, 8, EXACT)
+    table.clear()
+    assert table.probe(KEYS[0]) is None
+    assert table.age == 0
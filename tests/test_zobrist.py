@@ -0,0 +1,49 @@
+import random
+
+from bitboard import Position, move_name
+from movegen import generate_moves
+from perft import REFERENCE_POSITIONS
+from zobrist import hash_position
+
+
+def _random_walk(position: Position, plies: int, rng: random.Random) -> list:
+    # Play random legal moves, checking the incremental hash against a full rehash after each one;
+    # returns the hash before every move played
+    keys = []
+    for _ in range(plies):
+        moves = generate_moves(position)
+        if not moves:
+            break
+        keys.append(position.hash)
+        position.make_move(rng.choice(moves))
+        assert position.hash == hash_position(position)
+    return keys
+
+
+def test_fen_hash_matches_rehash():
+    for _, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        assert position.hash == hash_position(position)
+
+
+def test_hash_after_make_and_unmake():
+    rng = random.Random(3)
+    for _, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        start = position.hash
+        keys = _random_walk(position, 60, rng)
+        while keys:
+            position.unmake_move()
+            assert position.hash == keys.pop() == hash_position(position)
+        assert position.hash == start
+
+
+def test_transposition_has_same_hash():
+    first = Position.from_fen(REFERENCE_POSITIONS[0][1])
+    second = first.copy()
+    for position, names in ((first, ('g1f3', 'g8f6', 'b1c3')), (second, ('b1c3', 'g8f6', 'g1f3'))):
+        for name in names:
+            move = next(move for move in generate_moves(position) if move_name(move) == name)
+            position.make_move(move)
+    assert first.hash == second.hash
+    assert first.hash != Position.from_fen(REFERENCE_POSITIONS[0][1]).hash
@@ -0,0 +1,109 @@
+from array import array
+from typing import Optional, Tuple
+
+# Transposition table in a fixed-size, preallocated array of 64-bit words.
+#
+# The table is split into buckets of two entries, each entry two words:
+# the position hash XORed with the data word, then the packed data word.
+# Slot 0 of a bucket is depth-preferred, slot 1 is always replaced.
+# Entries written during an older search (a different age) can be
+# overwritten regardless of depth.
+#
+# The words may live in shared memory (shared_buffer()) so that several
+# search processes use one table.  Writers take no lock: an entry whose two
+# words come from different writes fails the XOR check and reads as a miss.
+
+EXACT = 1
+LOWER = 2
+UPPER = 3
+
+_WORDS_PER_BUCKET = 4
+_BYTES_PER_BUCKET = _WORDS_PER_BUCKET * 8
+_SCORE_OFFSET = 1 << 20
+_AGE_MASK = 63
+
+# Data word layout: move (16 bits) | score + offset (21 bits) | depth (8 bits) | bound (2 bits) | age (6 bits)
+_SCORE_SHIFT = 16
+_DEPTH_SHIFT = 37
+_BOUND_SHIFT = 45
+_AGE_SHIFT = 47
+
+
+def _pack(move: int, score: int, depth: int, bound: int, age: int) -> int:
+    return (move | ((score + _SCORE_OFFSET) << _SCORE_SHIFT) | (max(depth, 0) << _DEPTH_SHIFT)
+            | (bound << _BOUND_SHIFT) | (age << _AGE_SHIFT))
+
+
+def _bucket_count(size_mb: float) -> int:
+    # Round down to a power of two so the bucket index is a mask of the hash
+    buckets = max(1, int(size_mb * 1024 * 1024) // _BYTES_PER_BUCKET)
+    return 1 << (buckets.bit_length() - 1)
+
+
+def shared_buffer(size_mb: float):
+    # Zeroed shared memory for a table of size_mb, to hand to worker processes when they start
+    from multiprocessing.sharedctypes import RawArray
+    return RawArray('Q', _bucket_count(size_mb) * _WORDS_PER_BUCKET)
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: float = 16, buffer=None):
+        # buffer: memory from shared_buffer() to use instead of a private array; it sets the size
+        if buffer is None:
+            self.buckets = _bucket_count(size_mb)
+            self._table = array('Q', bytes(self.buckets * _BYTES_PER_BUCKET))
+        else:
+            self._table = memoryview(buffer).cast('B').cast('Q')
+            self.buckets = len(self._table) // _WORDS_PER_BUCKET
+        self._mask = self.buckets - 1
+        self.age = 0
+        self.hits = 0
+        self.probes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self.buckets * _BYTES_PER_BUCKET
+
+    def clear(self) -> None:
+        self._table[:] = array('Q', bytes(self.buckets * _BYTES_PER_BUCKET))
+        self.age = 0
+
+    def new_search(self) -> None:
+        # Bump the age so entries from earlier searches become first in line for replacement
+        self.age = (self.age + 1) & _AGE_MASK
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        # Return (move, score, depth, bound) for key, or None
+        self.probes += 1
+        table = self._table
+        index = (key & self._mask) * _WORDS_PER_BUCKET
+        data = table[index + 1]
+        if table[index] ^ data != key:
+            data = table[index + 3]
+            if table[index + 2] ^ data != key:
+                return None
+        if not data:
+            return None
+        self.hits += 1
+        return (data & 0xFFFF, ((data >> _SCORE_SHIFT) & 0x1FFFFF) - _SCORE_OFFSET,
+                (data >> _DEPTH_SHIFT) & 0xFF, (data >> _BOUND_SHIFT) & 3)
+
+    def store(self, key: int, move: int, score: int, depth: int, bound: int) -> None:
+        table = self._table
+        index = (key & self._mask) * _WORDS_PER_BUCKET
+        stored = table[index + 1]
+        stored_key = table[index] ^ stored
+        if stored_key == key and not move:
+            # Keep the best move of a previous search of this position
+            move = stored & 0xFFFF
+        if (stored_key == key or not stored or depth >= (stored >> _DEPTH_SHIFT) & 0xFF
+                or (stored >> _AGE_SHIFT) & _AGE_MASK != self.age):
+            data = _pack(move, score, depth, bound, self.age)
+            table[index] = key ^ data
+            table[index + 1] = data
+        else:
+            if table[index + 2] ^ table[index + 3] == key and not move:
+                move = table[index + 3] & 0xFFFF
+            data = _pack(move, score, depth, bound, self.age)
+            table[index + 2] = key ^ data
+            table[index + 3] = data
@@ -0,0 +1,34 @@
+import random
+from typing import List
+
+# Zobrist keys.  A fixed seed keeps hashes identical across processes and
+# runs, so they can be stored in files and compared between workers.
+_rng = random.Random(0x5A0B_2157)
+
+# PIECE_KEYS[color][kind][sq]
+PIECE_KEYS: List[List[List[int]]] = [[[_rng.getrandbits(64) for _ in range(64)] for _ in range(6)] for _ in range(2)]
+SIDE_KEY = _rng.getrandbits(64)
+_CASTLING_RIGHT_KEYS = [_rng.getrandbits(64) for _ in range(4)]
+# CASTLING_KEYS[rights] for every 4-bit combination of castling rights
+CASTLING_KEYS: List[int] = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights >> _bit & 1:
+            CASTLING_KEYS[_rights] ^= _CASTLING_RIGHT_KEYS[_bit]
+# EP_KEYS[col] for the file of the en passant square
+EP_KEYS: List[int] = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def hash_position(position) -> int:
+    # Full rehash from the pieces and state, to check the hash a position keeps up to date move by move
+    key = 0
+    for sq, code in enumerate(position.mailbox):
+        if code is not None:
+            color, kind = code
+            key ^= PIECE_KEYS[color][kind][sq]
+    if position.turn:
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[position.castling]
+    if position.ep_square is not None:
+        key ^= EP_KEYS[position.ep_square & 7]
+    return key